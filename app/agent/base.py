@@ -1,13 +1,17 @@
 from abc import ABC, abstractmethod
 from contextlib import asynccontextmanager
-from typing import List, Optional
+from typing import Any, Deque, Dict, List, Optional
 
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
 
+from app.config import config
 from app.llm import LLM
 from app.logger import logger
+from app.loop_detection import LoopDetector
+from app.retry import deadline
 from app.sandbox.client import SANDBOX_CLIENT
 from app.schema import ROLE_TYPE, AgentState, Memory, Message
+from app.session import SessionStore
 
 
 class BaseAgent(BaseModel, ABC):
@@ -40,7 +44,21 @@ class BaseAgent(BaseModel, ABC):
     max_steps: int = Field(default=10, description="Maximum steps before termination")
     current_step: int = Field(default=0, description="Current step in execution")
 
-    duplicate_threshold: int = 2
+    duplicate_threshold: int = Field(
+        default_factory=lambda: config.loop_config.threshold,
+        description="Earlier repeats of a step that count as being stuck",
+    )
+    _loop_detector: LoopDetector = PrivateAttr(
+        default_factory=lambda: LoopDetector.from_settings(config.loop_config)
+    )
+
+    # Persistence
+    session: Optional[SessionStore] = Field(
+        None, description="Journal that lets an interrupted run resume"
+    )
+    _session_restored: bool = PrivateAttr(default=False)
+    # Step results of the interrupted run restored from the session
+    _resumed_results: Optional[List[str]] = PrivateAttr(default=None)
 
     class Config:
         arbitrary_types_allowed = True
@@ -53,6 +71,7 @@ class BaseAgent(BaseModel, ABC):
             self.llm = LLM(config_name=self.name.lower())
         if not isinstance(self.memory, Memory):
             self.memory = Memory()
+        self.memory.bind_token_counter(self.llm.count_message)
         return self
 
     @asynccontextmanager
@@ -128,31 +147,91 @@ class BaseAgent(BaseModel, ABC):
         if self.state != AgentState.IDLE:
             raise RuntimeError(f"Cannot run agent from state: {self.state}")
 
-        if request:
-            self.update_memory("user", request)
-
-        results: List[str] = []
-        async with self.state_context(AgentState.RUNNING):
-            while (
-                self.current_step < self.max_steps and self.state != AgentState.FINISHED
-            ):
-                self.current_step += 1
-                logger.info(f"Executing step {self.current_step}/{self.max_steps}")
-                step_result = await self.step()
-
-                # Check for stuck state
-                if self.is_stuck():
-                    self.handle_stuck_state()
-
-                results.append(f"Step {self.current_step}: {step_result}")
-
-            if self.current_step >= self.max_steps:
-                self.current_step = 0
-                self.state = AgentState.IDLE
-                results.append(f"Terminated: Reached max steps ({self.max_steps})")
+        # An interrupted run continues after its last completed step; its
+        # request is already in memory
+        self.restore_session()
+        resumed, self._resumed_results = self._resumed_results, None
+        results: List[str] = resumed or []
+        if resumed is None:
+            if request:
+                self.update_memory("user", request)
+            self._checkpoint("start")
+
+        # LLM retries and request timeouts are cut short to fit the run's deadline
+        with deadline(config.retry_config.run_deadline):
+            async with self.state_context(AgentState.RUNNING):
+                while (
+                    self.current_step < self.max_steps
+                    and self.state != AgentState.FINISHED
+                ):
+                    self.current_step += 1
+                    logger.info(f"Executing step {self.current_step}/{self.max_steps}")
+                    step_result = await self.step()
+
+                    # Check for stuck state
+                    if self.is_stuck():
+                        self.handle_stuck_state()
+
+                    results.append(f"Step {self.current_step}: {step_result}")
+                    self._checkpoint("step", results[-1])
+
+                if self.current_step >= self.max_steps:
+                    self.current_step = 0
+                    self.state = AgentState.IDLE
+                    results.append(f"Terminated: Reached max steps ({self.max_steps})")
+        self._checkpoint("end")
         await SANDBOX_CLIENT.cleanup()
         return "\n".join(results) if results else "No steps executed"
 
+    def journaled_components(self) -> Dict[str, Any]:
+        """Return the state journaled to the session, keyed by stream suffix.
+
+        Components implement `snapshot`, `restore` and `bind_journal`.
+        """
+        return {"memory": self.memory}
+
+    def restore_session(self) -> bool:
+        """Restore the journaled state from the session, once per agent.
+
+        Returns:
+            Whether the next run continues an interrupted one.
+        """
+        if self.session is None or self._session_restored:
+            return self._resumed_results is not None
+        self._session_restored = True
+
+        checkpoints = f"{self.name}.run"
+        for suffix, component in self.journaled_components().items():
+            self.session.restore(component, f"{self.name}.{suffix}", checkpoints)
+
+        last = self.session.last_event(checkpoints)
+        if last is None:
+            return False
+        _, kind, data = last
+        self.current_step = data["current_step"]
+        # A run whose last step finished the agent is complete
+        if kind == "end" or data["state"] == AgentState.FINISHED:
+            return False
+
+        results: List[str] = []
+        for _, kind, data in self.session.events(checkpoints):
+            if kind == "start":
+                results = []
+            elif kind == "step":
+                results.append(data["result"])
+        self._resumed_results = results
+        logger.info(f"Resuming {self.name} after step {self.current_step}")
+        return True
+
+    def _checkpoint(self, kind: str, result: Optional[str] = None) -> None:
+        """Mark the journaled state as consistent at a step boundary"""
+        if self.session is None:
+            return
+        data = {"current_step": self.current_step, "state": self.state.value}
+        if result is not None:
+            data["result"] = result
+        self.session.checkpoint(f"{self.name}.run", kind, data)
+
     @abstractmethod
     async def step(self) -> str:
         """Execute a single step in the agent's workflow.
@@ -168,29 +247,28 @@ class BaseAgent(BaseModel, ABC):
         logger.warning(f"Agent detected stuck state. Added prompt: {stuck_prompt}")
 
     def is_stuck(self) -> bool:
-        """Check if the agent is stuck in a loop by detecting duplicate content"""
-        if len(self.memory.messages) < 2:
-            return False
-
-        last_message = self.memory.messages[-1]
-        if not last_message.content:
-            return False
-
-        # Count identical content occurrences
-        duplicate_count = sum(
-            1
-            for msg in reversed(self.memory.messages[:-1])
-            if msg.role == "assistant" and msg.content == last_message.content
-        )
+        """Check if the agent is stuck in a loop by detecting repeated steps.
 
-        return duplicate_count >= self.duplicate_threshold
+        The newest assistant message is matched against an index of the
+        earlier ones, which only reads the messages added since the last
+        check. Repeated tool calls and near-duplicate content both count.
+        """
+        repeats = self._loop_detector.update(self.memory.messages)
+        return repeats >= self.duplicate_threshold
 
     @property
-    def messages(self) -> List[Message]:
-        """Retrieve a list of messages from the agent's memory."""
+    def messages(self) -> Deque[Message]:
+        """The messages in the agent's memory.
+
+        This is the memory's own deque, not a copy; use
+        memory.get_recent_messages for the newest messages only.
+        """
         return self.memory.messages
 
     @messages.setter
     def messages(self, value: List[Message]):
-        """Set the list of messages in the agent's memory."""
-        self.memory.messages = value
+        """Replace the agent's memory, a rare bulk operation.
+
+        The new history is journaled to the session as one snapshot.
+        """
+        self.memory.replace(value)
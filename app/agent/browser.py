@@ -109,7 +109,7 @@ class BrowserAgent(ToolCallAgent):
                     content="Current browser screenshot:",
                     base64_image=self._current_base64_image,
                 )
-                self.memory.add_message(image_message)
+                self.add_step_context(image_message)
 
         # Replace placeholders with actual browser state info
         self.next_step_prompt = NEXT_STEP_PROMPT.format(
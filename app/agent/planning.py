@@ -56,7 +56,7 @@ class PlanningAgent(ToolCallAgent):
             if self.active_plan_id
             else self.next_step_prompt
         )
-        self.messages.append(Message.user_message(prompt))
+        self.add_step_context(Message.user_message(prompt))
 
         # Get the current step index before thinking
         self.current_step_index = await self._get_current_step_index()
@@ -115,7 +115,11 @@ class PlanningAgent(ToolCallAgent):
 
     async def run(self, request: Optional[str] = None) -> str:
         """Run the agent with an optional initial request."""
-        if request:
+        if self.restore_session():
+            # Continue the plan of the interrupted run
+            planning_tool = self.available_tools.get_tool("planning")
+            self.active_plan_id = planning_tool.current_plan_id or self.active_plan_id
+        elif request:
             await self.create_initial_plan(request)
         return await super().run()
 
@@ -213,6 +217,7 @@ class PlanningAgent(ToolCallAgent):
             system_msgs=[Message.system_message(self.system_prompt)],
             tools=self.available_tools.to_params(),
             tool_choice=ToolChoice.AUTO,
+            purpose="plan",
         )
         assistant_msg = Message.from_tool_calls(
             content=response.content, tool_calls=response.tool_calls
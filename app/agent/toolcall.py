@@ -1,12 +1,15 @@
+import asyncio
 import json
-from typing import Any, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from app.agent.react import ReActAgent
+from app.context import ContextCompactor
 from app.exceptions import TokenLimitExceeded
 from app.logger import logger
 from app.prompt.toolcall import NEXT_STEP_PROMPT, SYSTEM_PROMPT
+from app.prompt_cache import PrefixTracker
 from app.schema import TOOL_CHOICE_TYPE, AgentState, Message, ToolCall, ToolChoice
 from app.tool import CreateChatCompletion, Terminate, ToolCollection
 
@@ -35,15 +38,36 @@ class ToolCallAgent(ReActAgent):
     max_steps: int = 30
     max_observe: Optional[Union[int, bool]] = None
 
+    # Stream the LLM response and start executing tool calls as soon as each
+    # one is complete, while the model is still generating the rest
+    stream_tool_calls: bool = False
+    _early_tool_tasks: Dict[str, asyncio.Task] = PrivateAttr(default_factory=dict)
+
+    # Rewrites old context to fit llm.context_budget, keeping Memory intact
+    _compactor: ContextCompactor = PrivateAttr(default_factory=ContextCompactor)
+    # Volatile state for the next request only, sent after the history
+    _step_context: List[Message] = PrivateAttr(default_factory=list)
+    _prefix_tracker: PrefixTracker = PrivateAttr(default_factory=PrefixTracker)
+
+    def journaled_components(self) -> Dict[str, Any]:
+        """Journal the tools that keep state, such as plans and edit history"""
+        components = super().journaled_components()
+        for tool in self.available_tools:
+            if hasattr(tool, "bind_journal"):
+                components[f"tool.{tool.name}"] = tool
+        return components
+
     async def think(self) -> bool:
         """Process current state and decide next actions using tools"""
+        # Per-step prompts go after the history instead of into memory, so
+        # the history stays a stable, cacheable prefix across steps
+        step_context, self._step_context = self._step_context, []
         if self.next_step_prompt:
-            user_msg = Message.user_message(self.next_step_prompt)
-            self.messages += [user_msg]
+            step_context.append(Message.user_message(self.next_step_prompt))
 
         try:
             # Get response with tool options
-            response = await self.llm.ask_tool(
+            request = dict(
                 messages=self.messages,
                 system_msgs=(
                     [Message.system_message(self.system_prompt)]
@@ -53,23 +77,29 @@ class ToolCallAgent(ReActAgent):
                 tools=self.available_tools.to_params(),
                 tool_choice=self.tool_choices,
             )
-        except ValueError:
-            raise
-        except Exception as e:
-            # Check if this is a RetryError containing TokenLimitExceeded
-            if hasattr(e, "__cause__") and isinstance(e.__cause__, TokenLimitExceeded):
-                token_limit_error = e.__cause__
-                logger.error(
-                    f"🚨 Token limit error (from RetryError): {token_limit_error}"
+            if self.llm.context_budget:
+                request["messages"] = await self._compact_messages(
+                    request, step_context
                 )
-                self.memory.add_message(
-                    Message.assistant_message(
-                        f"Maximum token limit reached, cannot continue execution: {str(token_limit_error)}"
-                    )
+            request["messages"] = [*request["messages"], *step_context]
+            self._prefix_tracker.observe(request, self.llm)
+            if self.stream_tool_calls and self.tool_choices != ToolChoice.NONE:
+                response = await self.llm.ask_tool_stream(
+                    **request, on_tool_call=self._start_tool_call, purpose="think"
                 )
-                self.state = AgentState.FINISHED
-                return False
-            raise
+            else:
+                response = await self.llm.ask_tool(**request, purpose="think")
+            self._prefix_tracker.report(self.llm)
+        except TokenLimitExceeded as e:
+            # Token limit errors are never retried, so they arrive unwrapped
+            logger.error(f"🚨 Token limit error: {e}")
+            self.memory.add_message(
+                Message.assistant_message(
+                    f"Maximum token limit reached, cannot continue execution: {str(e)}"
+                )
+            )
+            self.state = AgentState.FINISHED
+            return False
 
         self.tool_calls = tool_calls = (
             response.tool_calls if response and response.tool_calls else []
@@ -127,6 +157,15 @@ class ToolCallAgent(ReActAgent):
             )
             return False
 
+    async def step(self) -> str:
+        """Think and act, then drop streamed tool calls that act did not collect"""
+        try:
+            return await super().step()
+        finally:
+            # Covers think returning without acting, a failure mid-stream and
+            # calls streamed but missing from the final message
+            await self._cancel_early_tool_calls()
+
     async def act(self) -> str:
         """Execute tool calls and handle their results"""
         if not self.tool_calls:
@@ -134,14 +173,16 @@ class ToolCallAgent(ReActAgent):
                 raise ValueError(TOOL_CALL_REQUIRED)
 
             # Return last message content if no tool calls
-            return self.messages[-1].content or "No content or commands to execute"
+            last_message = self.memory.messages[-1]
+            return last_message.content or "No content or commands to execute"
 
         results = []
         for command in self.tool_calls:
-            # Reset base64_image for each tool call
-            self._current_base64_image = None
-
-            result = await self.execute_tool(command)
+            early_task = self._early_tool_tasks.pop(command.id, None)
+            if early_task is not None:
+                result, base64_image = await early_task
+            else:
+                result, base64_image = await self._execute_tool_with_image(command)
 
             if self.max_observe:
                 result = result[: self.max_observe]
@@ -155,13 +196,63 @@ class ToolCallAgent(ReActAgent):
                 content=result,
                 tool_call_id=command.id,
                 name=command.function.name,
-                base64_image=self._current_base64_image,
+                base64_image=base64_image,
             )
             self.memory.add_message(tool_msg)
             results.append(result)
 
         return "\n\n".join(results)
 
+    async def _execute_tool_with_image(
+        self, command: ToolCall, previous: Optional[asyncio.Task] = None
+    ) -> Tuple[str, Optional[str]]:
+        """Execute a tool call and return its observation and screenshot"""
+        if previous is not None:
+            # Tools still run one at a time and in the order the model chose
+            await previous
+
+        # Reset base64_image for each tool call
+        self._current_base64_image = None
+        result = await self.execute_tool(command)
+        return result, self._current_base64_image
+
+    def add_step_context(self, message: Message) -> None:
+        """Send a message with the next request only, after the history.
+
+        Use this for state that changes every step (screenshots, plan status)
+        so it does not end up in memory and break the cacheable prefix.
+        """
+        self._step_context.append(message)
+
+    async def _compact_messages(
+        self, request: dict, step_context: List[Message]
+    ) -> List[Message]:
+        """Compact memory so the whole request fits the LLM's context budget"""
+        reserved = self.llm.count_tools_tokens(request["tools"] or [])
+        for message in (request["system_msgs"] or []) + step_context:
+            reserved += self.llm.count_message(message)
+        budget = max(self.llm.context_budget - reserved, 0)
+        return await self._compactor.compact(request["messages"], budget, self.llm)
+
+    async def _cancel_early_tool_calls(self) -> None:
+        """Cancel streamed tool executions left over from a step and wait for them"""
+        tasks = list(self._early_tool_tasks.values())
+        self._early_tool_tasks.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start_tool_call(self, command: ToolCall) -> None:
+        """Begin executing a streamed tool call before the response is complete"""
+        previous = next(reversed(self._early_tool_tasks.values()), None)
+        logger.info(
+            f"⚡ Starting tool '{command.function.name}' while the model streams"
+        )
+        self._early_tool_tasks[command.id] = asyncio.create_task(
+            self._execute_tool_with_image(command, previous)
+        )
+
     async def execute_tool(self, command: ToolCall) -> str:
         """Execute a single tool call with robust error handling"""
         if not command or not command.function or not command.function.name:
@@ -1,15 +1,24 @@
-from typing import Dict, List, Literal, Optional, Union
-import boto3
+import asyncio
 import json
+import sys
+import threading
 import time
 import uuid
 from datetime import datetime
-import sys
+from typing import Any, AsyncIterator, Dict, Iterable, List, Literal, Optional, Union
+
+import boto3
+from botocore.config import Config as BotoConfig
+
+from app.config import config
+from app.streaming import StdoutSink, StreamSink
+
 
 # Global variables to track the current tool use ID across function calls
 # Tmp solution
 CURRENT_TOOLUSE_ID = None
 
+
 # Class to handle OpenAI-style response formatting
 class OpenAIResponse:
     def __init__(self, data):
@@ -18,31 +27,103 @@ class OpenAIResponse:
             if isinstance(value, dict):
                 value = OpenAIResponse(value)
             elif isinstance(value, list):
-                value = [OpenAIResponse(item) if isinstance(item, dict) else item for item in value]
+                value = [
+                    OpenAIResponse(item) if isinstance(item, dict) else item
+                    for item in value
+                ]
             setattr(self, key, value)
 
     def model_dump(self, *args, **kwargs):
         # Convert object to dict and add timestamp
         data = self.__dict__
-        data['created_at'] = datetime.now().isoformat()
+        data["created_at"] = datetime.now().isoformat()
         return data
 
+
+# boto3 clients are thread safe, so one client and its connection pool is
+# shared by every profile and every worker thread
+_runtime_client = None
+_runtime_client_lock = threading.Lock()
+
+
+def get_runtime_client():
+    """Return the shared bedrock-runtime client, sized by the [http] settings"""
+    global _runtime_client
+    with _runtime_client_lock:
+        if _runtime_client is None:
+            http_config = config.http_config
+            _runtime_client = boto3.client(
+                "bedrock-runtime",
+                config=BotoConfig(
+                    max_pool_connections=http_config.max_connections,
+                    connect_timeout=http_config.connect_timeout,
+                    read_timeout=300,
+                    tcp_keepalive=True,
+                ),
+            )
+        return _runtime_client
+
+
+_STREAM_END = object()
+
+
+async def iterate_in_thread(iterable: Iterable) -> AsyncIterator[Any]:
+    """Iterate a blocking iterable on a worker thread without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def pump():
+        try:
+            for item in iterable:
+                if stopped.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+
+    # A dedicated thread, since a long stream would otherwise tie up a
+    # worker of the default executor that asyncio.to_thread relies on
+    worker = threading.Thread(target=pump, name="bedrock-stream", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Stop the worker if the consumer went away early
+        stopped.set()
+        close = getattr(iterable, "close", None)
+        if close is not None and worker.is_alive():
+            try:
+                close()
+            except Exception:
+                pass
+
+
 # Main client class for interacting with Amazon Bedrock
 class BedrockClient:
     def __init__(self):
         # Initialize Bedrock client, you need to configure AWS env first
         try:
-            self.client = boto3.client('bedrock-runtime')
+            self.client = get_runtime_client()
             self.chat = Chat(self.client)
         except Exception as e:
             print(f"Error initializing Bedrock client: {e}")
             sys.exit(1)
 
+
 # Chat interface class
 class Chat:
     def __init__(self, client):
         self.completions = ChatCompletions(client)
 
+
 # Core class handling chat completions functionality
 class ChatCompletions:
     def __init__(self, client):
@@ -52,19 +133,23 @@ class ChatCompletions:
         # Convert OpenAI function calling format to Bedrock tool format
         bedrock_tools = []
         for tool in tools:
-            if tool.get('type') == 'function':
-                function = tool.get('function', {})
+            if tool.get("type") == "function":
+                function = tool.get("function", {})
                 bedrock_tool = {
                     "toolSpec": {
-                        "name": function.get('name', ''),
-                        "description": function.get('description', ''),
+                        "name": function.get("name", ""),
+                        "description": function.get("description", ""),
                         "inputSchema": {
                             "json": {
                                 "type": "object",
-                                "properties": function.get('parameters', {}).get('properties', {}),
-                                "required": function.get('parameters', {}).get('required', [])
+                                "properties": function.get("parameters", {}).get(
+                                    "properties", {}
+                                ),
+                                "required": function.get("parameters", {}).get(
+                                    "required", []
+                                ),
                             }
-                        }
+                        },
                     }
                 }
                 bedrock_tools.append(bedrock_tool)
@@ -75,41 +160,43 @@ class ChatCompletions:
         bedrock_messages = []
         system_prompt = []
         for message in messages:
-            if message.get('role') == 'system':
-                system_prompt = [{"text": message.get('content')}]
-            elif message.get('role') == 'user':
+            if message.get("role") == "system":
+                system_prompt = [{"text": message.get("content")}]
+            elif message.get("role") == "user":
                 bedrock_message = {
-                    "role": message.get('role', 'user'),
-                    "content": [{"text": message.get('content')}]
+                    "role": message.get("role", "user"),
+                    "content": [{"text": message.get("content")}],
                 }
                 bedrock_messages.append(bedrock_message)
-            elif message.get('role') == 'assistant':
+            elif message.get("role") == "assistant":
                 bedrock_message = {
                     "role": "assistant",
-                    "content": [{"text": message.get('content')}]
+                    "content": [{"text": message.get("content")}],
                 }
-                openai_tool_calls = message.get('tool_calls', [])
+                openai_tool_calls = message.get("tool_calls", [])
                 if openai_tool_calls:
                     bedrock_tool_use = {
-                        "toolUseId": openai_tool_calls[0]['id'],
-                        "name": openai_tool_calls[0]['function']['name'],
-                        "input": json.loads(openai_tool_calls[0]['function']['arguments'])
+                        "toolUseId": openai_tool_calls[0]["id"],
+                        "name": openai_tool_calls[0]["function"]["name"],
+                        "input": json.loads(
+                            openai_tool_calls[0]["function"]["arguments"]
+                        ),
                     }
-                    bedrock_message['content'].append({"toolUse": bedrock_tool_use})
+                    bedrock_message["content"].append({"toolUse": bedrock_tool_use})
                     global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = openai_tool_calls[0]['id']
+                    CURRENT_TOOLUSE_ID = openai_tool_calls[0]["id"]
                 bedrock_messages.append(bedrock_message)
-            elif message.get('role') == 'tool':
+            elif message.get("role") == "tool":
                 bedrock_message = {
                     "role": "user",
                     "content": [
                         {
                             "toolResult": {
                                 "toolUseId": CURRENT_TOOLUSE_ID,
-                                "content": [{"text":message.get('content')}]
+                                "content": [{"text": message.get("content")}],
                             }
                         }
-                    ]
+                    ],
                 }
                 bedrock_messages.append(bedrock_message)
             else:
@@ -119,26 +206,27 @@ class ChatCompletions:
     def _convert_bedrock_response_to_openai_format(self, bedrock_response):
         # Convert Bedrock response format to OpenAI format
         content = ""
-        if bedrock_response.get('output', {}).get('message', {}).get('content'):
-            content_array = bedrock_response['output']['message']['content']
-            content = "".join(item.get('text', '') for item in content_array)
-        if content == "": content = "."
+        if bedrock_response.get("output", {}).get("message", {}).get("content"):
+            content_array = bedrock_response["output"]["message"]["content"]
+            content = "".join(item.get("text", "") for item in content_array)
+        if content == "":
+            content = "."
 
         # Handle tool calls in response
         openai_tool_calls = []
-        if bedrock_response.get('output', {}).get('message', {}).get('content'):
-            for content_item in bedrock_response['output']['message']['content']:
-                if content_item.get('toolUse'):
-                    bedrock_tool_use = content_item['toolUse']
+        if bedrock_response.get("output", {}).get("message", {}).get("content"):
+            for content_item in bedrock_response["output"]["message"]["content"]:
+                if content_item.get("toolUse"):
+                    bedrock_tool_use = content_item["toolUse"]
                     global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = bedrock_tool_use['toolUseId']
+                    CURRENT_TOOLUSE_ID = bedrock_tool_use["toolUseId"]
                     openai_tool_call = {
-                        'id': CURRENT_TOOLUSE_ID,
-                        'type': 'function',
-                        'function': {
-                            'name': bedrock_tool_use['name'],
-                            'arguments': json.dumps(bedrock_tool_use['input'])
-                        }
+                        "id": CURRENT_TOOLUSE_ID,
+                        "type": "function",
+                        "function": {
+                            "name": bedrock_tool_use["name"],
+                            "arguments": json.dumps(bedrock_tool_use["input"]),
+                        },
                     }
                     openai_tool_calls.append(openai_tool_call)
 
@@ -150,126 +238,165 @@ class ChatCompletions:
             "system_fingerprint": None,
             "choices": [
                 {
-                    "finish_reason": bedrock_response.get('stopReason', 'end_turn'),
+                    "finish_reason": bedrock_response.get("stopReason", "end_turn"),
                     "index": 0,
                     "message": {
                         "content": content,
-                        "role": bedrock_response.get('output', {}).get('message', {}).get('role', 'assistant'),
-                        "tool_calls": openai_tool_calls if openai_tool_calls != [] else None,
-                        "function_call": None
-                    }
+                        "role": bedrock_response.get("output", {})
+                        .get("message", {})
+                        .get("role", "assistant"),
+                        "tool_calls": openai_tool_calls
+                        if openai_tool_calls != []
+                        else None,
+                        "function_call": None,
+                    },
                 }
             ],
             "usage": {
-                "completion_tokens": bedrock_response.get('usage', {}).get('outputTokens', 0),
-                "prompt_tokens": bedrock_response.get('usage', {}).get('inputTokens', 0),
-                "total_tokens": bedrock_response.get('usage', {}).get('totalTokens', 0)
-            }
+                "completion_tokens": bedrock_response.get("usage", {}).get(
+                    "outputTokens", 0
+                ),
+                "prompt_tokens": bedrock_response.get("usage", {}).get(
+                    "inputTokens", 0
+                ),
+                "total_tokens": bedrock_response.get("usage", {}).get("totalTokens", 0),
+            },
         }
         return OpenAIResponse(openai_format)
 
+    def _build_request(self, model, messages, max_tokens, temperature, tools) -> dict:
+        # Arguments for converse/converse_stream; boto3 rejects a None toolConfig
+        (
+            system_prompt,
+            bedrock_messages,
+        ) = self._convert_openai_messages_to_bedrock_format(messages)
+        request = {
+            "modelId": model,
+            "system": system_prompt,
+            "messages": bedrock_messages,
+            "inferenceConfig": {"temperature": temperature, "maxTokens": max_tokens},
+        }
+        if tools:
+            request["toolConfig"] = {"tools": tools}
+        return request
+
     async def _invoke_bedrock(
-            self,
-            model: str,
-            messages: List[Dict[str, str]],
-            max_tokens: int,
-            temperature: float,
-            tools: Optional[List[dict]] = None,
-            tool_choice: Literal["none", "auto", "required"] = "auto",
-            **kwargs
-        ) -> OpenAIResponse:
-        # Non-streaming invocation of Bedrock model
-        system_prompt, bedrock_messages = self._convert_openai_messages_to_bedrock_format(messages)
-        response = self.client.converse(
-            modelId = model,
-            system = system_prompt,
-            messages = bedrock_messages,
-            inferenceConfig = {"temperature": temperature, "maxTokens": max_tokens},
-            toolConfig = {"tools": tools} if tools else None,
-        )
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        tools: Optional[List[dict]] = None,
+        tool_choice: Literal["none", "auto", "required"] = "auto",
+        **kwargs,
+    ) -> OpenAIResponse:
+        # Non-streaming invocation of Bedrock model, the blocking boto3 call runs on a worker thread
+        request = self._build_request(model, messages, max_tokens, temperature, tools)
+        response = await asyncio.to_thread(self.client.converse, **request)
         openai_response = self._convert_bedrock_response_to_openai_format(response)
         return openai_response
 
     async def _invoke_bedrock_stream(
-            self,
-            model: str,
-            messages: List[Dict[str, str]],
-            max_tokens: int,
-            temperature: float,
-            tools: Optional[List[dict]] = None,
-            tool_choice: Literal["none", "auto", "required"] = "auto",
-            **kwargs
-        ) -> OpenAIResponse:
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        tools: Optional[List[dict]] = None,
+        tool_choice: Literal["none", "auto", "required"] = "auto",
+        **kwargs,
+    ) -> OpenAIResponse:
         # Streaming invocation of Bedrock model
-        system_prompt, bedrock_messages = self._convert_openai_messages_to_bedrock_format(messages)
-        response = self.client.converse_stream(
-            modelId = model,
-            system = system_prompt,
-            messages = bedrock_messages,
-            inferenceConfig = {"temperature": temperature, "maxTokens": max_tokens},
-            toolConfig = {"tools": tools} if tools else None,
-        )
+        sink: StreamSink = kwargs.get("sink") or StdoutSink()
+        request = self._build_request(model, messages, max_tokens, temperature, tools)
+        response = await asyncio.to_thread(self.client.converse_stream, **request)
 
         # Initialize response structure
         bedrock_response = {
-            'output': {
-                'message': {
-                    'role': '',
-                    'content': []
-                }
-            },
-            'stopReason': '',
-            'usage': {},
-            'metrics': {}
+            "output": {"message": {"role": "", "content": []}},
+            "stopReason": "",
+            "usage": {},
+            "metrics": {},
         }
         bedrock_response_text = ""
         bedrock_response_tool_input = ""
 
         # Process streaming response
-        stream = response.get('stream')
+        stream = response.get("stream")
         if stream:
-            for event in stream:
-                if event.get('messageStart', {}).get('role'):
-                    bedrock_response['output']['message']['role'] = event['messageStart']['role']
-                if event.get('contentBlockDelta', {}).get('delta', {}).get('text'):
-                    bedrock_response_text += event['contentBlockDelta']['delta']['text']
-                    print(event['contentBlockDelta']['delta']['text'], end='', flush=True)
-                if event.get('contentBlockStop', {}).get('contentBlockIndex') == 0:
-                    bedrock_response['output']['message']['content'].append({"text": bedrock_response_text})
-                if event.get('contentBlockStart', {}).get('start', {}).get('toolUse'):
-                    bedrock_tool_use = event['contentBlockStart']['start']['toolUse']
+            # Reading the event stream blocks, so events are bridged from a worker thread
+            async for event in iterate_in_thread(stream):
+                if event.get("messageStart", {}).get("role"):
+                    bedrock_response["output"]["message"]["role"] = event[
+                        "messageStart"
+                    ]["role"]
+                if event.get("contentBlockDelta", {}).get("delta", {}).get("text"):
+                    bedrock_response_text += event["contentBlockDelta"]["delta"]["text"]
+                    await sink.write(event["contentBlockDelta"]["delta"]["text"])
+                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 0:
+                    bedrock_response["output"]["message"]["content"].append(
+                        {"text": bedrock_response_text}
+                    )
+                if event.get("contentBlockStart", {}).get("start", {}).get("toolUse"):
+                    bedrock_tool_use = event["contentBlockStart"]["start"]["toolUse"]
                     tool_use = {
-                        "toolUseId": bedrock_tool_use['toolUseId'],
-                        "name": bedrock_tool_use['name'],
+                        "toolUseId": bedrock_tool_use["toolUseId"],
+                        "name": bedrock_tool_use["name"],
                     }
-                    bedrock_response['output']['message']['content'].append({"toolUse": tool_use})
+                    bedrock_response["output"]["message"]["content"].append(
+                        {"toolUse": tool_use}
+                    )
                     global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = bedrock_tool_use['toolUseId']
-                if event.get('contentBlockDelta', {}).get('delta', {}).get('toolUse'):
-                    bedrock_response_tool_input += event['contentBlockDelta']['delta']['toolUse']['input']
-                    print(event['contentBlockDelta']['delta']['toolUse']['input'], end='', flush=True)
-                if event.get('contentBlockStop', {}).get('contentBlockIndex') == 1:
-                    bedrock_response['output']['message']['content'][1]['toolUse']['input'] = json.loads(bedrock_response_tool_input)
-        print()
-        openai_response = self._convert_bedrock_response_to_openai_format(bedrock_response)
+                    CURRENT_TOOLUSE_ID = bedrock_tool_use["toolUseId"]
+                if event.get("contentBlockDelta", {}).get("delta", {}).get("toolUse"):
+                    bedrock_response_tool_input += event["contentBlockDelta"]["delta"][
+                        "toolUse"
+                    ]["input"]
+                    await sink.write(
+                        event["contentBlockDelta"]["delta"]["toolUse"]["input"]
+                    )
+                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 1:
+                    bedrock_response["output"]["message"]["content"][1]["toolUse"][
+                        "input"
+                    ] = json.loads(bedrock_response_tool_input)
+        await sink.end()
+        openai_response = self._convert_bedrock_response_to_openai_format(
+            bedrock_response
+        )
         return openai_response
 
     def create(
-            self,
-            model: str,
-            messages: List[Dict[str, str]],
-            max_tokens: int,
-            temperature: float,
-            stream: Optional[bool] = True,
-            tools: Optional[List[dict]] = None,
-            tool_choice: Literal["none", "auto", "required"] = "auto",
-            **kwargs
-        ) -> OpenAIResponse:
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        temperature: float,
+        stream: Optional[bool] = True,
+        tools: Optional[List[dict]] = None,
+        tool_choice: Literal["none", "auto", "required"] = "auto",
+        **kwargs,
+    ) -> OpenAIResponse:
         # Main entry point for chat completion
         bedrock_tools = []
         if tools is not None:
             bedrock_tools = self._convert_openai_tools_to_bedrock_format(tools)
         if stream:
-            return self._invoke_bedrock_stream(model, messages, max_tokens, temperature, bedrock_tools, tool_choice, **kwargs)
+            return self._invoke_bedrock_stream(
+                model,
+                messages,
+                max_tokens,
+                temperature,
+                bedrock_tools,
+                tool_choice,
+                **kwargs,
+            )
         else:
-            return self._invoke_bedrock(model, messages, max_tokens, temperature, bedrock_tools, tool_choice, **kwargs)
+            return self._invoke_bedrock(
+                model,
+                messages,
+                max_tokens,
+                temperature,
+                bedrock_tools,
+                tool_choice,
+                **kwargs,
+            )
@@ -0,0 +1,207 @@
+"""Content-addressed storage for images kept out of agent memory."""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import PROJECT_ROOT, BlobSettings, config
+from app.logger import logger
+from app.metrics import metrics
+
+
+DEFAULT_BLOB_PATH = PROJECT_ROOT / ".cache" / "blobs"
+
+
+class BlobStore:
+    """Stores strings under the SHA-256 of their content.
+
+    Blobs live in an in-memory LRU capped at `max_memory_bytes`; blobs
+    evicted from it spill to one file per blob under `path`, from where
+    they are read back on demand. Storing the same content twice returns
+    the same reference and keeps a single copy. Without a path, evicted
+    blobs are gone and `get` returns None for them.
+
+    Spilled blobs are written outside the lock, so other threads are not
+    held up by file I/O. The directory is shared across runs and capped at
+    `max_disk_bytes`; once it is over the cap, the oldest files are deleted.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = DEFAULT_BLOB_PATH,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: Optional[int] = 1024 * 1024 * 1024,
+    ):
+        self.path = Path(path) if path else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._memory_bytes = 0
+        # Blobs evicted from memory that are still being written to disk
+        self._spilling: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        # Sizes of the files on disk, oldest first; scanned on the first write
+        self._disk: Optional[OrderedDict[str, int]] = None
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: BlobSettings) -> "BlobStore":
+        path = Path(settings.path) if settings.path else DEFAULT_BLOB_PATH
+        if not path.is_absolute():
+            path = PROJECT_ROOT / path
+        return cls(
+            path=path,
+            max_memory_bytes=int(settings.max_memory_mb * 1024 * 1024),
+            max_disk_bytes=(
+                int(settings.max_disk_mb * 1024 * 1024)
+                if settings.max_disk_mb
+                else None
+            ),
+        )
+
+    def put(self, data: str) -> str:
+        """Store data and return its reference"""
+        ref = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        with self._lock:
+            if ref in self._memory:
+                self._memory.move_to_end(ref)
+                metrics.increment("blobs.deduplicated")
+                return ref
+            evicted = self._memory_set(ref, data)
+        self._spill(evicted)
+        metrics.increment("blobs.stored")
+        return ref
+
+    def get(self, ref: str) -> Optional[str]:
+        """Return the blob stored under ref, or None if it is not available"""
+        with self._lock:
+            if ref in self._memory:
+                self._memory.move_to_end(ref)
+                return self._memory[ref]
+            if ref in self._spilling:
+                return self._spilling[ref]
+        data = self._disk_get(ref)
+        if data is None:
+            metrics.increment("blobs.missing")
+            return None
+        metrics.increment("blobs.disk_reads")
+        with self._lock:
+            evicted = [] if ref in self._memory else self._memory_set(ref, data)
+        self._spill(evicted)
+        return data
+
+    def persist(self, ref: str) -> None:
+        """Write a blob held in memory to disk now instead of on eviction"""
+        with self._lock:
+            data = self._memory.get(ref)
+        if data is not None:
+            self._disk_set(ref, data)
+
+    def clear(self) -> None:
+        """Drop the in-memory tier; blobs already on disk are kept"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def _memory_set(self, ref: str, data: str) -> List[Tuple[str, str]]:
+        """Add a blob to memory and return the blobs evicted to make room.
+
+        Must be called with the lock held; the evicted blobs stay readable
+        from `_spilling` until `_spill` has written them to disk.
+        """
+        self._memory[ref] = data
+        self._memory_bytes += len(data)
+        evicted = []
+        # The newest blob is always kept, even if it alone exceeds the cap
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            evicted_ref, evicted_data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted_data)
+            if self.path is not None:
+                self._spilling[evicted_ref] = evicted_data
+                evicted.append((evicted_ref, evicted_data))
+        return evicted
+
+    def _spill(self, evicted: List[Tuple[str, str]]) -> None:
+        """Write blobs evicted from memory to disk, without holding the lock"""
+        for ref, data in evicted:
+            self._disk_set(ref, data)
+            metrics.increment("blobs.spilled")
+            with self._lock:
+                self._spilling.pop(ref, None)
+
+    def _file(self, ref: str) -> Path:
+        return self.path / ref[:2] / ref
+
+    def _disk_get(self, ref: str) -> Optional[str]:
+        if self.path is None:
+            return None
+        try:
+            return self._file(ref).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+    def _disk_set(self, ref: str, data: str) -> None:
+        if self.path is None:
+            return
+        file = self._file(ref)
+        if file.exists():
+            return
+        try:
+            file.parent.mkdir(parents=True, exist_ok=True)
+            # Write under a temporary name so readers never see a partial blob
+            partial = file.with_name(f"{ref}.{os.getpid()}.{threading.get_ident()}")
+            partial.write_text(data, encoding="utf-8")
+            os.replace(partial, file)
+        except OSError as e:
+            logger.warning(f"Failed to write blob {ref}: {e}")
+            return
+        self._disk_added(ref, file.stat().st_size)
+
+    def _disk_added(self, ref: str, size: int) -> None:
+        """Account for a new file and delete the oldest ones over the cap"""
+        if self.max_disk_bytes is None:
+            return
+        with self._disk_lock:
+            if self._disk is None:
+                self._disk = self._scan_disk()
+            if ref not in self._disk:
+                self._disk[ref] = size
+                self._disk_bytes += size
+            # The newest file is always kept, even if it alone exceeds the cap
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_ref, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                self._file(old_ref).unlink(missing_ok=True)
+                metrics.increment("blobs.disk_deleted")
+
+    def _scan_disk(self) -> "OrderedDict[str, int]":
+        """Return the blobs left on disk by earlier runs, oldest first"""
+        files = []
+        for file in self.path.glob("*/*"):
+            # Skip partial writes, whose names carry a suffix
+            if "." in file.name:
+                continue
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, file.name, stat.st_size))
+        files.sort()
+        self._disk_bytes = sum(size for _, _, size in files)
+        return OrderedDict((ref, size) for _, ref, size in files)
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store"""
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = BlobStore.from_settings(config.blob_config)
+    return _blob_store
@@ -0,0 +1,64 @@
+"""Adaptive completion token limits learned per call site."""
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.metrics import metrics
+
+
+class CompletionBudget:
+    """Chooses max_tokens for a request from the completions seen so far.
+
+    Completion lengths are tracked per purpose (the call site, such as
+    "think", "plan" or "summarize"), since a tool-selection turn and a
+    summary need very different budgets. Once a purpose has enough samples,
+    its limit is a high percentile of recent completions plus headroom,
+    never above the profile's max_tokens. Until then, and for requests
+    without a purpose, the profile's max_tokens is used unchanged.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int,
+        percentile: float = 95.0,
+        headroom: float = 0.5,
+        min_tokens: int = 256,
+        min_samples: int = 5,
+        window: int = 200,
+    ):
+        self.max_tokens = max_tokens
+        self.percentile = percentile
+        self.headroom = headroom
+        self.min_tokens = min_tokens
+        self.min_samples = min_samples
+        self.window = window
+        self._samples: Dict[str, Deque[int]] = {}
+
+    def limit(self, purpose: Optional[str]) -> int:
+        """Return the max_tokens to request for a call with this purpose"""
+        samples = self._samples.get(purpose) if purpose else None
+        if not samples or len(samples) < self.min_samples:
+            return self.max_tokens
+        ordered = sorted(samples)
+        observed = ordered[round(self.percentile / 100 * (len(ordered) - 1))]
+        limit = max(int(observed * (1 + self.headroom)), self.min_tokens)
+        return min(limit, self.max_tokens)
+
+    def grow(self, limit: int) -> int:
+        """Return a larger limit for retrying a truncated completion"""
+        return min(limit * 2, self.max_tokens)
+
+    def observe(self, purpose: Optional[str], completion_tokens: int) -> None:
+        """Record the length of a completion that was not cut short"""
+        if not purpose:
+            return
+        samples = self._samples.get(purpose)
+        if samples is None:
+            samples = self._samples[purpose] = deque(maxlen=self.window)
+        samples.append(completion_tokens)
+        metrics.observe(f"llm.completion_tokens.{purpose}", completion_tokens)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            purpose: {"samples": len(samples), "limit": self.limit(purpose)}
+            for purpose, samples in self._samples.items()
+        }
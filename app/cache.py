@@ -0,0 +1,207 @@
+"""Two-tier response cache for LLM completions."""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import PROJECT_ROOT, CacheSettings, config
+from app.logger import logger
+
+
+DEFAULT_CACHE_PATH = PROJECT_ROOT / ".cache" / "llm_responses.db"
+
+
+class ResponseCache:
+    """Caches LLM responses in an in-memory LRU backed by a SQLite file.
+
+    Values must be JSON serializable. Entries expire after `ttl` seconds in
+    both tiers; the memory tier is capped by entry count and the disk tier by
+    total payload size, evicting least recently used entries first.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = DEFAULT_CACHE_PATH,
+        ttl: float = 86400,
+        max_memory_entries: int = 256,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls, settings: CacheSettings) -> "ResponseCache":
+        path = Path(settings.path) if settings.path else DEFAULT_CACHE_PATH
+        if not path.is_absolute():
+            path = PROJECT_ROOT / path
+        return cls(
+            path=path,
+            ttl=settings.ttl,
+            max_memory_entries=settings.max_memory_entries,
+            max_disk_bytes=int(settings.max_disk_mb * 1024 * 1024),
+        )
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """Build a stable key from the normalized request parts"""
+        payload = json.dumps(
+            parts,
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._memory[key]
+
+        if self.path is not None:
+            value = await asyncio.to_thread(self._disk_get, key)
+            if value is not None:
+                self.hits += 1
+                self.disk_hits += 1
+                self._memory_set(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        """Store a value in both tiers"""
+        self.writes += 1
+        self._memory_set(key, value)
+        if self.path is not None:
+            await asyncio.to_thread(self._disk_set, key, value)
+
+    def clear(self) -> None:
+        """Remove every cached entry from both tiers"""
+        self._memory.clear()
+        if self.path is not None:
+            with self._db_lock:
+                db = self._connect()
+                db.execute("DELETE FROM responses")
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def _memory_set(self, key: str, value: Any) -> None:
+        self._memory[key] = (time.time() + self.ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed_at)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            row = db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                return None
+            db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            db.commit()
+        try:
+            return json.loads(row[0])
+        except json.JSONDecodeError:
+            logger.warning(f"Discarding corrupt cache entry {key}")
+            return None
+
+    def _disk_set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode("utf-8"))
+        if size > self.max_disk_bytes:
+            return
+
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now + self.ttl, now),
+            )
+            db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            total = db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+            while total > self.max_disk_bytes:
+                row = db.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    break
+                db.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+                total -= row[1]
+                self.evictions += 1
+            db.commit()
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None if caching is disabled"""
+    global _response_cache
+    if not config.cache_config.enabled:
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache.from_settings(config.cache_config)
+    return _response_cache
@@ -27,6 +27,31 @@ class LLMSettings(BaseModel):
     temperature: float = Field(1.0, description="Sampling temperature")
     api_type: str = Field(..., description="Azure, Openai, or Ollama")
     api_version: str = Field(..., description="Azure Openai version if AzureOpenai")
+    requests_per_minute: Optional[int] = Field(
+        None, description="Client-side request rate limit (None for unlimited)"
+    )
+    tokens_per_minute: Optional[int] = Field(
+        None, description="Client-side input token rate limit (None for unlimited)"
+    )
+    max_concurrency: Optional[int] = Field(
+        None, description="Maximum concurrent requests (None for unlimited)"
+    )
+    stream_usage: bool = Field(
+        False,
+        description="Request token usage in the final chunk of streamed responses",
+    )
+    context_budget: Optional[int] = Field(
+        None,
+        description="Input tokens per request; older agent context is compacted to fit (None to disable)",
+    )
+    coalesce_requests: bool = Field(
+        False,
+        description="Share one call between identical deterministic requests in flight",
+    )
+    adaptive_max_tokens: bool = Field(
+        False,
+        description="Size max_tokens per call site from observed completion lengths",
+    )
 
 
 class ProxySettings(BaseModel):
@@ -90,6 +115,180 @@ class SandboxSettings(BaseModel):
     )
 
 
+class HTTPSettings(BaseModel):
+    """Configuration for the HTTP connection pool shared by LLM clients"""
+
+    max_connections: int = Field(
+        100, description="Maximum open connections per API endpoint"
+    )
+    max_keepalive_connections: int = Field(
+        20, description="Maximum idle connections kept alive per API endpoint"
+    )
+    keepalive_expiry: float = Field(
+        60.0, description="Seconds an idle connection is kept open"
+    )
+    http2: bool = Field(False, description="Whether to negotiate HTTP/2")
+    connect_timeout: float = Field(10.0, description="Connection timeout in seconds")
+
+
+class RouterSettings(BaseModel):
+    """Configuration for routing requests across several LLM profiles"""
+
+    enabled: bool = Field(False, description="Whether to route requests")
+    endpoints: List[str] = Field(
+        default_factory=list,
+        description="LLM profiles to route between, required when routing is enabled",
+    )
+    profiles: List[str] = Field(
+        default_factory=lambda: ["default"],
+        description="Profile names served by the router instead of a single endpoint",
+    )
+    window: int = Field(100, description="Recent requests kept per endpoint for stats")
+    min_samples: int = Field(
+        5, description="Requests an endpoint needs before its latency is trusted"
+    )
+    failure_threshold: int = Field(
+        3, description="Consecutive errors before an endpoint is cooled down"
+    )
+    cooldown: float = Field(
+        30.0, description="Seconds a failing endpoint is skipped for"
+    )
+    hedge: bool = Field(
+        False, description="Send a duplicate request to a second endpoint when slow"
+    )
+    hedge_percentile: float = Field(
+        95.0, description="Latency percentile of the primary endpoint to hedge after"
+    )
+
+
+class RetrySettings(BaseModel):
+    """Configuration for retrying failed LLM requests"""
+
+    max_attempts: int = Field(
+        6, description="Attempts per request, including the first"
+    )
+    base_delay: float = Field(
+        1.0, description="Backoff in seconds after the first failure"
+    )
+    max_delay: float = Field(60.0, description="Longest backoff between attempts")
+    run_deadline: Optional[float] = Field(
+        None,
+        description="Seconds an agent run may take; retries and timeouts are cut to fit",
+    )
+
+
+class TransportSettings(BaseModel):
+    """Configuration for recording, replaying or mocking LLM traffic"""
+
+    mode: str = Field(
+        "live", description="live, record, replay or mock (replay and mock run offline)"
+    )
+    cassette: Optional[str] = Field(
+        None,
+        description="Cassette file recorded or replayed (defaults to .cache/llm_cassette.jsonl)",
+    )
+    script: Optional[str] = Field(
+        None, description="JSON file with the scripted responses for mock mode"
+    )
+    latency: float = Field(
+        0.0, description="Synthetic seconds before a replayed or mocked response"
+    )
+    chunk_latency: float = Field(
+        0.0, description="Synthetic seconds between replayed or mocked stream chunks"
+    )
+
+
+class ImageSettings(BaseModel):
+    """Configuration for preprocessing images sent to multimodal models"""
+
+    enabled: bool = Field(
+        False, description="Whether to downscale and re-encode images"
+    )
+    max_long_side: int = Field(
+        2048, description="Images are scaled down to fit this many pixels"
+    )
+    max_short_side: int = Field(
+        768, description="Shortest side the model keeps at high detail, in pixels"
+    )
+    quality: int = Field(80, description="JPEG quality images are re-encoded at")
+    dedupe: bool = Field(
+        False, description="Omit images identical to the previous one in a request"
+    )
+    dedupe_tolerance: int = Field(
+        0,
+        description="Gray levels fingerprints may differ by for images to count as "
+        "equal; 0 only omits exact copies",
+    )
+
+
+class BlobSettings(BaseModel):
+    """Configuration for the store that keeps images out of agent memory"""
+
+    path: Optional[str] = Field(
+        None,
+        description="Directory blobs spill to from memory (defaults to .cache/blobs)",
+    )
+    max_memory_mb: float = Field(
+        64.0, description="Megabytes of blobs kept in memory before spilling"
+    )
+    max_disk_mb: float = Field(
+        1024.0,
+        description="Megabytes of blobs kept on disk, oldest deleted first; "
+        "0 for no limit",
+    )
+    max_images: int = Field(
+        3, description="Newest images sent with a request; 0 sends all of them"
+    )
+
+
+class SessionSettings(BaseModel):
+    """Configuration for journaling agent state so runs can be resumed"""
+
+    enabled: bool = Field(False, description="Whether to journal agent state")
+    path: Optional[str] = Field(
+        None, description="SQLite journal file (defaults to .cache/sessions.db)"
+    )
+    compact_every: int = Field(
+        200, description="Changes to a stream before they are compacted to a snapshot"
+    )
+
+
+class LoopDetectionSettings(BaseModel):
+    """Configuration for detecting agents that repeat themselves"""
+
+    threshold: int = Field(
+        2,
+        description="Earlier repeats of a step before the agent is told to change course",
+    )
+    max_distance: int = Field(
+        8,
+        description="Differing SimHash bits for two replies to count as near-duplicates",
+    )
+    min_tokens: int = Field(
+        8, description="Words a reply needs before near-duplicates are matched"
+    )
+
+
+class CacheSettings(BaseModel):
+    """Configuration for the LLM response cache"""
+
+    enabled: bool = Field(False, description="Whether to cache LLM responses")
+    path: Optional[str] = Field(
+        None,
+        description="SQLite file for the disk tier (defaults to .cache/llm_responses.db)",
+    )
+    ttl: float = Field(86400.0, description="Seconds before a cached response expires")
+    max_memory_entries: int = Field(
+        256, description="Maximum number of responses kept in memory"
+    )
+    max_disk_mb: float = Field(
+        256.0, description="Maximum size of the disk tier in megabytes"
+    )
+    cache_nondeterministic: bool = Field(
+        False, description="Also cache requests with a non-zero temperature"
+    )
+
+
 class AppConfig(BaseModel):
     llm: Dict[str, LLMSettings]
     sandbox: Optional[SandboxSettings] = Field(
@@ -101,6 +300,34 @@ class AppConfig(BaseModel):
     search_config: Optional[SearchSettings] = Field(
         None, description="Search configuration"
     )
+    cache_config: CacheSettings = Field(
+        default_factory=CacheSettings, description="LLM response cache configuration"
+    )
+    http_config: HTTPSettings = Field(
+        default_factory=HTTPSettings, description="HTTP connection pool configuration"
+    )
+    router_config: RouterSettings = Field(
+        default_factory=RouterSettings, description="LLM router configuration"
+    )
+    image_config: ImageSettings = Field(
+        default_factory=ImageSettings, description="Image preprocessing configuration"
+    )
+    retry_config: RetrySettings = Field(
+        default_factory=RetrySettings, description="LLM retry configuration"
+    )
+    transport_config: TransportSettings = Field(
+        default_factory=TransportSettings, description="LLM transport configuration"
+    )
+    session_config: SessionSettings = Field(
+        default_factory=SessionSettings, description="Session journal configuration"
+    )
+    blob_config: BlobSettings = Field(
+        default_factory=BlobSettings, description="Blob store configuration"
+    )
+    loop_config: LoopDetectionSettings = Field(
+        default_factory=LoopDetectionSettings,
+        description="Loop detection configuration",
+    )
 
     class Config:
         arbitrary_types_allowed = True
@@ -145,9 +372,13 @@ class Config:
     def _load_initial_config(self):
         raw_config = self._load_config()
         base_llm = raw_config.get("llm", {})
+        # [llm.router] configures the router, it is not a model profile
         llm_overrides = {
-            k: v for k, v in raw_config.get("llm", {}).items() if isinstance(v, dict)
+            k: v
+            for k, v in raw_config.get("llm", {}).items()
+            if isinstance(v, dict) and k != "router"
         }
+        router_settings = RouterSettings(**base_llm.get("router", {}))
 
         default_settings = {
             "model": base_llm.get("model"),
@@ -158,6 +389,13 @@ class Config:
             "temperature": base_llm.get("temperature", 1.0),
             "api_type": base_llm.get("api_type", ""),
             "api_version": base_llm.get("api_version", ""),
+            "requests_per_minute": base_llm.get("requests_per_minute"),
+            "tokens_per_minute": base_llm.get("tokens_per_minute"),
+            "max_concurrency": base_llm.get("max_concurrency"),
+            "stream_usage": base_llm.get("stream_usage", False),
+            "context_budget": base_llm.get("context_budget"),
+            "coalesce_requests": base_llm.get("coalesce_requests", False),
+            "adaptive_max_tokens": base_llm.get("adaptive_max_tokens", False),
         }
 
         # handle browser config.
@@ -202,6 +440,22 @@ class Config:
             sandbox_settings = SandboxSettings(**sandbox_config)
         else:
             sandbox_settings = SandboxSettings()
+        cache_config = raw_config.get("cache", {})
+        cache_settings = CacheSettings(**cache_config)
+        http_config = raw_config.get("http", {})
+        http_settings = HTTPSettings(**http_config)
+        image_config = raw_config.get("image", {})
+        image_settings = ImageSettings(**image_config)
+        retry_config = raw_config.get("retry", {})
+        retry_settings = RetrySettings(**retry_config)
+        transport_config = raw_config.get("transport", {})
+        transport_settings = TransportSettings(**transport_config)
+        session_config = raw_config.get("session", {})
+        session_settings = SessionSettings(**session_config)
+        blob_config = raw_config.get("blobs", {})
+        blob_settings = BlobSettings(**blob_config)
+        loop_config = raw_config.get("loop_detection", {})
+        loop_settings = LoopDetectionSettings(**loop_config)
 
         config_dict = {
             "llm": {
@@ -214,6 +468,15 @@ class Config:
             "sandbox": sandbox_settings,
             "browser_config": browser_settings,
             "search_config": search_settings,
+            "cache_config": cache_settings,
+            "http_config": http_settings,
+            "router_config": router_settings,
+            "image_config": image_settings,
+            "retry_config": retry_settings,
+            "transport_config": transport_settings,
+            "session_config": session_settings,
+            "blob_config": blob_settings,
+            "loop_config": loop_settings,
         }
 
         self._config = AppConfig(**config_dict)
@@ -234,6 +497,42 @@ class Config:
     def search_config(self) -> Optional[SearchSettings]:
         return self._config.search_config
 
+    @property
+    def cache_config(self) -> CacheSettings:
+        return self._config.cache_config
+
+    @property
+    def http_config(self) -> HTTPSettings:
+        return self._config.http_config
+
+    @property
+    def router_config(self) -> RouterSettings:
+        return self._config.router_config
+
+    @property
+    def image_config(self) -> ImageSettings:
+        return self._config.image_config
+
+    @property
+    def retry_config(self) -> RetrySettings:
+        return self._config.retry_config
+
+    @property
+    def transport_config(self) -> TransportSettings:
+        return self._config.transport_config
+
+    @property
+    def session_config(self) -> SessionSettings:
+        return self._config.session_config
+
+    @property
+    def blob_config(self) -> BlobSettings:
+        return self._config.blob_config
+
+    @property
+    def loop_config(self) -> LoopDetectionSettings:
+        return self._config.loop_config
+
     @property
     def workspace_root(self) -> Path:
         """Get the workspace root directory"""
@@ -0,0 +1,252 @@
+"""Compaction of agent memory to fit a per-request token budget."""
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.logger import logger
+from app.metrics import metrics
+from app.prompt.context import PREVIOUS_SUMMARY, SUMMARY_MESSAGE, SUMMARY_PROMPT
+from app.schema import Message, Role
+
+
+class ContextCompactor:
+    """Shrinks the messages sent to the LLM without touching Memory.
+
+    Stages run from cheapest to most expensive and stop as soon as the
+    history fits the budget:
+
+    1. Screenshots are dropped from all but the newest `keep_images` messages.
+    2. Tool observations older than the last `keep_recent` messages are cut
+       down to `elide_chars` characters.
+    3. The oldest messages are folded into a summary written by the LLM.
+       The summary is extended incrementally with newly folded messages and
+       reused on later steps, so it is only regenerated when more history
+       has to be folded.
+
+    Tool results are never separated from the assistant message that
+    requested them. Rewritten messages are cached per original message, so
+    their formatting and token counts are memoized across steps too.
+    """
+
+    def __init__(
+        self,
+        keep_images: int = 1,
+        keep_recent: int = 6,
+        elide_chars: int = 2000,
+        fold_ratio: float = 0.6,
+        summary_words: int = 400,
+    ):
+        self.keep_images = keep_images
+        self.keep_recent = keep_recent
+        self.elide_chars = elide_chars
+        # Fold until the history is this fraction of the budget, so a
+        # summary is not regenerated on every step
+        self.fold_ratio = fold_ratio
+        self.summary_words = summary_words
+
+        self.summary: Optional[str] = None
+        # First message after the summarized prefix
+        self._summary_next: Optional[Message] = None
+        self._summary_message: Optional[Message] = None
+        self._rewritten: Dict[Tuple[int, str], Tuple[Message, Message]] = {}
+
+    def reset(self) -> None:
+        """Forget the cached summary and rewritten messages"""
+        self.summary = None
+        self._summary_next = None
+        self._summary_message = None
+        self._rewritten.clear()
+
+    async def compact(self, messages: List[Message], budget: int, llm) -> List[Message]:
+        """Return messages rewritten to fit within budget tokens.
+
+        Args:
+            messages: The agent's memory, which is not modified
+            budget: Token budget for these messages (excluding system and tools)
+            llm: The LLM used to count tokens and write summaries
+        """
+        count: Callable[[Message], int] = llm.count_message
+        self._prune(messages)
+        working = self._apply_summary(self._drop_orphans(list(messages)))
+        if self._total(working, count) <= budget:
+            return working
+
+        working = self._strip_images(working)
+        if self._total(working, count) <= budget:
+            metrics.increment("context.images_dropped")
+            return working
+
+        working = self._elide_observations(working)
+        if self._total(working, count) <= budget:
+            metrics.increment("context.observations_elided")
+            return working
+
+        working = await self._fold(working, budget, count, llm)
+        total = self._total(working, count)
+        if total > budget:
+            logger.warning(
+                f"Context still {total} tokens after compaction (budget {budget})"
+            )
+        return working
+
+    def _prune(self, messages: List[Message]) -> None:
+        """Forget rewrites of messages that are no longer in memory"""
+        live = {id(message) for message in messages}
+        # Elided messages may be rewrites of image-stripped ones
+        for stage in ("image", "elide"):
+            for key in [key for key in self._rewritten if key[1] == stage]:
+                if key[0] in live:
+                    live.add(id(self._rewritten[key][1]))
+                else:
+                    del self._rewritten[key]
+
+    def _original(self, message: Message) -> Message:
+        """Return the memory message a rewritten message was derived from"""
+        for original, rewritten in list(self._rewritten.values()):
+            if rewritten is message:
+                return self._original(original)
+        return message
+
+    @staticmethod
+    def _total(messages: List[Message], count: Callable[[Message], int]) -> int:
+        return sum(count(message) for message in messages)
+
+    @staticmethod
+    def _drop_orphans(messages: List[Message]) -> List[Message]:
+        """Remove tool results whose assistant tool call is not in the list"""
+        requested = set()
+        kept = []
+        for message in messages:
+            if message.role == Role.ASSISTANT and message.tool_calls:
+                requested.update(call.id for call in message.tool_calls)
+            elif message.role == Role.TOOL and message.tool_call_id not in requested:
+                continue
+            kept.append(message)
+        return kept
+
+    def _apply_summary(self, messages: List[Message]) -> List[Message]:
+        if self.summary is None:
+            return messages
+        for index, message in enumerate(messages):
+            if message is self._summary_next:
+                return [self._summary_message] + messages[index:]
+        # The history was cleared or replaced, so the summary no longer applies
+        logger.info("Conversation history changed, discarding compaction summary")
+        self.summary = None
+        self._summary_next = None
+        self._summary_message = None
+        return messages
+
+    def _rewrite(self, message: Message, stage: str, **changes) -> Message:
+        key = (id(message), stage)
+        cached = self._rewritten.get(key)
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        rewritten = message.replace(**changes)
+        # Keep a reference to the original so its id is not reused
+        self._rewritten[key] = (message, rewritten)
+        return rewritten
+
+    def _strip_images(self, messages: List[Message]) -> List[Message]:
+        with_images = [
+            index for index, message in enumerate(messages) if message.image_ref
+        ]
+        stale = set(with_images[: max(len(with_images) - self.keep_images, 0)])
+        return [
+            self._rewrite(message, "image", image_ref=None)
+            if index in stale
+            else message
+            for index, message in enumerate(messages)
+        ]
+
+    def _elide_observations(self, messages: List[Message]) -> List[Message]:
+        cutoff = len(messages) - self.keep_recent
+        result = []
+        for index, message in enumerate(messages):
+            content = message.content or ""
+            if (
+                index < cutoff
+                and message.role == Role.TOOL
+                and len(content) > self.elide_chars
+            ):
+                elided = len(content) - self.elide_chars
+                message = self._rewrite(
+                    message,
+                    "elide",
+                    content=f"{content[: self.elide_chars]}\n... [{elided} characters elided]",
+                )
+            result.append(message)
+        return result
+
+    async def _fold(
+        self,
+        messages: List[Message],
+        budget: int,
+        count: Callable[[Message], int],
+        llm,
+    ) -> List[Message]:
+        """Fold the oldest messages into the summary until the rest fits"""
+        start = 1 if messages and messages[0] is self._summary_message else 0
+        target = int(budget * self.fold_ratio)
+        remaining = self._total(messages[start:], count)
+
+        boundary = start
+        last = len(messages) - self.keep_recent
+        while boundary < last and remaining > target:
+            remaining -= count(messages[boundary])
+            boundary += 1
+        # Never start the kept part with tool results of a folded tool call
+        while boundary < len(messages) and messages[boundary].role == Role.TOOL:
+            remaining -= count(messages[boundary])
+            boundary += 1
+        if boundary == start or boundary >= len(messages):
+            return messages
+
+        folded = messages[start:boundary]
+        try:
+            summary = await self._summarize(folded, llm)
+        except Exception as e:
+            # Better to lose old context than to fail the step
+            logger.warning(f"Failed to summarize context, dropping it instead: {e}")
+            summary = (
+                f"{self.summary or ''}\n[{len(folded)} older messages omitted]".strip()
+            )
+
+        self.summary = summary
+        self._summary_next = self._original(messages[boundary])
+        self._summary_message = Message.user_message(
+            SUMMARY_MESSAGE.format(summary=summary)
+        )
+        metrics.increment("context.messages_folded", len(folded))
+        logger.info(f"Compacted {len(folded)} older messages into a summary")
+        return [self._summary_message] + messages[boundary:]
+
+    async def _summarize(self, messages: List[Message], llm) -> str:
+        previous = PREVIOUS_SUMMARY.format(summary=self.summary) if self.summary else ""
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_words,
+            previous=previous,
+            transcript=self._transcript(messages),
+        )
+        with metrics.timer("context.summarize"):
+            return await llm.ask(
+                [Message.user_message(prompt)],
+                stream=False,
+                temperature=0,
+                purpose="summarize",
+            )
+
+    def _transcript(self, messages: List[Message]) -> str:
+        lines = []
+        for message in messages:
+            content = message.content or ""
+            if len(content) > self.elide_chars:
+                content = content[: self.elide_chars] + " ..."
+            if message.tool_calls:
+                calls = ", ".join(
+                    f"{call.function.name}({call.function.arguments[:200]})"
+                    for call in message.tool_calls
+                )
+                content = f"{content}\n[tool calls: {calls}]".strip()
+            if message.image_ref:
+                content += "\n[screenshot]"
+            lines.append(f"{message.role}: {content}")
+        return "\n\n".join(lines)
@@ -0,0 +1,100 @@
+"""Process-wide registry of tiktoken encodings, loaded in the background."""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import tiktoken
+
+from app.config import config
+from app.logger import logger
+
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+class LazyEncoding:
+    """Stands in for a tiktoken Encoding while it loads on a background thread.
+
+    Only the first use waits for the load to finish; afterwards calls go
+    straight to the loaded encoding.
+    """
+
+    def __init__(self, name: str, future: Future):
+        self.name = name
+        self._future = future
+        self._encoding: Optional[tiktoken.Encoding] = None
+
+    def _get(self) -> tiktoken.Encoding:
+        if self._encoding is None:
+            self._encoding = self._future.result()
+        return self._encoding
+
+    @property
+    def loaded(self) -> bool:
+        return self._future.done()
+
+    def encode(self, text: str, **kwargs) -> List[int]:
+        return self._get().encode(text, **kwargs)
+
+    def decode(self, tokens: List[int], **kwargs) -> str:
+        return self._get().decode(tokens, **kwargs)
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+
+_lock = threading.Lock()
+_encodings: Dict[str, LazyEncoding] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def encoding_name_for_model(model: str) -> str:
+    """Return the tiktoken encoding used by a model, cl100k_base if unknown"""
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        # If the model is not in tiktoken's presets, use cl100k_base as default
+        return DEFAULT_ENCODING
+
+
+def _load(name: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.error(f"Failed to load tokenizer {name}: {e}")
+        raise
+
+
+def get_encoding(name: str) -> LazyEncoding:
+    """Return the shared encoding called name, starting to load it if needed"""
+    global _executor
+    with _lock:
+        encoding = _encodings.get(name)
+        # A failed load (e.g. no network for the BPE file) is retried
+        if encoding is None or (
+            encoding.loaded and encoding._future.exception() is not None
+        ):
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix="tokenizer"
+                )
+            encoding = LazyEncoding(name, _executor.submit(_load, name))
+            _encodings[name] = encoding
+        return encoding
+
+
+def get_encoding_for_model(model: str) -> LazyEncoding:
+    """Return the shared encoding for a model"""
+    return get_encoding(encoding_name_for_model(model))
+
+
+def preload(models: Optional[Iterable[str]] = None) -> None:
+    """Start loading the encodings for models without waiting for them.
+
+    Defaults to the models of all configured LLM profiles, so entry points
+    can load them while they wait for input.
+    """
+    if models is None:
+        models = [settings.model for settings in config.llm.values()]
+    for model in models:
+        get_encoding_for_model(model)
@@ -11,3 +11,15 @@ class OpenManusError(Exception):
 
 class TokenLimitExceeded(OpenManusError):
     """Exception raised when the token limit is exceeded"""
+
+
+class DeadlineExceeded(OpenManusError):
+    """Exception raised when a run's deadline passes before an LLM request completes"""
+
+
+class EmptyResponseError(OpenManusError, ValueError):
+    """Exception raised when the LLM returns an empty response"""
+
+
+class StreamInterrupted(OpenManusError):
+    """Exception raised when a stream fails after part of it was delivered"""
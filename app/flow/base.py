@@ -5,6 +5,7 @@ from typing import Dict, List, Optional, Union
 from pydantic import BaseModel
 
 from app.agent.base import BaseAgent
+from app.session import SessionStore
 
 
 class FlowType(str, Enum):
@@ -17,6 +18,7 @@ class BaseFlow(BaseModel, ABC):
     agents: Dict[str, BaseAgent]
     tools: Optional[List] = None
     primary_agent_key: Optional[str] = None
+    session: Optional[SessionStore] = None  # Shared with agents that have none
 
     class Config:
         arbitrary_types_allowed = True
@@ -44,6 +46,11 @@ class BaseFlow(BaseModel, ABC):
         # Initialize using BaseModel's init
         super().__init__(**data)
 
+        if self.session is not None:
+            for agent in self.agents.values():
+                if agent.session is None:
+                    agent.session = self.session
+
     @property
     def primary_agent(self) -> Optional[BaseAgent]:
         """Get the primary agent for the flow"""
@@ -55,6 +62,8 @@ class BaseFlow(BaseModel, ABC):
 
     def add_agent(self, key: str, agent: BaseAgent) -> None:
         """Add a new agent to the flow"""
+        if self.session is not None and agent.session is None:
+            agent.session = self.session
         self.agents[key] = agent
 
     @abstractmethod
@@ -2,12 +2,14 @@ import json
 import time
 from typing import Dict, List, Optional, Union
 
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from app.agent.base import BaseAgent
+from app.config import config
 from app.flow.base import BaseFlow, PlanStepStatus
 from app.llm import LLM
 from app.logger import logger
+from app.retry import deadline
 from app.schema import AgentState, Message, ToolChoice
 from app.tool import PlanningTool
 
@@ -21,6 +23,10 @@ class PlanningFlow(BaseFlow):
     active_plan_id: str = Field(default_factory=lambda: f"plan_{int(time.time())}")
     current_step_index: Optional[int] = None
 
+    _session_restored: bool = PrivateAttr(default=False)
+    # Step results of the interrupted execution restored from the session
+    _resumed_results: Optional[List[str]] = PrivateAttr(default=None)
+
     def __init__(
         self, agents: Union[BaseAgent, List[BaseAgent], Dict[str, BaseAgent]], **data
     ):
@@ -63,12 +69,22 @@ class PlanningFlow(BaseFlow):
 
     async def execute(self, input_text: str) -> str:
         """Execute the planning flow with agents."""
+        # The whole flow shares one deadline; each agent run can only shorten it
+        with deadline(config.retry_config.run_deadline):
+            return await self._execute(input_text)
+
+    async def _execute(self, input_text: str) -> str:
         try:
             if not self.primary_agent:
                 raise ValueError("No primary agent available")
 
+            # An interrupted execution continues with its plan and step results
+            self.restore_session()
+            resumed, self._resumed_results = self._resumed_results, None
+            result = "".join(step + "\n" for step in resumed or [])
+
             # Create initial plan if input provided
-            if input_text:
+            if input_text and resumed is None:
                 await self._create_initial_plan(input_text)
 
                 # Verify plan was created successfully
@@ -77,8 +93,8 @@ class PlanningFlow(BaseFlow):
                         f"Plan creation failed. Plan ID {self.active_plan_id} not found in planning tool."
                     )
                     return f"Failed to create plan for: {input_text}"
+                self._checkpoint("start")
 
-            result = ""
             while True:
                 # Get current step to execute
                 self.current_step_index, step_info = await self._get_current_step_info()
@@ -86,6 +102,7 @@ class PlanningFlow(BaseFlow):
                 # Exit if no more steps or plan completed
                 if self.current_step_index is None:
                     result += await self._finalize_plan()
+                    self._checkpoint("end")
                     break
 
                 # Execute current step with appropriate agent
@@ -93,9 +110,11 @@ class PlanningFlow(BaseFlow):
                 executor = self.get_executor(step_type)
                 step_result = await self._execute_step(executor, step_info)
                 result += step_result + "\n"
+                self._checkpoint("step", step_result)
 
                 # Check if agent wants to terminate
                 if hasattr(executor, "state") and executor.state == AgentState.FINISHED:
+                    self._checkpoint("end")
                     break
 
             return result
@@ -103,6 +122,41 @@ class PlanningFlow(BaseFlow):
             logger.error(f"Error in PlanningFlow: {str(e)}")
             return f"Execution failed: {str(e)}"
 
+    def restore_session(self) -> bool:
+        """Restore the plans from the session, once per flow.
+
+        Returns:
+            Whether the next execution continues an interrupted one.
+        """
+        if self.session is None or self._session_restored:
+            return self._resumed_results is not None
+        self._session_restored = True
+        self.session.restore(self.planning_tool, "flow.plan", "flow.run")
+
+        last = self.session.last_event("flow.run")
+        if last is None or last[1] == "end":
+            return False
+
+        self.active_plan_id = last[2]["plan_id"]
+        results: List[str] = []
+        for _, kind, data in self.session.events("flow.run"):
+            if kind == "start":
+                results = []
+            elif kind == "step":
+                results.append(data["result"])
+        self._resumed_results = results
+        logger.info(f"Resuming plan {self.active_plan_id} after {len(results)} steps")
+        return True
+
+    def _checkpoint(self, kind: str, result: Optional[str] = None) -> None:
+        """Mark the plans as consistent after a step of the flow"""
+        if self.session is None:
+            return
+        data = {"plan_id": self.active_plan_id}
+        if result is not None:
+            data["result"] = result
+        self.session.checkpoint("flow.run", kind, data)
+
     async def _create_initial_plan(self, request: str) -> None:
         """Create an initial plan based on the request using the flow's LLM and PlanningTool."""
         logger.info(f"Creating initial plan with ID: {self.active_plan_id}")
@@ -125,6 +179,7 @@ class PlanningFlow(BaseFlow):
             system_msgs=[system_message],
             tools=[self.planning_tool.to_param()],
             tool_choice=ToolChoice.AUTO,
+            purpose="plan",
         )
 
         # Process tool calls if present
@@ -370,7 +425,7 @@ class PlanningFlow(BaseFlow):
             )
 
             response = await self.llm.ask(
-                messages=[user_message], system_msgs=[system_message]
+                messages=[user_message], system_msgs=[system_message], purpose="summary"
             )
 
             return f"Plan completed:\n\n{response}"
@@ -0,0 +1,89 @@
+"""HTTP connection pools shared by all LLM clients."""
+import importlib.util
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import HTTPSettings, config
+from app.logger import logger
+
+
+class SharedHTTPClient:
+    """A tuned httpx.AsyncClient shared by every profile using one endpoint."""
+
+    def __init__(self, origin: str, settings: HTTPSettings):
+        self.origin = origin
+        self.settings = settings
+        self.requests = 0
+
+        http2 = settings.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning(
+                "HTTP/2 requested but the h2 package is missing, using HTTP/1.1"
+            )
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_keepalive_connections,
+            keepalive_expiry=settings.keepalive_expiry,
+        )
+        self.transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+        self.client = httpx.AsyncClient(
+            transport=self.transport,
+            # The OpenAI SDK passes its own per-request timeout
+            timeout=httpx.Timeout(600.0, connect=settings.connect_timeout),
+            follow_redirects=True,
+            event_hooks={"request": [self._on_request]},
+        )
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Connection pool utilization for this endpoint"""
+        pool = getattr(self.transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "requests": self.requests,
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            "max_connections": self.settings.max_connections,
+        }
+
+
+_clients: Dict[str, SharedHTTPClient] = {}
+
+
+def _origin(base_url: str) -> str:
+    parts = urlsplit(base_url)
+    if not parts.scheme or not parts.netloc:
+        return base_url
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def get_http_client(
+    base_url: str, settings: Optional[HTTPSettings] = None
+) -> httpx.AsyncClient:
+    """Return the shared HTTP client for the endpoint serving base_url"""
+    origin = _origin(base_url)
+    shared = _clients.get(origin)
+    if shared is None or shared.client.is_closed:
+        shared = SharedHTTPClient(origin, settings or config.http_config)
+        _clients[origin] = shared
+    return shared.client
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """Return connection pool utilization keyed by endpoint"""
+    return {origin: shared.stats() for origin, shared in _clients.items()}
+
+
+async def close_http_clients() -> None:
+    """Close every shared client, e.g. on application shutdown"""
+    for shared in _clients.values():
+        await shared.client.aclose()
+    _clients.clear()
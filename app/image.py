@@ -0,0 +1,263 @@
+"""Preprocessing of images sent to multimodal models."""
+import base64
+import binascii
+import hashlib
+import io
+import struct
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union
+
+from PIL import Image, ImageChops
+
+from app.config import ImageSettings, config
+from app.logger import logger
+from app.metrics import metrics
+
+
+# Start-of-frame markers, which carry the dimensions of a JPEG image
+_JPEG_SOF_MARKERS = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF
+}  # fmt: skip
+
+OMITTED_IMAGE_TEXT = "[Image identical to the previous one omitted]"
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """Read (width, height) from the header of a PNG, JPEG, GIF or WebP image.
+
+    Only the header is parsed, so a prefix of the file is enough; None is
+    returned if the format is unknown or the prefix too short.
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(data[21:25], "little")
+            return 1 + (bits & 0x3FFF), 1 + ((bits >> 14) & 0x3FFF)
+        if chunk == b"VP8X":
+            width = 1 + int.from_bytes(data[24:27], "little")
+            height = 1 + int.from_bytes(data[27:30], "little")
+            return width, height
+        return None
+    if data[:2] == b"\xff\xd8":
+        index = 2
+        while index + 9 <= len(data):
+            if data[index] != 0xFF:
+                index += 1
+                continue
+            marker = data[index + 1]
+            if marker == 0xFF:
+                index += 1
+            elif marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                index += 2
+            elif marker in _JPEG_SOF_MARKERS:
+                height, width = struct.unpack(">HH", data[index + 5 : index + 9])
+                return width, height
+            else:
+                (length,) = struct.unpack(">H", data[index + 2 : index + 4])
+                index += 2 + length
+    return None
+
+
+def image_mime_type(data: bytes) -> str:
+    """Return the MIME type of an image from its magic bytes (JPEG if unknown)"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def _decode_prefix(base64_image: str, chars: int) -> bytes:
+    prefix = base64_image[: chars - chars % 4]
+    try:
+        return base64.b64decode(prefix)
+    except (binascii.Error, ValueError):
+        return b""
+
+
+def base64_mime_type(base64_image: str) -> str:
+    """Return the MIME type of a base64 encoded image"""
+    return image_mime_type(_decode_prefix(base64_image, 16))
+
+
+def base64_image_size(base64_image: str) -> Optional[Tuple[int, int]]:
+    """Return (width, height) of a base64 image, decoding as little as possible"""
+    # JPEG dimensions follow the EXIF and quantization tables, usually in the
+    # first few kilobytes
+    for chars in (4096, 65536, len(base64_image) + 4):
+        size = image_size(_decode_prefix(base64_image, chars))
+        if size is not None or chars > len(base64_image):
+            return size
+    return None
+
+
+def data_url_size(url: str) -> Optional[Tuple[int, int]]:
+    """Return the dimensions of an image embedded in a data URL"""
+    if not url.startswith("data:image/") or ";base64," not in url:
+        return None
+    return base64_image_size(url.split(",", 1)[1])
+
+
+def fit_to_tile_grid(
+    width: int, height: int, settings: Optional[ImageSettings] = None
+) -> Tuple[int, int]:
+    """Return the size an image is scaled down to before it is sent.
+
+    Providers scale high detail images to fit a 2048px square with the
+    shortest side at most 768px before cutting them into tiles, so pixels
+    beyond that are uploaded only to be thrown away.
+    """
+    settings = settings or config.image_config
+    scale = min(
+        1.0,
+        settings.max_long_side / max(width, height),
+        settings.max_short_side / min(width, height),
+    )
+    return max(round(width * scale), 1), max(round(height * scale), 1)
+
+
+def prepare_image(base64_image: str) -> str:
+    """Downscale an image to the model's tile grid and re-encode it as JPEG.
+
+    Images that are already small enough JPEGs, or that cannot be parsed,
+    are returned unchanged after reading their header, so preparing an image
+    twice is cheap. Nothing is cached here: messages keep prepared images in
+    the blob store, which bounds the memory they take.
+    """
+    settings = config.image_config
+    if not settings.enabled:
+        return base64_image
+    size = base64_image_size(base64_image)
+    if size is None:
+        return base64_image
+    target = fit_to_tile_grid(*size, settings)
+    if target == size and base64_mime_type(base64_image) == "image/jpeg":
+        return base64_image
+
+    try:
+        with metrics.timer("image.prepare"):
+            data = base64.b64decode(base64_image)
+            with Image.open(io.BytesIO(data)) as image:
+                image = image.convert("RGB")
+                if target != size:
+                    image = image.resize(target, Image.Resampling.LANCZOS)
+                output = io.BytesIO()
+                image.save(
+                    output, format="JPEG", quality=settings.quality, optimize=True
+                )
+    except Exception as e:
+        logger.warning(f"Failed to preprocess image, sending it unchanged: {e}")
+        return base64_image
+
+    encoded = output.getvalue()
+    if target == size and len(encoded) >= len(data):
+        # Re-encoding alone did not help
+        return base64_image
+    metrics.increment("image.bytes_in", len(data))
+    metrics.increment("image.bytes_out", len(encoded))
+    return base64.b64encode(encoded).decode("ascii")
+
+
+FINGERPRINT_SIZE = 64
+FINGERPRINT_CACHE_SIZE = 256
+
+# Fingerprints keyed by a digest of the image, so cached screenshots are not
+# kept alive by the cache
+_fingerprints: "OrderedDict[bytes, Optional[Image.Image]]" = OrderedDict()
+
+
+def image_fingerprint(base64_image: str) -> Optional[Image.Image]:
+    """Return a perceptual fingerprint of an image: a small grayscale thumbnail.
+
+    Box-filtered 64x64 thumbnails average away JPEG noise and small scaling
+    differences, while changes to layout or larger text still show up as
+    differences of many gray levels. Fingerprints are cached, since the same
+    images are compared again on every request.
+    """
+    key = hashlib.blake2b(base64_image.encode("utf-8"), digest_size=16).digest()
+    if key in _fingerprints:
+        _fingerprints.move_to_end(key)
+        return _fingerprints[key]
+
+    try:
+        data = base64.b64decode(base64_image)
+        with Image.open(io.BytesIO(data)) as image:
+            fingerprint = image.convert("L").resize(
+                (FINGERPRINT_SIZE, FINGERPRINT_SIZE), Image.Resampling.BOX
+            )
+    except Exception:
+        fingerprint = None
+    _fingerprints[key] = fingerprint
+    if len(_fingerprints) > FINGERPRINT_CACHE_SIZE:
+        _fingerprints.popitem(last=False)
+    return fingerprint
+
+
+def images_match(first: Image.Image, second: Image.Image, tolerance: int) -> bool:
+    """Return whether no fingerprint pixel differs by more than tolerance"""
+    return ImageChops.difference(first, second).getextrema()[1] <= tolerance
+
+
+def _data_url_payload(block: dict) -> Optional[str]:
+    if block.get("type") != "image_url":
+        return None
+    url = (block.get("image_url") or {}).get("url", "")
+    if not url.startswith("data:image/") or ";base64," not in url:
+        return None
+    return url.split(",", 1)[1]
+
+
+def dedupe_images(
+    messages: List[dict], settings: Optional[ImageSettings] = None
+) -> List[dict]:
+    """Replace images that are the same as the previous image with a note.
+
+    Without a tolerance only exact copies are omitted; with one, images
+    whose fingerprints differ by at most that many gray levels. Formatted
+    messages are shared with the Message cache, so messages with an omitted
+    image are copied instead of modified.
+    """
+    settings = settings or config.image_config
+    if not settings.dedupe:
+        return messages
+
+    tolerance = settings.dedupe_tolerance
+    result = []
+    previous: Union[Image.Image, str, None] = None
+    for message in messages:
+        content = message.get("content")
+        if not isinstance(content, list):
+            result.append(message)
+            continue
+        blocks = []
+        for block in content:
+            payload = _data_url_payload(block) if isinstance(block, dict) else None
+            current = (
+                image_fingerprint(payload) if payload and tolerance else payload or None
+            )
+            if current is None:
+                blocks.append(block)
+                continue
+            if previous is not None and (
+                images_match(previous, current, tolerance)
+                if tolerance
+                else previous == current
+            ):
+                metrics.increment("image.deduplicated")
+                blocks.append({"type": "text", "text": OMITTED_IMAGE_TEXT})
+            else:
+                blocks.append(block)
+            previous = current
+        if any(new is not old for new, old in zip(blocks, content)):
+            message = {**message, "content": blocks}
+        result.append(message)
+    return result
@@ -1,7 +1,21 @@
+import asyncio
+import json
 import math
-from typing import Dict, List, Optional, Union
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Union,
+)
 
-import tiktoken
 from openai import (
     APIError,
     AsyncAzureOpenAI,
@@ -10,25 +24,37 @@ from openai import (
     OpenAIError,
     RateLimitError,
 )
+from openai.types.chat.chat_completion import ChatCompletion
 from openai.types.chat.chat_completion_message import ChatCompletionMessage
-from tenacity import (
-    retry,
-    retry_if_exception_type,
-    stop_after_attempt,
-    wait_random_exponential,
+from openai.types.chat.chat_completion_message_tool_call import (
+    ChatCompletionMessageToolCall,
 )
+from openai.types.completion_usage import CompletionUsage
 
+from app.bedrock import BedrockClient
+from app.budget import CompletionBudget
+from app.cache import ResponseCache, get_response_cache
 from app.config import LLMSettings, config
-from app.exceptions import TokenLimitExceeded
+from app.encoders import get_encoding_for_model
+from app.exceptions import EmptyResponseError, StreamInterrupted, TokenLimitExceeded
+from app.http_pool import get_http_client
+from app.image import data_url_size, dedupe_images
 from app.logger import logger  # Assuming a logger is set up in your app
+from app.metrics import metrics
+from app.rate_limiter import get_rate_limiter, retry_after_seconds
+from app.retry import RetryPolicy, cap_timeout, with_retry
 from app.schema import (
     ROLE_VALUES,
     TOOL_CHOICE_TYPE,
     TOOL_CHOICE_VALUES,
     Message,
     ToolChoice,
+    format_wire_message,
+    materialize_images,
 )
-from app.bedrock import BedrockClient
+from app.single_flight import SingleFlight
+from app.streaming import StdoutSink, StreamSink
+from app.transport import to_jsonable, wrap_client
 
 
 REASONING_MODELS = ["o1", "o3-mini"]
@@ -54,8 +80,15 @@ class TokenCounter:
     HIGH_DETAIL_TARGET_SHORT_SIDE = 768
     TILE_SIZE = 512
 
-    def __init__(self, tokenizer):
+    # Number of per-message token counts kept in the LRU cache
+    MESSAGE_CACHE_SIZE = 2048
+
+    def __init__(self, tokenizer, cache_size: int = MESSAGE_CACHE_SIZE):
         self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self._message_cache: OrderedDict[Hashable, int] = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def count_text(self, text: str) -> int:
         """Calculate tokens for a text string"""
@@ -71,8 +104,14 @@ class TokenCounter:
         2. Scale shortest side to 768px
         3. Count 512px tiles (170 tokens each)
         4. Add 85 tokens
+
+        Dimensions of images embedded as data URLs are read from the image
+        header, so their count is exact.
         """
-        detail = image_item.get("detail", "medium")
+        image_url = image_item.get("image_url") or {}
+        detail = image_item.get("detail") or image_url.get("detail") or "medium"
+        if detail == "auto":
+            detail = "medium"
 
         # For low detail, always return fixed token count
         if detail == "low":
@@ -87,6 +126,9 @@ class TokenCounter:
             if "dimensions" in image_item:
                 width, height = image_item["dimensions"]
                 return self._calculate_high_detail_tokens(width, height)
+            size = data_url_size(image_url.get("url", ""))
+            if size is not None:
+                return self._calculate_high_detail_tokens(*size)
 
         # Default values when dimensions aren't available or detail level is unknown
         if detail == "high":
@@ -107,8 +149,9 @@ class TokenCounter:
             width = int(width * scale)
             height = int(height * scale)
 
-        # Step 2: Scale so shortest side is HIGH_DETAIL_TARGET_SHORT_SIDE
-        scale = self.HIGH_DETAIL_TARGET_SHORT_SIDE / min(width, height)
+        # Step 2: Scale so shortest side is at most HIGH_DETAIL_TARGET_SHORT_SIDE
+        # (smaller images are not scaled up)
+        scale = min(1.0, self.HIGH_DETAIL_TARGET_SHORT_SIDE / min(width, height))
         scaled_width = int(width * scale)
         scaled_height = int(height * scale)
 
@@ -151,31 +194,229 @@ class TokenCounter:
                 token_count += self.count_text(function.get("arguments", ""))
         return token_count
 
+    @classmethod
+    def _freeze(cls, value: Any) -> Hashable:
+        """Convert a message value into a hashable cache key.
+
+        Strings cache their hash, so keys built from the same content objects
+        are cheap to look up on every step.
+        """
+        if isinstance(value, dict):
+            return tuple((key, cls._freeze(item)) for key, item in value.items())
+        if isinstance(value, (list, tuple)):
+            return tuple(cls._freeze(item) for item in value)
+        return value
+
+    def _count_single_message(self, message: dict) -> int:
+        """Calculate the tokens of one message without consulting the cache"""
+        tokens = self.BASE_MESSAGE_TOKENS  # Base tokens per message
+
+        # Add role tokens
+        tokens += self.count_text(message.get("role", ""))
+
+        # Add content tokens
+        if "content" in message:
+            tokens += self.count_content(message["content"])
+
+        # Add tool calls tokens
+        if "tool_calls" in message:
+            tokens += self.count_tool_calls(message["tool_calls"])
+
+        # Add name and tool_call_id tokens
+        tokens += self.count_text(message.get("name", ""))
+        tokens += self.count_text(message.get("tool_call_id", ""))
+
+        return tokens
+
+    def count_message(self, message: dict) -> int:
+        """Calculate the tokens of one message, memoized by message content"""
+        if self.cache_size <= 0:
+            return self._count_single_message(message)
+
+        key = self._freeze(message)
+        tokens = self._message_cache.get(key)
+        if tokens is not None:
+            self._message_cache.move_to_end(key)
+            self.cache_hits += 1
+            return tokens
+
+        self.cache_misses += 1
+        tokens = self._count_single_message(message)
+        self._message_cache[key] = tokens
+        while len(self._message_cache) > self.cache_size:
+            self._message_cache.popitem(last=False)
+        return tokens
+
     def count_message_tokens(self, messages: List[dict]) -> int:
         """Calculate the total number of tokens in a message list"""
         total_tokens = self.FORMAT_TOKENS  # Base format tokens
 
         for message in messages:
-            tokens = self.BASE_MESSAGE_TOKENS  # Base tokens per message
+            total_tokens += self.count_message(message)
+
+        return total_tokens
+
+    def clear_cache(self) -> None:
+        """Drop all memoized per-message token counts"""
+        self._message_cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class _WriteTracker(StreamSink):
+    """Forwards to another sink, noting whether any text was written"""
+
+    def __init__(self, sink: StreamSink):
+        self.sink = sink
+        self.written = False
+        self.ended = False
+
+    async def write(self, text: str) -> None:
+        if text:
+            self.written = True
+        await self.sink.write(text)
+
+    async def end(self) -> None:
+        self.ended = True
+        await self.sink.end()
+
+
+class ToolCallAssembler:
+    """Assembles streamed chat completion deltas into a complete message.
+
+    Tool calls are released as soon as their JSON arguments parse, so
+    callers can act on them before generation has finished. Calls whose
+    arguments never parse are only released by `finish`, at the end of the
+    stream, and fail there like any other malformed tool call.
+    """
+
+    def __init__(self):
+        self.content_parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[CompletionUsage] = None
+        self._calls: Dict[int, dict] = {}
+        self._ready: Dict[int, ChatCompletionMessageToolCall] = {}
+
+    def feed(self, chunk: Any) -> List[ChatCompletionMessageToolCall]:
+        """Consume one stream chunk and return tool calls that became ready"""
+        # With stream_options.include_usage the last chunk carries the usage
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return []
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+
+        delta = choice.delta
+        if delta is None:
+            return []
+        if delta.content:
+            self.content_parts.append(delta.content)
+
+        ready = []
+        for call_delta in delta.tool_calls or []:
+            index = call_delta.index
+            call = self._calls.setdefault(
+                index, {"id": None, "name": "", "arguments": ""}
+            )
+            if call_delta.id:
+                call["id"] = call_delta.id
+            function = call_delta.function
+            if function is not None:
+                if function.name:
+                    call["name"] += function.name
+                if function.arguments:
+                    call["arguments"] += function.arguments
+                    # Only attempt a parse when an object may have just closed
+                    if (
+                        index not in self._ready
+                        and "}" in function.arguments
+                        and self._is_complete_json(call["arguments"])
+                    ):
+                        ready.append(self._release(index))
+        return ready
+
+    def finish(self) -> List[ChatCompletionMessageToolCall]:
+        """Release all tool calls that are still pending at end of stream"""
+        return [
+            self._release(index)
+            for index in sorted(self._calls)
+            if index not in self._ready
+        ]
+
+    @property
+    def started(self) -> bool:
+        """Whether any content or tool call delta has been received"""
+        return bool(self.content_parts or self._calls)
+
+    @property
+    def content(self) -> str:
+        return "".join(self.content_parts)
+
+    @property
+    def tool_calls(self) -> List[ChatCompletionMessageToolCall]:
+        return [self._ready[index] for index in sorted(self._ready)]
+
+    def message(self) -> ChatCompletionMessage:
+        """Build the assembled assistant message"""
+        return ChatCompletionMessage(
+            role="assistant",
+            content=self.content or None,
+            tool_calls=self.tool_calls or None,
+        )
+
+    @staticmethod
+    def _is_complete_json(arguments: str) -> bool:
+        try:
+            json.loads(arguments)
+        except json.JSONDecodeError:
+            return False
+        return True
 
-            # Add role tokens
-            tokens += self.count_text(message.get("role", ""))
+    def _release(self, index: int) -> ChatCompletionMessageToolCall:
+        call = self._calls[index]
+        tool_call = ChatCompletionMessageToolCall(
+            id=call["id"] or f"call_{index}",
+            type="function",
+            function={"name": call["name"], "arguments": call["arguments"]},
+        )
+        self._ready[index] = tool_call
+        return tool_call
 
-            # Add content tokens
-            if "content" in message:
-                tokens += self.count_content(message["content"])
 
-            # Add tool calls tokens
-            if "tool_calls" in message:
-                tokens += self.count_tool_calls(message["tool_calls"])
+def create_client(settings: LLMSettings) -> Union[AsyncOpenAI, BedrockClient]:
+    """Create the API client for an LLM profile, through the configured transport"""
+    return wrap_client(
+        lambda: _create_api_client(settings), bedrock=settings.api_type == "aws"
+    )
+
 
-            # Add name and tool_call_id tokens
-            tokens += self.count_text(message.get("name", ""))
-            tokens += self.count_text(message.get("tool_call_id", ""))
+def _create_api_client(settings: LLMSettings) -> Union[AsyncOpenAI, BedrockClient]:
+    if settings.api_type == "azure":
+        return AsyncAzureOpenAI(
+            base_url=settings.base_url,
+            api_key=settings.api_key,
+            api_version=settings.api_version,
+            http_client=get_http_client(settings.base_url),
+        )
+    if settings.api_type == "aws":
+        return BedrockClient()
+    return AsyncOpenAI(
+        api_key=settings.api_key,
+        base_url=settings.base_url,
+        http_client=get_http_client(settings.base_url),
+    )
 
-            total_tokens += tokens
 
-        return total_tokens
+def _is_routed(config_name: str, profiles: Dict[str, LLMSettings]) -> bool:
+    router_config = config.router_config
+    if not router_config.enabled:
+        return False
+    if config_name in router_config.profiles:
+        return True
+    # Unknown profiles fall back to the default one, so follow its routing
+    return config_name not in profiles and "default" in router_config.profiles
 
 
 class LLM:
@@ -185,6 +426,10 @@ class LLM:
         cls, config_name: str = "default", llm_config: Optional[LLMSettings] = None
     ):
         if config_name not in cls._instances:
+            if cls is LLM and _is_routed(config_name, llm_config or config.llm):
+                from app.router import LLMRouter
+
+                cls = LLMRouter
             instance = super().__new__(cls)
             instance.__init__(config_name, llm_config)
             cls._instances[config_name] = instance
@@ -195,7 +440,10 @@ class LLM:
     ):
         if not hasattr(self, "client"):  # Only initialize if not already initialized
             llm_config = llm_config or config.llm
-            llm_config = llm_config.get(config_name, llm_config["default"])
+            # Names without a profile of their own share the default one
+            profile = config_name if config_name in llm_config else "default"
+            llm_config = llm_config[profile]
+            self.config_name = config_name
             self.model = llm_config.model
             self.max_tokens = llm_config.max_tokens
             self.temperature = llm_config.temperature
@@ -207,31 +455,39 @@ class LLM:
             # Add token counting related attributes
             self.total_input_tokens = 0
             self.total_completion_tokens = 0
+            self.total_cached_tokens = 0
+            self.stream_usage = llm_config.stream_usage
+            self.context_budget = llm_config.context_budget
             self.max_input_tokens = (
                 llm_config.max_input_tokens
                 if hasattr(llm_config, "max_input_tokens")
                 else None
             )
 
-            # Initialize tokenizer
-            try:
-                self.tokenizer = tiktoken.encoding_for_model(self.model)
-            except KeyError:
-                # If the model is not in tiktoken's presets, use cl100k_base as default
-                self.tokenizer = tiktoken.get_encoding("cl100k_base")
-
-            if self.api_type == "azure":
-                self.client = AsyncAzureOpenAI(
-                    base_url=self.base_url,
-                    api_key=self.api_key,
-                    api_version=self.api_version,
-                )
-            elif self.api_type == "aws":
-                self.client = BedrockClient()
-            else:
-                self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+            # Shared tokenizer, loaded in the background until first used
+            self.tokenizer = get_encoding_for_model(self.model)
+
+            self.client = self._create_client(llm_config)
 
             self.token_counter = TokenCounter(self.tokenizer)
+            self.response_cache = get_response_cache()
+            self.rate_limiter = get_rate_limiter(profile, llm_config)
+            self.retry_policy = RetryPolicy.from_settings()
+            self.single_flight = (
+                SingleFlight() if llm_config.coalesce_requests else None
+            )
+            self.completion_budget = (
+                CompletionBudget(self.max_tokens)
+                if llm_config.adaptive_max_tokens
+                else None
+            )
+            # Default destination for streamed tokens when no sink is passed
+            self.stream_sink: StreamSink = StdoutSink()
+
+    def _create_client(
+        self, settings: LLMSettings
+    ) -> Union[AsyncOpenAI, BedrockClient]:
+        return create_client(settings)
 
     def count_tokens(self, text: str) -> int:
         """Calculate the number of tokens in a text"""
@@ -242,17 +498,66 @@ class LLM:
     def count_message_tokens(self, messages: List[dict]) -> int:
         return self.token_counter.count_message_tokens(messages)
 
-    def update_token_count(self, input_tokens: int, completion_tokens: int = 0) -> None:
+    def count_tools_tokens(self, tools: List[dict]) -> int:
+        """Calculate the tokens of tool schemas, reusing the cost cached on ToolParams"""
+        token_costs = getattr(tools, "token_costs", None)
+        if token_costs is not None and self.model in token_costs:
+            return token_costs[self.model]
+        tokens = sum(self.count_tokens(str(tool)) for tool in tools)
+        if token_costs is not None:
+            token_costs[self.model] = tokens
+        return tokens
+
+    def count_message(self, message: Union[dict, Message]) -> int:
+        """Calculate the tokens of a single message, excluding list format overhead"""
+        formatted = self.format_messages([message], self.model in MULTIMODAL_MODELS)
+        if not formatted:
+            return 0
+        return self.token_counter.count_message(formatted[0])
+
+    def update_token_count(
+        self, input_tokens: int, completion_tokens: int = 0, cached_tokens: int = 0
+    ) -> None:
         """Update token counts"""
         # Only track tokens if max_input_tokens is set
         self.total_input_tokens += input_tokens
         self.total_completion_tokens += completion_tokens
+        self.total_cached_tokens += cached_tokens
+        metrics.increment("llm.input_tokens", input_tokens)
+        metrics.increment("llm.completion_tokens", completion_tokens)
+        metrics.increment("llm.cached_tokens", cached_tokens)
         logger.info(
             f"Token usage: Input={input_tokens}, Completion={completion_tokens}, "
+            f"Cached={cached_tokens}, "
             f"Cumulative Input={self.total_input_tokens}, Cumulative Completion={self.total_completion_tokens}, "
             f"Total={input_tokens + completion_tokens}, Cumulative Total={self.total_input_tokens + self.total_completion_tokens}"
         )
 
+    def record_usage(
+        self,
+        usage: Optional[CompletionUsage],
+        input_tokens: int,
+        completion_text: Optional[str] = None,
+    ) -> None:
+        """Update token counts from provider usage, estimating locally if it is missing"""
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            self.update_token_count(
+                usage.prompt_tokens,
+                usage.completion_tokens,
+                (getattr(details, "cached_tokens", None) or 0) if details else 0,
+            )
+            return
+
+        completion_tokens = (
+            self.count_tokens(completion_text) if completion_text is not None else 0
+        )
+        if completion_text is not None:
+            logger.info(
+                f"Estimated completion tokens for streaming response: {completion_tokens}"
+            )
+        self.update_token_count(input_tokens, completion_tokens)
+
     def check_token_limit(self, input_tokens: int) -> bool:
         """Check if token limits are exceeded"""
         if self.max_input_tokens is not None:
@@ -270,9 +575,174 @@ class LLM:
 
         return "Token limit exceeded"
 
+    @asynccontextmanager
+    async def _rate_limited(self, input_tokens: int) -> AsyncIterator[None]:
+        """Hold a rate limiter slot for the duration of a provider request"""
+        if self.rate_limiter is None:
+            yield
+            return
+        async with self.rate_limiter.acquire(input_tokens):
+            try:
+                yield
+            except RateLimitError as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    self.rate_limiter.penalize(retry_after)
+                raise
+
+    def _stream_params(self, params: dict) -> dict:
+        """Return params for a streaming request, asking for usage if enabled"""
+        params = {**params, "stream": True}
+        if self.stream_usage and self.api_type != "aws":
+            params["stream_options"] = {"include_usage": True}
+        return params
+
+    async def _stream_text(
+        self, params: dict, sink: StreamSink
+    ) -> tuple[str, Optional[CompletionUsage]]:
+        """Stream a text completion into sink, returning the full text and usage.
+
+        Raises:
+            EmptyResponseError: If nothing was streamed, before the sink is ended
+            StreamInterrupted: If the stream failed after text was written or
+                the sink ended, so the request must not be retried into it
+        """
+        params = self._stream_params(params)
+        sink = _WriteTracker(sink)
+        try:
+            if self.api_type == "aws":
+                # The Bedrock client writes to the sink itself and returns the
+                # whole response
+                response = await self.client.chat.completions.create(
+                    **params, sink=sink
+                )
+                text, usage = response.choices[0].message.content or "", None
+            else:
+                response = await self.client.chat.completions.create(**params)
+                collected_messages = []
+                usage = None
+                async for chunk in response:
+                    # With include_usage the last chunk has no choices, only usage
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    chunk_message = chunk.choices[0].delta.content or ""
+                    collected_messages.append(chunk_message)
+                    await sink.write(chunk_message)
+                text = "".join(collected_messages)
+            if not text.strip():
+                raise EmptyResponseError("Empty response from streaming LLM")
+            if not sink.ended:
+                await sink.end()
+            return text, usage
+        except Exception as e:
+            if not (sink.written or sink.ended):
+                raise
+            # Text already written cannot be taken back and an ended sink has
+            # no reader left; a retry would write into the sink a second time
+            raise StreamInterrupted(f"Stream failed after output was sent: {e}") from e
+
+    def _cache_key(self, kind: str, params: dict) -> Optional[str]:
+        """Return the response cache key for a request, or None if it is not cacheable"""
+        if self.response_cache is None:
+            return None
+        # Only deterministic requests are cached unless configured otherwise
+        if (
+            params.get("temperature") != 0
+            and not config.cache_config.cache_nondeterministic
+        ):
+            return None
+        return ResponseCache.make_key(
+            kind=kind, **{k: v for k, v in params.items() if k != "timeout"}
+        )
+
+    async def _create_completion(
+        self, kind: str, params: dict, input_tokens: int
+    ) -> tuple[ChatCompletion, bool]:
+        """Send a non-streaming request, sharing it with identical ones in flight.
+
+        Returns the response and whether it was shared with a request that
+        was already in flight, whose usage has been recorded by its caller.
+        """
+
+        async def call() -> ChatCompletion:
+            async with self._rate_limited(input_tokens):
+                return await self.client.chat.completions.create(**params)
+
+        # Only deterministic requests can share a response
+        if self.single_flight is None or params.get("temperature") != 0:
+            return await call(), False
+        key = ResponseCache.make_key(
+            kind=kind, **{k: v for k, v in params.items() if k != "timeout"}
+        )
+        return await self.single_flight.do(key, call)
+
+    def _completion_tokens(self, response: ChatCompletion) -> int:
+        """Return the completion tokens of a response, estimated if not reported"""
+        if response.usage is not None:
+            return response.usage.completion_tokens
+        message = response.choices[0].message
+        return self.count_tokens(message.content or "") + sum(
+            self.count_tokens(call.function.arguments)
+            for call in message.tool_calls or []
+        )
+
+    def observe_completion(
+        self, purpose: Optional[str], completion_tokens: int
+    ) -> None:
+        """Record the length of a completion for adapting max_tokens to purpose"""
+        if self.completion_budget is not None:
+            self.completion_budget.observe(purpose, completion_tokens)
+
+    async def _complete_within_budget(
+        self, kind: str, params: dict, input_tokens: int, purpose: Optional[str]
+    ) -> tuple[ChatCompletion, bool]:
+        """Send a non-streaming request with a max_tokens adapted to its purpose.
+
+        The limit starts at a high percentile of earlier completions for the
+        same purpose. A completion cut short by the limit is requested again
+        with twice the budget, up to the profile's max_tokens.
+        """
+        budget = self.completion_budget if purpose else None
+        if budget is None:
+            return await self._create_completion(kind, params, input_tokens)
+
+        if self.model in REASONING_MODELS:
+            limit_param = "max_completion_tokens"
+        else:
+            limit_param = "max_tokens"
+        params = {**params, limit_param: budget.limit(purpose)}
+        while True:
+            response, shared = await self._create_completion(kind, params, input_tokens)
+            limit = params[limit_param]
+            if not response.choices:
+                return response, shared
+            # Bedrock reports truncation as "max_tokens"
+            truncated = response.choices[0].finish_reason in ("length", "max_tokens")
+            if not truncated or limit >= self.max_tokens:
+                budget.observe(purpose, self._completion_tokens(response))
+                return response, shared
+
+            # The truncated attempt was paid for all the same
+            if not shared:
+                self.record_usage(
+                    response.usage,
+                    input_tokens,
+                    response.choices[0].message.content or "",
+                )
+            metrics.increment("llm.length_retries")
+            logger.info(
+                f"Completion for '{purpose}' hit max_tokens={limit}, "
+                f"retrying with {budget.grow(limit)}"
+            )
+            params = {**params, limit_param: budget.grow(limit)}
+
     @staticmethod
     def format_messages(
-        messages: List[Union[dict, Message]], supports_images: bool = False
+        messages: List[Union[dict, Message]],
+        supports_images: bool = False,
+        max_images: Optional[int] = None,
     ) -> List[dict]:
         """
         Format messages for LLM by converting them to OpenAI message format.
@@ -280,6 +750,8 @@ class LLM:
         Args:
             messages: List of messages that can be either dict or Message objects
             supports_images: Flag indicating if the target model supports image inputs
+            max_images: Number of newest images to include, 0 for all (defaults
+                to max_images of the [blobs] config); older ones become a note
 
         Returns:
             List[dict]: List of formatted messages in OpenAI format
@@ -299,78 +771,48 @@ class LLM:
         formatted_messages = []
 
         for message in messages:
-            # Convert Message objects to dictionaries
+            # Message objects cache their API format
             if isinstance(message, Message):
-                message = message.to_dict()
-
-            if isinstance(message, dict):
+                message = message.to_wire(supports_images)
+            elif isinstance(message, dict):
                 # If message is a dict, ensure it has required fields
                 if "role" not in message:
                     raise ValueError("Message dict must contain 'role' field")
-
-                # Process base64 images if present and model supports images
-                if supports_images and message.get("base64_image"):
-                    # Initialize or convert content to appropriate format
-                    if not message.get("content"):
-                        message["content"] = []
-                    elif isinstance(message["content"], str):
-                        message["content"] = [
-                            {"type": "text", "text": message["content"]}
-                        ]
-                    elif isinstance(message["content"], list):
-                        # Convert string items to proper text objects
-                        message["content"] = [
-                            (
-                                {"type": "text", "text": item}
-                                if isinstance(item, str)
-                                else item
-                            )
-                            for item in message["content"]
-                        ]
-
-                    # Add the image to content
-                    message["content"].append(
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{message['base64_image']}"
-                            },
-                        }
-                    )
-
-                    # Remove the base64_image field
-                    del message["base64_image"]
-                # If model doesn't support images but message has base64_image, handle gracefully
-                elif not supports_images and message.get("base64_image"):
-                    # Just remove the base64_image field and keep the text content
-                    del message["base64_image"]
-
-                if "content" in message or "tool_calls" in message:
-                    formatted_messages.append(message)
-                # else: do not include the message
+                # Images are moved into the content (or dropped) on a copy
+                message = format_wire_message(message, supports_images)
             else:
                 raise TypeError(f"Unsupported message type: {type(message)}")
 
+            if "content" in message or "tool_calls" in message:
+                formatted_messages.append(message)
+            # else: do not include the message
+
         # Validate all messages have required fields
         for msg in formatted_messages:
             if msg["role"] not in ROLE_VALUES:
                 raise ValueError(f"Invalid role: {msg['role']}")
 
+        if supports_images:
+            # Images are loaded from the blob store only now, and only the
+            # newest ones the model still needs
+            if max_images is None:
+                max_images = config.blob_config.max_images
+            formatted_messages = materialize_images(
+                formatted_messages, max_images or None
+            )
+            # Screenshots often repeat between tool results and step context
+            formatted_messages = dedupe_images(formatted_messages)
         return formatted_messages
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-        retry=retry_if_exception_type(
-            (OpenAIError, Exception, ValueError)
-        ),  # Don't retry TokenLimitExceeded
-    )
+    @with_retry
     async def ask(
         self,
         messages: List[Union[dict, Message]],
         system_msgs: Optional[List[Union[dict, Message]]] = None,
         stream: bool = True,
         temperature: Optional[float] = None,
+        sink: Optional[StreamSink] = None,
+        purpose: Optional[str] = None,
     ) -> str:
         """
         Send a prompt to the LLM and get the response.
@@ -380,6 +822,9 @@ class LLM:
             system_msgs: Optional system messages to prepend
             stream (bool): Whether to stream the response
             temperature (float): Sampling temperature for the response
+            sink: Destination for streamed tokens (defaults to self.stream_sink)
+            purpose: Call site label, such as "summarize"; non-streaming
+                requests get a max_tokens adapted to earlier completions for it
 
         Returns:
             str: The generated response
@@ -387,7 +832,8 @@ class LLM:
         Raises:
             TokenLimitExceeded: If token limits are exceeded
             ValueError: If messages are invalid or response is empty
-            OpenAIError: If API call fails after retries
+            OpenAIError: If API call fails after retries or with a non-retryable error
+            DeadlineExceeded: If the run's deadline passes before a response arrives
             Exception: For unexpected errors
         """
         try:
@@ -423,47 +869,56 @@ class LLM:
                     temperature if temperature is not None else self.temperature
                 )
 
+            cache_key = self._cache_key("ask", params)
+            if cache_key:
+                cached = await self.response_cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Response cache hit, skipping LLM request")
+                    if stream:
+                        sink = sink or self.stream_sink
+                        await sink.write(cached)
+                        await sink.end()
+                    return cached
+
             if not stream:
                 # Non-streaming request
-                response = await self.client.chat.completions.create(
-                    **params, stream=False
+                response, shared = await self._complete_within_budget(
+                    "ask", {**params, "stream": False}, input_tokens, purpose
                 )
 
                 if not response.choices or not response.choices[0].message.content:
-                    raise ValueError("Empty or invalid response from LLM")
+                    raise EmptyResponseError("Empty or invalid response from LLM")
 
                 # Update token counts
-                self.update_token_count(
-                    response.usage.prompt_tokens, response.usage.completion_tokens
-                )
+                if not shared:
+                    self.record_usage(response.usage, input_tokens)
 
+                if cache_key:
+                    await self.response_cache.set(
+                        cache_key, response.choices[0].message.content
+                    )
                 return response.choices[0].message.content
 
-            # Streaming request, For streaming, update estimated token count before making the request
-            self.update_token_count(input_tokens)
-
-            response = await self.client.chat.completions.create(**params, stream=True)
-
-            collected_messages = []
-            completion_text = ""
-            async for chunk in response:
-                chunk_message = chunk.choices[0].delta.content or ""
-                collected_messages.append(chunk_message)
-                completion_text += chunk_message
-                print(chunk_message, end="", flush=True)
-
-            print()  # Newline after streaming
-            full_response = "".join(collected_messages).strip()
-            if not full_response:
-                raise ValueError("Empty response from streaming LLM")
+            # Streaming request
+            async with self._rate_limited(input_tokens):
+                completion_text, usage = await self._stream_text(
+                    params, sink or self.stream_sink
+                )
 
-            # estimate completion tokens for streaming response
-            completion_tokens = self.count_tokens(completion_text)
-            logger.info(
-                f"Estimated completion tokens for streaming response: {completion_tokens}"
+            # Prefer the provider's usage, estimating locally only without it
+            self.record_usage(usage, input_tokens, completion_text)
+            self.observe_completion(
+                purpose,
+                (
+                    usage.completion_tokens
+                    if usage
+                    else self.count_tokens(completion_text)
+                ),
             )
-            self.total_completion_tokens += completion_tokens
 
+            full_response = completion_text.strip()
+            if cache_key:
+                await self.response_cache.set(cache_key, full_response)
             return full_response
 
         except TokenLimitExceeded:
@@ -485,13 +940,7 @@ class LLM:
             logger.exception(f"Unexpected error in ask")
             raise
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-        retry=retry_if_exception_type(
-            (OpenAIError, Exception, ValueError)
-        ),  # Don't retry TokenLimitExceeded
-    )
+    @with_retry
     async def ask_with_images(
         self,
         messages: List[Union[dict, Message]],
@@ -499,6 +948,8 @@ class LLM:
         system_msgs: Optional[List[Union[dict, Message]]] = None,
         stream: bool = False,
         temperature: Optional[float] = None,
+        sink: Optional[StreamSink] = None,
+        purpose: Optional[str] = None,
     ) -> str:
         """
         Send a prompt with images to the LLM and get the response.
@@ -509,6 +960,9 @@ class LLM:
             system_msgs: Optional system messages to prepend
             stream (bool): Whether to stream the response
             temperature (float): Sampling temperature for the response
+            sink: Destination for streamed tokens (defaults to self.stream_sink)
+            purpose: Call site label; non-streaming requests get a max_tokens
+                adapted to earlier completions for it
 
         Returns:
             str: The generated response
@@ -516,7 +970,8 @@ class LLM:
         Raises:
             TokenLimitExceeded: If token limits are exceeded
             ValueError: If messages are invalid or response is empty
-            OpenAIError: If API call fails after retries
+            OpenAIError: If API call fails after retries or with a non-retryable error
+            DeadlineExceeded: If the run's deadline passes before a response arrives
             Exception: For unexpected errors
         """
         try:
@@ -539,12 +994,13 @@ class LLM:
             # Process the last user message to include images
             last_message = formatted_messages[-1]
 
-            # Convert content to multimodal format if needed
+            # Convert content to multimodal format if needed, copying it since
+            # formatted messages may be shared with the caller's Message cache
             content = last_message["content"]
             multimodal_content = (
                 [{"type": "text", "text": content}]
                 if isinstance(content, str)
-                else content
+                else list(content)
                 if isinstance(content, list)
                 else []
             )
@@ -563,7 +1019,7 @@ class LLM:
                     raise ValueError(f"Unsupported image format: {image}")
 
             # Update the message with multimodal content
-            last_message["content"] = multimodal_content
+            formatted_messages[-1] = {**last_message, "content": multimodal_content}
 
             # Add system messages if provided
             if system_msgs:
@@ -597,31 +1053,25 @@ class LLM:
 
             # Handle non-streaming request
             if not stream:
-                response = await self.client.chat.completions.create(**params)
+                response, shared = await self._complete_within_budget(
+                    "ask_with_images", params, input_tokens, purpose
+                )
 
                 if not response.choices or not response.choices[0].message.content:
-                    raise ValueError("Empty or invalid response from LLM")
+                    raise EmptyResponseError("Empty or invalid response from LLM")
 
-                self.update_token_count(response.usage.prompt_tokens)
+                if not shared:
+                    self.record_usage(response.usage, input_tokens)
                 return response.choices[0].message.content
 
             # Handle streaming request
-            self.update_token_count(input_tokens)
-            response = await self.client.chat.completions.create(**params)
-
-            collected_messages = []
-            async for chunk in response:
-                chunk_message = chunk.choices[0].delta.content or ""
-                collected_messages.append(chunk_message)
-                print(chunk_message, end="", flush=True)
-
-            print()  # Newline after streaming
-            full_response = "".join(collected_messages).strip()
-
-            if not full_response:
-                raise ValueError("Empty response from streaming LLM")
+            async with self._rate_limited(input_tokens):
+                completion_text, usage = await self._stream_text(
+                    params, sink or self.stream_sink
+                )
+            self.record_usage(usage, input_tokens, completion_text)
 
-            return full_response
+            return completion_text.strip()
 
         except TokenLimitExceeded:
             raise
@@ -641,13 +1091,72 @@ class LLM:
             logger.error(f"Unexpected error in ask_with_images: {e}")
             raise
 
-    @retry(
-        wait=wait_random_exponential(min=1, max=60),
-        stop=stop_after_attempt(6),
-        retry=retry_if_exception_type(
-            (OpenAIError, Exception, ValueError)
-        ),  # Don't retry TokenLimitExceeded
-    )
+    def _prepare_tool_request(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        **kwargs,
+    ) -> tuple[dict, int]:
+        """Validate and format a tool request, returning (params, input_tokens)"""
+        # Validate tool_choice
+        if tool_choice not in TOOL_CHOICE_VALUES:
+            raise ValueError(f"Invalid tool_choice: {tool_choice}")
+
+        # Check if the model supports images
+        supports_images = self.model in MULTIMODAL_MODELS
+
+        # Format messages
+        if system_msgs:
+            system_msgs = self.format_messages(system_msgs, supports_images)
+            messages = system_msgs + self.format_messages(messages, supports_images)
+        else:
+            messages = self.format_messages(messages, supports_images)
+
+        # Calculate input token count
+        input_tokens = self.count_message_tokens(messages)
+
+        # If there are tools, calculate token count for tool descriptions
+        if tools:
+            input_tokens += self.count_tools_tokens(tools)
+
+        # Check if token limits are exceeded
+        if not self.check_token_limit(input_tokens):
+            error_message = self.get_limit_error_message(input_tokens)
+            # Raise a special exception that won't be retried
+            raise TokenLimitExceeded(error_message)
+
+        # Validate tools if provided
+        if tools:
+            for tool in tools:
+                if not isinstance(tool, dict) or "type" not in tool:
+                    raise ValueError("Each tool must be a dict with 'type' field")
+
+        # Set up the completion request
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "tools": tools,
+            "tool_choice": tool_choice,
+            # Requests never outlive the run's deadline
+            "timeout": cap_timeout(timeout),
+            **kwargs,
+        }
+
+        if self.model in REASONING_MODELS:
+            params["max_completion_tokens"] = self.max_tokens
+        else:
+            params["max_tokens"] = self.max_tokens
+            params["temperature"] = (
+                temperature if temperature is not None else self.temperature
+            )
+
+        return params, input_tokens
+
+    @with_retry
     async def ask_tool(
         self,
         messages: List[Union[dict, Message]],
@@ -656,6 +1165,7 @@ class LLM:
         tools: Optional[List[dict]] = None,
         tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
         temperature: Optional[float] = None,
+        purpose: Optional[str] = None,
         **kwargs,
     ) -> ChatCompletionMessage | None:
         """
@@ -668,6 +1178,8 @@ class LLM:
             tools: List of tools to use
             tool_choice: Tool choice strategy
             temperature: Sampling temperature for the response
+            purpose: Call site label, such as "think"; the request gets a
+                max_tokens adapted to earlier completions for it
             **kwargs: Additional completion arguments
 
         Returns:
@@ -676,67 +1188,30 @@ class LLM:
         Raises:
             TokenLimitExceeded: If token limits are exceeded
             ValueError: If tools, tool_choice, or messages are invalid
-            OpenAIError: If API call fails after retries
+            OpenAIError: If API call fails after retries or with a non-retryable error
+            DeadlineExceeded: If the run's deadline passes before a response arrives
             Exception: For unexpected errors
         """
         try:
-            # Validate tool_choice
-            if tool_choice not in TOOL_CHOICE_VALUES:
-                raise ValueError(f"Invalid tool_choice: {tool_choice}")
-
-            # Check if the model supports images
-            supports_images = self.model in MULTIMODAL_MODELS
-
-            # Format messages
-            if system_msgs:
-                system_msgs = self.format_messages(system_msgs, supports_images)
-                messages = system_msgs + self.format_messages(messages, supports_images)
-            else:
-                messages = self.format_messages(messages, supports_images)
-
-            # Calculate input token count
-            input_tokens = self.count_message_tokens(messages)
-
-            # If there are tools, calculate token count for tool descriptions
-            tools_tokens = 0
-            if tools:
-                for tool in tools:
-                    tools_tokens += self.count_tokens(str(tool))
-
-            input_tokens += tools_tokens
-
-            # Check if token limits are exceeded
-            if not self.check_token_limit(input_tokens):
-                error_message = self.get_limit_error_message(input_tokens)
-                # Raise a special exception that won't be retried
-                raise TokenLimitExceeded(error_message)
-
-            # Validate tools if provided
-            if tools:
-                for tool in tools:
-                    if not isinstance(tool, dict) or "type" not in tool:
-                        raise ValueError("Each tool must be a dict with 'type' field")
-
-            # Set up the completion request
-            params = {
-                "model": self.model,
-                "messages": messages,
-                "tools": tools,
-                "tool_choice": tool_choice,
-                "timeout": timeout,
+            params, input_tokens = self._prepare_tool_request(
+                messages,
+                system_msgs=system_msgs,
+                timeout=timeout,
+                tools=tools,
+                tool_choice=tool_choice,
+                temperature=temperature,
                 **kwargs,
-            }
+            )
 
-            if self.model in REASONING_MODELS:
-                params["max_completion_tokens"] = self.max_tokens
-            else:
-                params["max_tokens"] = self.max_tokens
-                params["temperature"] = (
-                    temperature if temperature is not None else self.temperature
-                )
+            cache_key = self._cache_key("ask_tool", params)
+            if cache_key:
+                cached = await self.response_cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Response cache hit, skipping LLM request")
+                    return ChatCompletionMessage.model_validate(cached)
 
-            response: ChatCompletion = await self.client.chat.completions.create(
-                **params, stream=False
+            response, shared = await self._complete_within_budget(
+                "ask_tool", {**params, "stream": False}, input_tokens, purpose
             )
 
             # Check if response is valid
@@ -745,11 +1220,17 @@ class LLM:
                 # raise ValueError("Invalid or empty response from LLM")
                 return None
 
+            if shared:
+                # Callers may modify the message, so each gets its own copy
+                return response.choices[0].message.model_copy(deep=True)
+
             # Update token counts
-            self.update_token_count(
-                response.usage.prompt_tokens, response.usage.completion_tokens
-            )
+            self.record_usage(response.usage, input_tokens)
 
+            if cache_key:
+                await self.response_cache.set(
+                    cache_key, to_jsonable(response.choices[0].message)
+                )
             return response.choices[0].message
 
         except TokenLimitExceeded:
@@ -770,3 +1251,234 @@ class LLM:
         except Exception as e:
             logger.error(f"Unexpected error in ask_tool: {e}")
             raise
+
+    async def ask_tool_stream(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        on_tool_call: Optional[
+            Callable[[ChatCompletionMessageToolCall], Optional[Awaitable[None]]]
+        ] = None,
+        purpose: Optional[str] = None,
+        **kwargs,
+    ) -> ChatCompletionMessage | None:
+        """
+        Streaming variant of ask_tool that hands out tool calls as soon as they are complete.
+
+        Args:
+            messages: List of conversation messages
+            system_msgs: Optional system messages to prepend
+            timeout: Request timeout in seconds
+            tools: List of tools to use
+            tool_choice: Tool choice strategy
+            temperature: Sampling temperature for the response
+            on_tool_call: Callback (sync or async) invoked with each tool call
+                as soon as its arguments are complete
+            purpose: Call site label; streamed completions are only observed,
+                since tool calls already handed out rule out a retry, while
+                the non-streaming fallback uses the adapted max_tokens
+            **kwargs: Additional completion arguments
+
+        Returns:
+            ChatCompletionMessage: The fully assembled response
+
+        Raises:
+            TokenLimitExceeded: If token limits are exceeded
+            ValueError: If tools, tool_choice, or messages are invalid
+        """
+
+        async def emit(tool_call: ChatCompletionMessageToolCall) -> None:
+            if on_tool_call is not None:
+                result = on_tool_call(tool_call)
+                if result is not None:
+                    await result
+
+        async def fallback() -> ChatCompletionMessage | None:
+            response = await self.ask_tool(
+                messages,
+                system_msgs=system_msgs,
+                timeout=timeout,
+                tools=tools,
+                tool_choice=tool_choice,
+                temperature=temperature,
+                purpose=purpose,
+                **kwargs,
+            )
+            for tool_call in (response.tool_calls if response else None) or []:
+                await emit(tool_call)
+            return response
+
+        # The Bedrock client does not stream incremental tool calls
+        if self.api_type == "aws":
+            return await fallback()
+
+        params, input_tokens = self._prepare_tool_request(
+            messages,
+            system_msgs=system_msgs,
+            timeout=timeout,
+            tools=tools,
+            tool_choice=tool_choice,
+            temperature=temperature,
+            **kwargs,
+        )
+
+        assembler = ToolCallAssembler()
+        emitted = 0
+        start = time.perf_counter()
+        first_token = None
+        try:
+            async with self._rate_limited(input_tokens):
+                response = await self.client.chat.completions.create(
+                    **self._stream_params(params)
+                )
+                async for chunk in response:
+                    ready = assembler.feed(chunk)
+                    if first_token is None and assembler.started:
+                        first_token = time.perf_counter() - start
+                        metrics.observe("llm.ttft", first_token)
+                    for tool_call in ready:
+                        metrics.observe(
+                            "llm.tool_call_ready", time.perf_counter() - start
+                        )
+                        emitted += 1
+                        await emit(tool_call)
+                for tool_call in assembler.finish():
+                    metrics.observe("llm.tool_call_ready", time.perf_counter() - start)
+                    emitted += 1
+                    await emit(tool_call)
+        except TokenLimitExceeded:
+            raise
+        except Exception as e:
+            # Tool calls that were already handed out cannot be taken back
+            if emitted:
+                logger.error(
+                    f"Streaming ask_tool failed after {emitted} tool calls: {e}"
+                )
+                raise
+            logger.warning(
+                f"Streaming ask_tool failed, retrying without streaming: {e}"
+            )
+            return await fallback()
+
+        metrics.observe("llm.stream_total", time.perf_counter() - start)
+
+        if assembler.usage is not None:
+            self.record_usage(assembler.usage, input_tokens)
+            completion_tokens = assembler.usage.completion_tokens
+        else:
+            # Without provider usage, estimate the completion tokens locally
+            completion_tokens = self.count_tokens(assembler.content) + sum(
+                self.count_tokens(call.function.name)
+                + self.count_tokens(call.function.arguments)
+                for call in assembler.tool_calls
+            )
+            self.update_token_count(input_tokens, completion_tokens)
+        self.observe_completion(purpose, completion_tokens)
+
+        if first_token is not None:
+            logger.info(
+                f"Streamed {len(assembler.tool_calls)} tool calls, "
+                f"time to first token {first_token:.2f}s, "
+                f"total {time.perf_counter() - start:.2f}s"
+            )
+        return assembler.message()
+
+    async def _run_batch(
+        self,
+        name: str,
+        calls: List[Callable[[], Awaitable[Any]]],
+        max_concurrency: int,
+    ) -> List[Any]:
+        """Run calls with at most max_concurrency in flight, returning results in order"""
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        tokens_before = self.total_input_tokens + self.total_completion_tokens
+
+        async def run(call: Callable[[], Awaitable[Any]]) -> Any:
+            async with semaphore:
+                try:
+                    return await call()
+                except Exception as e:
+                    # A failed item is reported in place instead of failing the batch
+                    return e
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run(call) for call in calls))
+        elapsed = max(time.perf_counter() - start, 1e-9)
+
+        failures = sum(isinstance(result, Exception) for result in results)
+        tokens = self.total_input_tokens + self.total_completion_tokens - tokens_before
+        metrics.increment(f"llm.{name}.prompts", len(calls))
+        metrics.increment(f"llm.{name}.failures", failures)
+        metrics.increment(f"llm.{name}.tokens", tokens)
+        metrics.observe(f"llm.{name}.duration", elapsed)
+        logger.info(
+            f"{name}: {len(calls)} prompts ({failures} failed) in {elapsed:.2f}s, "
+            f"{len(calls) / elapsed:.2f} prompts/s, {tokens / elapsed:.1f} tokens/s"
+        )
+        return results
+
+    async def ask_batch(
+        self,
+        prompts: List[List[Union[dict, Message]]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        max_concurrency: int = 8,
+        temperature: Optional[float] = None,
+    ) -> List[Union[str, Exception]]:
+        """
+        Run ask for many independent conversations concurrently.
+
+        Args:
+            prompts: One list of conversation messages per request
+            system_msgs: Optional system messages prepended to every request
+            max_concurrency: Maximum number of requests in flight
+            temperature: Sampling temperature for the responses
+
+        Returns:
+            List[Union[str, Exception]]: One response per prompt, in input order;
+                a request that failed is returned as its exception
+        """
+        calls = [
+            lambda messages=messages: self.ask(
+                messages,
+                system_msgs=system_msgs,
+                stream=False,
+                temperature=temperature,
+            )
+            for messages in prompts
+        ]
+        return await self._run_batch("ask_batch", calls, max_concurrency)
+
+    async def ask_tool_batch(
+        self,
+        prompts: List[List[Union[dict, Message]]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        max_concurrency: int = 8,
+        **kwargs,
+    ) -> List[Union[ChatCompletionMessage, None, Exception]]:
+        """
+        Run ask_tool for many independent conversations concurrently.
+
+        Args:
+            prompts: One list of conversation messages per request
+            system_msgs: Optional system messages prepended to every request
+            max_concurrency: Maximum number of requests in flight
+            **kwargs: Arguments passed to every ask_tool call (tools, tool_choice, ...)
+
+        Returns:
+            List: One response per prompt, in input order; a request that
+                failed is returned as its exception
+        """
+        calls = [
+            lambda messages=messages: self.ask_tool(
+                messages, system_msgs=system_msgs, **kwargs
+            )
+            for messages in prompts
+        ]
+        return await self._run_batch("ask_tool_batch", calls, max_concurrency)
@@ -0,0 +1,179 @@
+"""Incremental detection of agents repeating the same step."""
+import hashlib
+import json
+import re
+from collections import defaultdict, deque
+from typing import Deque, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from app.config import LoopDetectionSettings
+from app.schema import Message, Role
+
+
+SIMHASH_BITS = 64
+
+_WORD = re.compile(r"\w+")
+
+
+def _hash64(text: str) -> int:
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def simhash(words: Sequence[str]) -> int:
+    """Return the 64-bit SimHash of the words and word pairs of a text.
+
+    Texts sharing most of their words get fingerprints that differ in few
+    bits, so near-duplicates are found by Hamming distance.
+    """
+    weights = [0] * SIMHASH_BITS
+    features = list(words)
+    features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+    for feature in features:
+        value = _hash64(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def tool_call_signature(message: Message) -> Optional[str]:
+    """Return the tool calls of a message as names with canonical arguments.
+
+    Arguments are compared as parsed JSON, so key order and whitespace do
+    not matter; the order of the calls does not either.
+    """
+    if not message.tool_calls:
+        return None
+    calls = []
+    for call in message.tool_calls:
+        arguments = call.function.arguments or "{}"
+        try:
+            arguments = json.dumps(
+                json.loads(arguments), sort_keys=True, separators=(",", ":")
+            )
+        except ValueError:
+            arguments = " ".join(arguments.split())
+        calls.append(f"{call.function.name}({arguments})")
+    return "\n".join(sorted(calls))
+
+
+class LoopDetector:
+    """Indexes assistant messages to count how often an agent repeats a step.
+
+    A step repeats an earlier one if it makes the same tool calls, has the
+    same normalized content, or has content whose SimHash differs in at
+    most `max_distance` bits. Exact matches are looked up by digest; near
+    matches through the SimHash split into `max_distance + 1` bands, at
+    least one of which two fingerprints that close must share. Indexing a
+    message and matching it therefore take time in the number of its
+    repeats rather than in the length of the history.
+
+    `update` follows a history that grows at the end and evicts from the
+    front, like Memory, and drops messages evicted from it from the index.
+    """
+
+    def __init__(self, max_distance: int = 8, min_tokens: int = 8):
+        self.max_distance = max_distance
+        self.min_tokens = min_tokens
+
+        bands = max_distance + 1
+        width = SIMHASH_BITS // bands
+        # (shift, mask) per band; the last band takes the remaining bits
+        self._bands = [(index * width, (1 << width) - 1) for index in range(bands - 1)]
+        last_shift = (bands - 1) * width
+        self._bands.append((last_shift, (1 << (SIMHASH_BITS - last_shift)) - 1))
+        self.reset()
+
+    @classmethod
+    def from_settings(cls, settings: LoopDetectionSettings) -> "LoopDetector":
+        return cls(max_distance=settings.max_distance, min_tokens=settings.min_tokens)
+
+    def reset(self) -> None:
+        """Forget all indexed messages"""
+        self._count = 0
+        # Messages of the history passed to update so far
+        self._seen = 0
+        self._buckets: Dict[Hashable, Deque[int]] = defaultdict(deque)
+        self._fingerprints: Dict[int, int] = {}
+        # (position in the history, index, buckets) per indexed message, oldest
+        # first, to remove evicted messages from their buckets
+        self._entries: Deque[Tuple[int, int, List[Hashable]]] = deque()
+        self._last: Optional[Message] = None
+
+    def observe(self, message: Message) -> int:
+        """Index an assistant message and return how many earlier ones it repeats"""
+        if message.role != Role.ASSISTANT:
+            return 0
+        index = self._count
+        self._count += 1
+        matches: Set[int] = set()
+        keys: List[Hashable] = []
+
+        signature = tool_call_signature(message)
+        if signature is not None:
+            keys.append(("calls", signature))
+            matches.update(self._buckets[keys[-1]])
+
+        words = _WORD.findall(message.content.lower()) if message.content else []
+        if words:
+            keys.append(("content", _hash64(" ".join(words))))
+            matches.update(self._buckets[keys[-1]])
+        if len(words) >= self.min_tokens:
+            fingerprint = simhash(words)
+            self._fingerprints[index] = fingerprint
+            for band, (shift, mask) in enumerate(self._bands):
+                keys.append(("band", band, fingerprint >> shift & mask))
+                matches.update(
+                    other
+                    for other in self._buckets[keys[-1]]
+                    if other not in matches
+                    and bin(self._fingerprints[other] ^ fingerprint).count("1")
+                    <= self.max_distance
+                )
+
+        for key in keys:
+            self._buckets[key].append(index)
+        self._entries.append((self._seen - 1, index, keys))
+        return len(matches)
+
+    def update(self, messages: Sequence[Message]) -> int:
+        """Index the messages appended since the last update.
+
+        Only the new tail of the history is read; the newest message indexed
+        last time marks where it starts. Messages evicted from the front of
+        the history are removed from the index. If the marker is gone,
+        because the history was cleared or replaced, the index is rebuilt.
+
+        Returns:
+            Earlier repeats of the newest new assistant message, 0 if none
+        """
+        new = []
+        for message in reversed(messages):
+            if message is self._last:
+                break
+            new.append(message)
+        else:
+            if self._last is not None:
+                self.reset()
+
+        self._evict(self._seen + len(new) - len(messages))
+        repeats = 0
+        for message in reversed(new):
+            self._seen += 1
+            if message.role == Role.ASSISTANT:
+                repeats = self.observe(message)
+        if new:
+            self._last = new[0]
+        return repeats
+
+    def _evict(self, start: int) -> None:
+        """Drop the messages before position start of the history"""
+        entries = self._entries
+        while entries and entries[0][0] < start:
+            _, index, keys = entries.popleft()
+            for key in keys:
+                bucket = self._buckets[key]
+                # Buckets are in index order, so the oldest entry comes first
+                bucket.popleft()
+                if not bucket:
+                    del self._buckets[key]
+            self._fingerprints.pop(index, None)
@@ -0,0 +1,81 @@
+"""Lightweight in-process metrics for LLM and agent performance."""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+
+class Metrics:
+    """Counters and rolling latency samples, safe to use from any thread.
+
+    Timings keep the most recent `window` samples per name so percentiles
+    reflect current behaviour rather than the whole process lifetime.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._samples: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=self.window)
+        )
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add value to a counter"""
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record one sample (e.g. a latency in seconds)"""
+        with self._lock:
+            self._samples[name].append(value)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Record the wall time of the enclosed block under name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """Return the q-th percentile (0-100) of the recorded samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, round(q / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Return all counters and summary statistics for all timings"""
+        with self._lock:
+            counters = dict(self._counters)
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+
+        timings = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            timings[name] = {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "p50": values[round(0.50 * (len(values) - 1))],
+                "p95": values[round(0.95 * (len(values) - 1))],
+                "max": values[-1],
+            }
+        return {"counters": counters, "timings": timings}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+
+
+metrics = Metrics()
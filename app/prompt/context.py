@@ -0,0 +1,16 @@
+SUMMARY_PROMPT = """You are compacting the history of an AI agent so it fits in its context window.
+Summarize the conversation below into a concise record the agent can continue from.
+Keep the task, decisions made, important facts and results (file paths, URLs, values, errors), and what remains to be done.
+Drop small talk, repeated output and raw tool dumps. Write in plain text, at most {max_words} words.
+{previous}
+Conversation to summarize:
+{transcript}"""
+
+PREVIOUS_SUMMARY = """
+Summary of the conversation so far, to be updated with the new events:
+{summary}
+"""
+
+SUMMARY_MESSAGE = (
+    "Summary of the earlier conversation (older messages were compacted):\n{summary}"
+)
@@ -0,0 +1,88 @@
+"""Tracking of prompt prefix stability and provider prompt cache hits."""
+from typing import Any, List, Optional, Tuple
+
+from app.llm import MULTIMODAL_MODELS
+from app.logger import logger
+from app.metrics import metrics
+from app.schema import Message
+
+
+class PrefixTracker:
+    """Compares each request with the previous one from the same agent.
+
+    Providers cache the longest previously seen prompt prefix, so anything
+    that changes early in the request (system prompt, tools, old history)
+    makes the whole remainder uncacheable. `observe` finds how many messages
+    of a request repeat the previous request verbatim; `report`, once the
+    request was sent, logs how many of its input tokens that prefix holds
+    and how many the provider actually served from its cache.
+
+    Messages are compared by their cached wire dicts, which are identical
+    objects for unchanged messages, and only the changed tail is tokenized,
+    so tracking costs little beyond the request itself.
+    """
+
+    def __init__(self):
+        self._previous: Optional[Tuple[Any, List[dict]]] = None
+        self._messages: List[dict] = []
+        self._stable_messages: Optional[int] = None
+        self._usage_mark: Tuple[int, int] = (0, 0)
+        self.stable_tokens = 0
+        self.total_tokens = 0
+
+    def observe(self, request: dict, llm) -> int:
+        """Record a request about to be sent, returning its unchanged messages"""
+        supports_images = llm.model in MULTIMODAL_MODELS
+        messages = [
+            message.to_wire(supports_images)
+            if isinstance(message, Message)
+            else message
+            for message in (request.get("system_msgs") or []) + request["messages"]
+        ]
+        tools = request.get("tools")
+
+        previous_tools, previous_messages = self._previous or (None, [])
+        # None marks a prefix broken before the first message
+        stable = None
+        if self._previous is not None and (
+            previous_tools is tools or previous_tools == tools
+        ):
+            stable = 0
+            for previous, message in zip(previous_messages, messages):
+                if previous is not message and previous != message:
+                    break
+                stable += 1
+
+        self._previous = (tools, messages)
+        self._messages, self._stable_messages = messages, stable
+        self._usage_mark = (llm.total_input_tokens, llm.total_cached_tokens)
+        return stable or 0
+
+    def report(self, llm) -> Optional[float]:
+        """Log the stable prefix and cache hit rate of the request since observe"""
+        input_tokens = llm.total_input_tokens - self._usage_mark[0]
+        cached_tokens = llm.total_cached_tokens - self._usage_mark[1]
+        if input_tokens <= 0:
+            return None
+
+        stable = 0
+        if self._stable_messages is not None:
+            changed = sum(
+                llm.token_counter.count_message(message)
+                for message in self._messages[self._stable_messages :]
+            )
+            stable = max(input_tokens - changed, 0)
+        self.stable_tokens, self.total_tokens = stable, input_tokens
+        metrics.observe("llm.stable_prefix_ratio", stable / input_tokens)
+
+        hit_rate = cached_tokens / input_tokens
+        metrics.observe("llm.prompt_cache_hit_rate", hit_rate)
+        logger.info(
+            f"Prompt cache: {cached_tokens}/{input_tokens} input tokens cached "
+            f"({hit_rate:.0%}), stable prefix {stable}/{input_tokens} tokens"
+        )
+        return hit_rate
+
+    def reset(self) -> None:
+        self._previous = None
+        self._stable_messages = None
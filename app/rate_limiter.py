@@ -0,0 +1,191 @@
+"""Client-side rate limiting for LLM requests."""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Optional
+
+from app.config import LLMSettings
+from app.logger import logger
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed (0 if available now)"""
+        self._refill()
+        # Requests larger than the bucket only wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+
+class RateLimiter:
+    """Requests-per-minute, tokens-per-minute and concurrency governor.
+
+    Waiters are served in FIFO order so concurrent agents queue smoothly
+    instead of all firing at once and backing off at random. A `Retry-After`
+    reported by the provider pauses every waiter until it has elapsed.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+
+        self._blocked_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue_lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+
+    @classmethod
+    def from_settings(cls, settings: LLMSettings) -> Optional["RateLimiter"]:
+        """Build a limiter for an LLM profile, or None if it sets no limits"""
+        if not (
+            settings.requests_per_minute
+            or settings.tokens_per_minute
+            or settings.max_concurrency
+        ):
+            return None
+        return cls(
+            requests_per_minute=settings.requests_per_minute,
+            tokens_per_minute=settings.tokens_per_minute,
+            max_concurrency=settings.max_concurrency,
+        )
+
+    def _primitives(self) -> None:
+        # asyncio primitives are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue_lock = asyncio.Lock()
+            self._semaphore = (
+                asyncio.Semaphore(self.max_concurrency)
+                if self.max_concurrency
+                else None
+            )
+
+    def _delay(self, tokens: int) -> float:
+        delay = self._blocked_until - time.monotonic()
+        if self.requests:
+            delay = max(delay, self.requests.time_until(1))
+        if self.tokens:
+            delay = max(delay, self.tokens.time_until(tokens))
+        return max(delay, 0.0)
+
+    @asynccontextmanager
+    async def acquire(self, tokens: int = 0) -> AsyncIterator[None]:
+        """Wait for capacity for one request of roughly `tokens` input tokens"""
+        self._primitives()
+        semaphore = self._semaphore
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            if semaphore:
+                await semaphore.acquire()
+            try:
+                async with self._queue_lock:
+                    while (delay := self._delay(tokens)) > 0:
+                        await asyncio.sleep(delay)
+                    if self.requests:
+                        self.requests.consume(1)
+                    if self.tokens:
+                        self.tokens.consume(tokens)
+            except BaseException:
+                if semaphore:
+                    semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - start
+        self.total_wait += waited
+        if waited > 1:
+            logger.info(f"Rate limiter delayed request by {waited:.1f}s")
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if semaphore:
+                semaphore.release()
+
+    def penalize(self, seconds: float) -> None:
+        """Hold all requests for `seconds`, e.g. after a 429 with Retry-After"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        logger.warning(
+            f"Provider asked to retry after {seconds:.1f}s, pausing requests"
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "total_wait": round(self.total_wait, 3),
+        }
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Extract the provider's Retry-After delay from an API error, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+_limiters: Dict[str, Optional[RateLimiter]] = {}
+
+
+def get_rate_limiter(config_name: str, settings: LLMSettings) -> Optional[RateLimiter]:
+    """Return the limiter shared by all LLMs using the profile `config_name`"""
+    if config_name not in _limiters:
+        _limiters[config_name] = RateLimiter.from_settings(settings)
+    return _limiters[config_name]
@@ -0,0 +1,203 @@
+"""Retry policy for LLM requests: error classification, backoff and deadlines."""
+import asyncio
+import functools
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+from app.config import RetrySettings, config
+from app.exceptions import DeadlineExceeded, EmptyResponseError
+from app.logger import logger
+from app.metrics import metrics
+from app.rate_limiter import retry_after_seconds
+
+
+T = TypeVar("T")
+
+# Monotonic time by which the current agent run has to finish
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+RETRYABLE_BEDROCK_CODES = {
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Return whether error is transient, so the same request may succeed later.
+
+    Timeouts, dropped connections, rate limits, server errors and empty
+    responses are retried. Authentication and permission errors, bad
+    requests, token limit errors and anything unrecognised are not.
+    """
+    if isinstance(error, (APITimeoutError, APIConnectionError, RateLimitError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 or error.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in RETRYABLE_BEDROCK_CODES
+    return isinstance(
+        error,
+        (
+            EmptyResponseError,
+            EndpointConnectionError,
+            ConnectionClosedError,
+            ReadTimeoutError,
+            asyncio.TimeoutError,
+            ConnectionError,
+        ),
+    )
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Limit the LLM requests made inside the block to `seconds` in total.
+
+    Nested deadlines never extend an enclosing one. `None` leaves the
+    current deadline unchanged.
+    """
+    if seconds is None:
+        yield
+        return
+    until = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(until if current is None else min(current, until))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_remaining() -> Optional[float]:
+    """Return the seconds left before the current deadline, or None without one"""
+    until = _deadline.get()
+    if until is None:
+        return None
+    return max(until - time.monotonic(), 0.0)
+
+
+def cap_timeout(timeout: float) -> float:
+    """Shorten a request timeout so it ends by the current deadline"""
+    remaining = time_remaining()
+    return timeout if remaining is None else max(min(timeout, remaining), 0.001)
+
+
+class RetryPolicy:
+    """Retries transient failures with jittered exponential backoff.
+
+    Each wait is drawn uniformly between zero and the exponential backoff
+    (full jitter) unless the provider asked for a specific Retry-After
+    delay. Attempts and waits never run past the current deadline.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        classify: Callable[[BaseException], bool] = is_retryable,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.classify = classify
+
+    @classmethod
+    def from_settings(cls, settings: Optional[RetrySettings] = None) -> "RetryPolicy":
+        settings = settings or config.retry_config
+        return cls(settings.max_attempts, settings.base_delay, settings.max_delay)
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """Return the wait in seconds after the given failed attempt (1-based)"""
+        retry_after = retry_after_seconds(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    async def call(self, func: Callable[[], Awaitable[T]], name: str = "llm") -> T:
+        """Await func(), retrying it according to the policy"""
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                remaining = time_remaining()
+                if remaining is not None and remaining <= 0:
+                    raise DeadlineExceeded(
+                        f"Deadline passed before {name} could complete"
+                    )
+                attempt_start = time.perf_counter()
+                try:
+                    if remaining is None:
+                        result = await func()
+                    else:
+                        result = await asyncio.wait_for(func(), remaining)
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError) and time_remaining() == 0:
+                        metrics.increment(f"{name}.deadline_exceeded")
+                        raise DeadlineExceeded(
+                            f"Deadline passed while waiting for {name}"
+                        ) from e
+                    self._check_retry(e, attempt, name)
+                    await asyncio.sleep(self._wait(attempt, e, name))
+                    continue
+                metrics.observe(
+                    f"{name}.attempt_latency", time.perf_counter() - attempt_start
+                )
+                return result
+        finally:
+            metrics.observe(f"{name}.latency", time.perf_counter() - start)
+            metrics.observe(f"{name}.attempts", attempt)
+
+    def _check_retry(self, error: Exception, attempt: int, name: str) -> None:
+        """Re-raise error unless it should be retried"""
+        if not self.classify(error):
+            metrics.increment(f"{name}.fatal_errors")
+            raise error
+        if attempt >= self.max_attempts:
+            metrics.increment(f"{name}.retries_exhausted")
+            logger.error(f"{name} failed after {attempt} attempts: {error}")
+            raise error
+
+    def _wait(self, attempt: int, error: Exception, name: str) -> float:
+        delay = self.backoff(attempt, error)
+        remaining = time_remaining()
+        if remaining is not None and delay >= remaining:
+            metrics.increment(f"{name}.deadline_exceeded")
+            raise DeadlineExceeded(
+                f"{name} failed and the deadline leaves no time to retry: {error}"
+            ) from error
+        metrics.increment(f"{name}.retries")
+        metrics.increment(f"{name}.retries.{type(error).__name__}")
+        logger.warning(
+            f"{name} attempt {attempt} failed ({type(error).__name__}), "
+            f"retrying in {delay:.1f}s: {error}"
+        )
+        return delay
+
+
+def with_retry(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Retry an async method with its instance's `retry_policy`"""
+
+    @functools.wraps(func)
+    async def wrapper(self, *args: Any, **kwargs: Any) -> T:
+        return await self.retry_policy.call(
+            lambda: func(self, *args, **kwargs), name=f"llm.{func.__name__}"
+        )
+
+    return wrapper
@@ -0,0 +1,306 @@
+"""Latency-aware routing of LLM requests across several profiles."""
+import asyncio
+import time
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from app.config import LLMSettings, RouterSettings, config
+from app.llm import LLM, create_client
+from app.logger import logger
+from app.metrics import metrics
+from app.rate_limiter import get_rate_limiter
+from app.retry import is_retryable
+
+
+# Input tokens of the request being routed, used by the endpoint rate limiters
+_input_tokens: ContextVar[int] = ContextVar("router_input_tokens", default=0)
+
+
+class EndpointStats:
+    """Rolling latency and error statistics for one endpoint"""
+
+    def __init__(self, window: int = 100):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_errors = 0
+
+    def record_error(self) -> None:
+        self.outcomes.append(False)
+        self.consecutive_errors += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the q-th percentile (0-100) of recent latencies"""
+        if not self.latencies:
+            return None
+        samples = sorted(self.latencies)
+        return samples[round(q / 100 * (len(samples) - 1))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+
+class RoutedEndpoint:
+    """An LLM profile the router can send requests to"""
+
+    def __init__(self, name: str, settings: LLMSettings, window: int = 100):
+        if settings.api_type == "aws":
+            raise ValueError(
+                f"LLM profile '{name}' uses Bedrock, which the router does not support"
+            )
+        self.name = name
+        self.settings = settings
+        self.model = settings.model
+        self.client = create_client(settings)
+        self.rate_limiter = get_rate_limiter(name, settings)
+        self.stats = EndpointStats(window)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[None]:
+        if self.rate_limiter is None:
+            yield
+            return
+        async with self.rate_limiter.acquire(_input_tokens.get()):
+            yield
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "requests": len(self.stats.outcomes),
+            "p50": self.stats.percentile(50),
+            "p95": self.stats.percentile(95),
+            "error_rate": self.stats.error_rate,
+            "cooling_down": self.stats.cooldown_until > time.monotonic(),
+        }
+
+
+class _RoutedCompletions:
+    """Stand-in for `client.chat.completions` that dispatches through the router"""
+
+    def __init__(self, router: "LLMRouter"):
+        self.router = router
+
+    async def create(self, **params: Any) -> Any:
+        return await self.router.dispatch(params)
+
+
+class _RoutedChat:
+    def __init__(self, router: "LLMRouter"):
+        self.completions = _RoutedCompletions(router)
+
+
+class _RoutedClient:
+    def __init__(self, router: "LLMRouter"):
+        self.chat = _RoutedChat(router)
+
+
+class LLMRouter(LLM):
+    """LLM backend that spreads requests over several profiles.
+
+    Every request goes to the healthiest endpoint, judged by the rolling
+    median latency weighted by the recent error rate. Endpoints that fail
+    repeatedly are skipped for a cooldown period, and a failed request is
+    retried on the next endpoint. With hedging enabled, a non-streaming
+    request that outlives the primary endpoint's latency percentile is sent
+    to a second endpoint as well and the first response wins.
+    """
+
+    def __init__(
+        self, config_name: str = "default", llm_config: Optional[LLMSettings] = None
+    ):
+        if hasattr(self, "client"):
+            return
+
+        profiles = llm_config or config.llm
+        self.router_config: RouterSettings = config.router_config
+        # Profiles differ in purpose (vision) and API (Bedrock), so the ones
+        # that can serve the same requests have to be named
+        names = self.router_config.endpoints
+        if not names:
+            raise ValueError("[llm.router] needs the LLM profiles to route between")
+        missing = [name for name in names if name not in profiles]
+        if missing:
+            raise ValueError(f"Unknown LLM profiles in [llm.router]: {missing}")
+
+        self.endpoints: List[RoutedEndpoint] = [
+            RoutedEndpoint(name, profiles[name], self.router_config.window)
+            for name in names
+        ]
+        # Prompt formatting, token counting and defaults follow the first endpoint
+        super().__init__(config_name, {"default": self.endpoints[0].settings})
+        # Limits are applied per endpoint instead
+        self.rate_limiter = None
+
+    def _create_client(self, settings: LLMSettings) -> _RoutedClient:
+        # Requests go through the endpoints' clients
+        return _RoutedClient(self)
+
+    @asynccontextmanager
+    async def _rate_limited(self, input_tokens: int) -> AsyncIterator[None]:
+        token = _input_tokens.set(input_tokens)
+        try:
+            yield
+        finally:
+            _input_tokens.reset(token)
+
+    def ranked_endpoints(self) -> List[RoutedEndpoint]:
+        """Return the endpoints ordered from healthiest to least healthy"""
+        now = time.monotonic()
+        min_samples = self.router_config.min_samples
+
+        def score(endpoint: RoutedEndpoint) -> tuple:
+            stats = endpoint.stats
+            cooling = stats.cooldown_until > now
+            if len(stats.latencies) < min_samples:
+                # Too few samples to judge, try it so it can be measured
+                return (cooling, 0.0)
+            return (cooling, stats.percentile(50) * (1 + 4 * stats.error_rate))
+
+        return sorted(self.endpoints, key=score)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return routing statistics keyed by endpoint name"""
+        return {endpoint.name: endpoint.summary() for endpoint in self.endpoints}
+
+    async def dispatch(self, params: Dict[str, Any]) -> Any:
+        """Send one completion request to the healthiest available endpoint"""
+        ranked = self.ranked_endpoints()
+        last_error: Optional[BaseException] = None
+        for index, endpoint in enumerate(ranked):
+            try:
+                if params.get("stream"):
+                    return await self._stream(endpoint, params)
+                backup = ranked[index + 1] if index + 1 < len(ranked) else None
+                if self.router_config.hedge and backup is not None:
+                    return await self._hedged(endpoint, backup, params)
+                return await self._call(endpoint, params)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A bad request fails the same way on every endpoint
+                if not is_retryable(e):
+                    raise
+                last_error = e
+                if index + 1 < len(ranked):
+                    logger.warning(
+                        f"LLM endpoint '{endpoint.name}' failed, trying "
+                        f"'{ranked[index + 1].name}': {e}"
+                    )
+        raise last_error
+
+    def _record_error(self, endpoint: RoutedEndpoint, error: BaseException) -> None:
+        # Errors caused by the request, not the endpoint, say nothing of its health
+        if not is_retryable(error):
+            return
+        stats = endpoint.stats
+        stats.record_error()
+        metrics.increment(f"router.{endpoint.name}.errors")
+        if stats.consecutive_errors >= self.router_config.failure_threshold:
+            stats.cooldown_until = time.monotonic() + self.router_config.cooldown
+            logger.warning(
+                f"LLM endpoint '{endpoint.name}' failed {stats.consecutive_errors} "
+                f"times in a row, skipping it for {self.router_config.cooldown:.0f}s"
+            )
+
+    def _record_success(self, endpoint: RoutedEndpoint, latency: float) -> None:
+        endpoint.stats.record_success(latency)
+        metrics.observe(f"router.{endpoint.name}.latency", latency)
+
+    async def _call(self, endpoint: RoutedEndpoint, params: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            async with endpoint.acquire():
+                response = await endpoint.client.chat.completions.create(
+                    **{**params, "model": endpoint.model}
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._record_error(endpoint, e)
+            raise
+        self._record_success(endpoint, time.perf_counter() - start)
+        return response
+
+    async def _hedged(
+        self,
+        primary: RoutedEndpoint,
+        backup: RoutedEndpoint,
+        params: Dict[str, Any],
+    ) -> Any:
+        threshold = None
+        if len(primary.stats.latencies) >= self.router_config.min_samples:
+            threshold = primary.stats.percentile(self.router_config.hedge_percentile)
+        if threshold is None:
+            return await self._call(primary, params)
+
+        first = asyncio.create_task(self._call(primary, params))
+        done, _ = await asyncio.wait({first}, timeout=threshold)
+        if done:
+            return first.result()
+
+        metrics.increment("router.hedged")
+        logger.info(
+            f"LLM endpoint '{primary.name}' slower than {threshold:.2f}s, "
+            f"hedging with '{backup.name}'"
+        )
+        second = asyncio.create_task(self._call(backup, params))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if task is second:
+                            metrics.increment("router.hedge_won")
+                        return task.result()
+                    if not is_retryable(error):
+                        raise error
+            # Both failed, surface the primary endpoint's error
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _stream(self, endpoint: RoutedEndpoint, params: Dict[str, Any]) -> Any:
+        # Streams are not hedged; latency is measured to the first chunk
+        start = time.perf_counter()
+        stack = AsyncExitStack()
+        try:
+            await stack.enter_async_context(endpoint.acquire())
+            response = await endpoint.client.chat.completions.create(
+                **{**params, "model": endpoint.model}
+            )
+        except BaseException as e:
+            await stack.aclose()
+            if not isinstance(e, asyncio.CancelledError):
+                self._record_error(endpoint, e)
+            raise
+
+        async def chunks() -> AsyncIterator[Any]:
+            first = True
+            try:
+                async for chunk in response:
+                    if first:
+                        self._record_success(endpoint, time.perf_counter() - start)
+                        first = False
+                    yield chunk
+            except Exception as e:
+                self._record_error(endpoint, e)
+                raise
+            finally:
+                await stack.aclose()
+
+        return chunks()
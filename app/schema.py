@@ -1,7 +1,25 @@
+from collections import deque
+from dataclasses import dataclass
 from enum import Enum
-from typing import Any, List, Literal, Optional, Union
-
-from pydantic import BaseModel, Field
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from pydantic import BaseModel, ConfigDict, Field, GetCoreSchemaHandler, PrivateAttr
+from pydantic_core import core_schema
+
+from app.blobs import get_blob_store
+from app.image import base64_mime_type, prepare_image
 
 
 class Role(str, Enum):
@@ -38,28 +56,268 @@ class AgentState(str, Enum):
     ERROR = "ERROR"
 
 
-class Function(BaseModel):
+def _instance_schema(cls: type, coerce: Callable[[Any], Any]) -> core_schema.CoreSchema:
+    """Pydantic schema accepting instances of cls as they are and dicts via coerce"""
+    return core_schema.no_info_before_validator_function(
+        coerce,
+        core_schema.is_instance_schema(cls),
+        serialization=core_schema.plain_serializer_function_ser_schema(
+            lambda value: value.to_dict()
+        ),
+    )
+
+
+@dataclass(slots=True)
+class Function:
     name: str
     arguments: str
 
+    def to_dict(self) -> dict:
+        return {"name": self.name, "arguments": self.arguments}
+
 
-class ToolCall(BaseModel):
+@dataclass(slots=True)
+class ToolCall:
     """Represents a tool/function call in a message"""
 
     id: str
-    type: str = "function"
     function: Function
+    type: str = "function"
+
+    @classmethod
+    def from_any(cls, call: Any) -> "ToolCall":
+        """Convert a tool call dict or provider object (e.g. from OpenAI)"""
+        if isinstance(call, ToolCall):
+            return call
+        if isinstance(call, dict):
+            function = call["function"]
+            if isinstance(function, dict):
+                function = Function(function["name"], function["arguments"])
+            return cls(call["id"], function, call.get("type", "function"))
+        function = Function(call.function.name, call.function.arguments)
+        return cls(call.id, function, getattr(call, "type", None) or "function")
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "type": self.type, "function": self.function.to_dict()}
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        return _instance_schema(cls, lambda value: cls.from_any(value))
+
+
+def image_content_block(base64_image: str) -> dict:
+    """Build the content block that embeds a base64 encoded image"""
+    base64_image = prepare_image(base64_image)
+    mime_type = base64_mime_type(base64_image)
+    return {
+        "type": "image_url",
+        "image_url": {"url": f"data:{mime_type};base64,{base64_image}"},
+    }
+
+
+OMITTED_OLDER_IMAGE_TEXT = "[Older image omitted]"
+
+
+def image_ref_block(image_ref: str) -> dict:
+    """Build a placeholder block that materialize_images replaces with the image"""
+    return {"type": "image_ref", "image_ref": image_ref}
+
+
+def format_wire_message(message: dict, supports_images: bool = False) -> dict:
+    """Convert a message dict to the API format without modifying it.
+
+    Messages without an image are returned as is; otherwise a new dict is
+    built with the image moved into the content (or dropped if the model
+    does not support images). Images held in the blob store are added as
+    image_ref blocks, which materialize_images resolves.
+    """
+    base64_image = message.get("base64_image")
+    image_ref = message.get("image_ref")
+    if not base64_image and not image_ref:
+        return message
+
+    message = {
+        key: value
+        for key, value in message.items()
+        if key not in ("base64_image", "image_ref")
+    }
+    if supports_images:
+        content = message.get("content")
+        if not content:
+            content = []
+        elif isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        elif isinstance(content, list):
+            # Convert string items to proper text objects
+            content = [
+                {"type": "text", "text": item} if isinstance(item, str) else item
+                for item in content
+            ]
+        block = (
+            image_content_block(base64_image)
+            if base64_image
+            else image_ref_block(image_ref)
+        )
+        message["content"] = content + [block]
+    return message
+
+
+def materialize_images(
+    messages: List[dict], max_images: Optional[int] = None
+) -> List[dict]:
+    """Load the images referenced by formatted messages from the blob store.
+
+    Only the newest max_images references are loaded (all if None); older
+    ones, and any whose blob is no longer available, are replaced by a note.
+    Formatted messages are shared with the Message cache, so messages with
+    references are copied instead of modified.
+    """
+    store = get_blob_store()
+    remaining = max_images
+    result = []
+    for message in reversed(messages):
+        content = message.get("content")
+        if isinstance(content, list) and any(
+            isinstance(block, dict) and block.get("type") == "image_ref"
+            for block in content
+        ):
+            blocks = []
+            for block in reversed(content):
+                if not isinstance(block, dict) or block.get("type") != "image_ref":
+                    blocks.append(block)
+                    continue
+                image = None
+                if remaining is None or remaining > 0:
+                    image = store.get(block["image_ref"])
+                if image is None:
+                    blocks.append({"type": "text", "text": OMITTED_OLDER_IMAGE_TEXT})
+                    continue
+                blocks.append(image_content_block(image))
+                if remaining is not None:
+                    remaining -= 1
+            blocks.reverse()
+            message = {**message, "content": blocks}
+        result.append(message)
+    result.reverse()
+    return result
+
+
+class Message:
+    """Represents a chat message in the conversation.
+
+    A plain class with __slots__ rather than a pydantic model: agents create
+    and serialize messages on every step, where validation and per-instance
+    dicts only cost time and memory. Messages are checked when they are
+    created; pydantic models holding them, such as Memory, accept Message
+    instances as they are and build them from dicts.
+    """
+
+    __slots__ = (
+        "role",
+        "content",
+        "tool_calls",
+        "name",
+        "tool_call_id",
+        "image_ref",
+        "_wire",
+        "_frozen",
+    )
+
+    def __init__(
+        self,
+        role: ROLE_TYPE,  # type: ignore
+        content: Optional[str] = None,
+        tool_calls: Optional[List[Any]] = None,
+        name: Optional[str] = None,
+        tool_call_id: Optional[str] = None,
+        image_ref: Optional[str] = None,
+        base64_image: Optional[str] = None,
+    ):
+        role = role.value if isinstance(role, Role) else role
+        if role not in ROLE_VALUES:
+            raise ValueError(f"Invalid role: {role}")
+        if tool_calls is not None:
+            tool_calls = [ToolCall.from_any(call) for call in tool_calls]
+        if base64_image:
+            # Screenshots are stored downscaled in the blob store, so memory
+            # only holds a reference and identical images are kept once
+            image_ref = get_blob_store().put(prepare_image(base64_image))
+
+        init = object.__setattr__
+        init(self, "role", role)
+        init(self, "content", content)
+        init(self, "tool_calls", tool_calls)
+        init(self, "name", name)
+        init(self, "tool_call_id", tool_call_id)
+        init(self, "image_ref", image_ref)
+        # API format keyed by supports_images, built on first use and
+        # dropped whenever a field is assigned
+        init(self, "_wire", None)
+        # Set once the message is stored in a Memory, see _freeze
+        init(self, "_frozen", False)
+
+    @property
+    def base64_image(self) -> Optional[str]:
+        """The attached image, loaded from the blob store"""
+        return get_blob_store().get(self.image_ref) if self.image_ref else None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if self._frozen:
+            raise AttributeError(
+                f"Cannot assign {name}: a message stored in a Memory is read-only, "
+                "use replace() to build a changed copy"
+            )
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, "_wire", None)
+
+    def _freeze(self) -> None:
+        """Make the message read-only.
 
+        Memory keeps a running token total and a journal of the messages it
+        stores, neither of which would notice a field changing afterwards.
+        """
+        object.__setattr__(self, "_frozen", True)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None  # Mutable, like the pydantic models it replaces
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={value!r}"
+            for name, value in zip(self.__slots__, self._fields())
+            if value is not None
+        )
+        return f"Message({fields})"
+
+    def _fields(self) -> tuple:
+        return (
+            self.role,
+            self.content,
+            self.tool_calls,
+            self.name,
+            self.tool_call_id,
+            self.image_ref,
+        )
 
-class Message(BaseModel):
-    """Represents a chat message in the conversation"""
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        return _instance_schema(
+            cls, lambda value: cls(**value) if isinstance(value, dict) else value
+        )
 
-    role: ROLE_TYPE = Field(...)  # type: ignore
-    content: Optional[str] = Field(default=None)
-    tool_calls: Optional[List[ToolCall]] = Field(default=None)
-    name: Optional[str] = Field(default=None)
-    tool_call_id: Optional[str] = Field(default=None)
-    base64_image: Optional[str] = Field(default=None)
+    def replace(self, **changes: Any) -> "Message":
+        """Return a copy of the message with some fields changed"""
+        fields = dict(zip(self.__slots__, self._fields()))
+        fields.update(changes)
+        return Message(**fields)
 
     def __add__(self, other) -> List["Message"]:
         """支持 Message + list 或 Message + Message 的操作"""
@@ -87,15 +345,31 @@ class Message(BaseModel):
         if self.content is not None:
             message["content"] = self.content
         if self.tool_calls is not None:
-            message["tool_calls"] = [tool_call.dict() for tool_call in self.tool_calls]
+            message["tool_calls"] = [call.to_dict() for call in self.tool_calls]
         if self.name is not None:
             message["name"] = self.name
         if self.tool_call_id is not None:
             message["tool_call_id"] = self.tool_call_id
-        if self.base64_image is not None:
-            message["base64_image"] = self.base64_image
+        if self.image_ref is not None:
+            message["image_ref"] = self.image_ref
         return message
 
+    def to_wire(self, supports_images: bool = False) -> dict:
+        """Return the message in API format, cached until a field is assigned.
+
+        The returned dict is shared between requests and must not be modified.
+        An attached image is only referenced; see materialize_images.
+        """
+        cache = self._wire
+        if cache is None:
+            cache = {}
+            object.__setattr__(self, "_wire", cache)
+        wire = cache.get(supports_images)
+        if wire is None:
+            wire = format_wire_message(self.to_dict(), supports_images)
+            cache[supports_images] = wire
+        return wire
+
     @classmethod
     def user_message(
         cls, content: str, base64_image: Optional[str] = None
@@ -143,42 +417,205 @@ class Message(BaseModel):
             content: Optional message content
             base64_image: Optional base64 encoded image
         """
-        formatted_calls = [
-            {"id": call.id, "function": call.function.model_dump(), "type": "function"}
-            for call in tool_calls
-        ]
         return cls(
             role=Role.ASSISTANT,
             content=content,
-            tool_calls=formatted_calls,
+            tool_calls=[ToolCall.from_any(call) for call in tool_calls],
             base64_image=base64_image,
             **kwargs,
         )
 
 
 class Memory(BaseModel):
-    messages: List[Message] = Field(default_factory=list)
+    """Conversation history with bounded size.
+
+    Messages are kept in a deque, so appending and evicting the oldest
+    message are O(1). When the history grows past max_messages, or past
+    max_tokens once a token counter is bound, the oldest messages are
+    evicted. An assistant message is evicted together with the tool
+    results answering its tool calls, so the history never starts with a
+    tool message whose call is gone, which the API rejects.
+
+    Stored messages are read-only: assigning a field of one raises
+    AttributeError, as the token total and journal count it as added.
+    """
+
+    model_config = ConfigDict(validate_assignment=True)
+
+    messages: Deque[Message] = Field(default_factory=deque)
     max_messages: int = Field(default=100)
+    max_tokens: Optional[int] = Field(
+        default=None, description="Token budget of the history (needs a counter)"
+    )
+
+    # Running token total, maintained once a token counter is bound
+    _token_counter: Optional[Callable[[Message], int]] = PrivateAttr(default=None)
+    _token_counts: Dict[int, Tuple[Message, int]] = PrivateAttr(default_factory=dict)
+    _token_total: int = PrivateAttr(default=0)
+    # Called with (kind, data) for every change once a session journal is bound
+    _journal: Optional[Callable[[str, Any], None]] = PrivateAttr(default=None)
 
     def add_message(self, message: Message) -> None:
         """Add a message to memory"""
+        message._freeze()
         self.messages.append(message)
-        # Optional: Implement message limit
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+        self._track_tokens(message)
+        self._evict()
+        if self._journal is not None:
+            self._journal_messages([message])
 
     def add_messages(self, messages: List[Message]) -> None:
         """Add multiple messages to memory"""
         self.messages.extend(messages)
+        for message in messages:
+            message._freeze()
+            self._track_tokens(message)
+        self._evict()
+        if self._journal is not None and messages:
+            self._journal_messages(messages)
 
     def clear(self) -> None:
         """Clear all messages"""
         self.messages.clear()
+        self._token_counts.clear()
+        self._token_total = 0
+        if self._journal is not None:
+            self._journal("clear", None)
 
     def get_recent_messages(self, n: int) -> List[Message]:
         """Get n most recent messages"""
-        return self.messages[-n:]
+        recent = list(islice(reversed(self.messages), max(n, 0)))
+        recent.reverse()
+        return recent
 
     def to_dict_list(self) -> List[dict]:
         """Convert messages to list of dicts"""
         return [msg.to_dict() for msg in self.messages]
+
+    def _over_limit(self) -> bool:
+        if len(self.messages) > self.max_messages:
+            return True
+        return (
+            self.max_tokens is not None
+            and self._token_counter is not None
+            and self.token_count > self.max_tokens
+        )
+
+    def _evict(self) -> None:
+        """Evict the oldest message groups until memory is within its limits.
+
+        The newest group is always kept, even if it alone exceeds a limit.
+        """
+        messages = self.messages
+        while self._over_limit():
+            # Tool results following the oldest message answer its tool calls
+            group = 1
+            while group < len(messages) and messages[group].role == Role.TOOL:
+                group += 1
+            if group >= len(messages):
+                break
+            for _ in range(group):
+                self._untrack_tokens(messages.popleft())
+
+    def replace(self, messages: List[Message]) -> None:
+        """Replace the whole history.
+
+        A bulk operation for rare rewrites of the history; it is journaled
+        as one snapshot of the new history.
+        """
+        journal, self._journal = self._journal, None
+        try:
+            self.clear()
+            self.add_messages(messages)
+        finally:
+            self._journal = journal
+        if journal is not None:
+            self._journal_messages(self.messages, kind="snapshot")
+
+    def _journal_messages(self, messages: Iterable[Message], kind: str = "add") -> None:
+        # A resumed session needs the images too, so they are written to disk
+        # now rather than when they spill from memory
+        store = get_blob_store()
+        data = []
+        for message in messages:
+            if message.image_ref:
+                store.persist(message.image_ref)
+            data.append(message.to_dict())
+        self._journal(kind, data)
+
+    def bind_journal(self, journal: Callable[[str, Any], None]) -> None:
+        """Report every change to journal, as used by app.session.SessionStore.
+
+        Evictions are not journaled; replaying the additions evicts the same
+        messages again.
+        """
+        self._journal = journal
+
+    def snapshot(self) -> List[dict]:
+        """Return the stored messages in a form restore() accepts"""
+        return [message.to_dict() for message in self.messages]
+
+    def restore(self, events: List[Tuple[str, Any]]) -> None:
+        """Rebuild the history by replaying journaled changes, oldest first"""
+        journal, self._journal = self._journal, None
+        try:
+            for kind, data in events:
+                if kind in ("clear", "snapshot"):
+                    self.clear()
+                if kind in ("add", "snapshot"):
+                    self.add_messages([Message(**message) for message in data])
+        finally:
+            self._journal = journal
+
+    def bind_token_counter(self, counter: Callable[[Message], int]) -> None:
+        """Attach a per-message token counter and start keeping a running total.
+
+        Args:
+            counter: Callable returning the token count of a single message
+        """
+        self._token_counter = counter
+        self._token_counts = {}
+        self._token_total = 0
+        self._sync_token_counts()
+
+    @property
+    def token_count(self) -> int:
+        """Running token total of the stored messages (0 if no counter is bound)"""
+        if self._token_counter is None:
+            return 0
+        self._sync_token_counts()
+        return self._token_total
+
+    def _track_tokens(self, message: Message) -> None:
+        if self._token_counter is None or id(message) in self._token_counts:
+            return
+        tokens = self._token_counter(message)
+        self._token_counts[id(message)] = (message, tokens)
+        self._token_total += tokens
+
+    def _untrack_tokens(self, message: Message) -> None:
+        entry = self._token_counts.pop(id(message), None)
+        if entry is not None:
+            self._token_total -= entry[1]
+
+    def _sync_token_counts(self) -> None:
+        """Reconcile the running total after messages were replaced directly.
+
+        Only messages that have not been counted before are tokenized.
+        """
+        if len(self._token_counts) == len(self.messages) and all(
+            self._token_counts.get(id(msg), (None,))[0] is msg
+            for msg in islice(reversed(self.messages), 2)
+        ):
+            return
+
+        previous = self._token_counts
+        self._token_counts = {}
+        self._token_total = 0
+        for message in self.messages:
+            entry = previous.get(id(message))
+            if entry is None or entry[0] is not message:
+                message._freeze()
+                entry = (message, self._token_counter(message))
+            self._token_counts[id(message)] = entry
+            self._token_total += entry[1]
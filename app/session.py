@@ -0,0 +1,227 @@
+"""Persistent, append-only journal of agent and flow state."""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import PROJECT_ROOT, SessionSettings, config
+from app.logger import logger
+from app.metrics import metrics
+
+
+DEFAULT_SESSION_PATH = PROJECT_ROOT / ".cache" / "sessions.db"
+
+Journal = Callable[[str, Any], None]
+
+
+class SessionStore:
+    """Journals the state of a session's agents to an append-only SQLite log.
+
+    Every change is one row: a message added to an agent's memory, a plan
+    created or marked, a file version kept for undo. Each row belongs to a
+    stream, such as "manus.memory", and streams are restored by replaying
+    their rows in order. The log is written in WAL mode with one small
+    transaction per change, so a crash loses at most the change in flight.
+
+    Agents and flows write checkpoints to a stream of their own once a step
+    is complete. Restoring drops the changes made after the owner's last
+    checkpoint, since the step that made them runs again. When a stream has
+    grown by `compact_every` rows, its owner's next checkpoint replaces them
+    with a single snapshot row.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        path: Optional[Path] = DEFAULT_SESSION_PATH,
+        compact_every: int = 200,
+    ):
+        self.session_id = session_id
+        self.path = Path(path) if path else None
+        self.compact_every = compact_every
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        # Stream -> (checkpoint stream, snapshot function, rows since the last snapshot)
+        self._journals: Dict[str, Tuple[str, Callable[[], Any], int]] = {}
+
+    @classmethod
+    def from_settings(
+        cls, session_id: str, settings: Optional[SessionSettings] = None
+    ) -> "SessionStore":
+        settings = settings or config.session_config
+        path = Path(settings.path) if settings.path else DEFAULT_SESSION_PATH
+        if not path.is_absolute():
+            path = PROJECT_ROOT / path
+        return cls(session_id, path=path, compact_every=settings.compact_every)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.path is None:
+                self._db = sqlite3.connect(":memory:", check_same_thread=False)
+            else:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT NOT NULL, "
+                "stream TEXT NOT NULL, kind TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS events_stream "
+                "ON events(session, stream, seq)"
+            )
+            self._db.commit()
+        return self._db
+
+    def _insert(self, db: sqlite3.Connection, stream: str, kind: str, data: Any) -> int:
+        payload = json.dumps(data, ensure_ascii=False)
+        metrics.increment("session.bytes_written", len(payload))
+        cursor = db.execute(
+            "INSERT INTO events (session, stream, kind, data) VALUES (?, ?, ?, ?)",
+            (self.session_id, stream, kind, payload),
+        )
+        return cursor.lastrowid
+
+    def append(self, stream: str, kind: str, data: Any = None) -> int:
+        """Append a change to a stream and return its sequence number"""
+        with self._db_lock:
+            db = self._connect()
+            seq = self._insert(db, stream, kind, data)
+            db.commit()
+        if stream in self._journals:
+            owner, snapshot, written = self._journals[stream]
+            self._journals[stream] = (owner, snapshot, written + 1)
+        return seq
+
+    def events(self, stream: str) -> List[Tuple[int, str, Any]]:
+        """Return the (seq, kind, data) rows of a stream, oldest first"""
+        with self._db_lock:
+            rows = (
+                self._connect()
+                .execute(
+                    "SELECT seq, kind, data FROM events "
+                    "WHERE session = ? AND stream = ? ORDER BY seq",
+                    (self.session_id, stream),
+                )
+                .fetchall()
+            )
+        return [(seq, kind, json.loads(data)) for seq, kind, data in rows]
+
+    def last_event(self, stream: str) -> Optional[Tuple[int, str, Any]]:
+        """Return the newest row of a stream, or None if it is empty"""
+        with self._db_lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT seq, kind, data FROM events "
+                    "WHERE session = ? AND stream = ? ORDER BY seq DESC LIMIT 1",
+                    (self.session_id, stream),
+                )
+                .fetchone()
+            )
+        return (row[0], row[1], json.loads(row[2])) if row else None
+
+    def truncate(self, stream: str, after: int) -> int:
+        """Delete the rows of a stream written after seq, returning how many"""
+        with self._db_lock:
+            db = self._connect()
+            cursor = db.execute(
+                "DELETE FROM events WHERE session = ? AND stream = ? AND seq > ?",
+                (self.session_id, stream, after),
+            )
+            db.commit()
+        return cursor.rowcount
+
+    def journal(
+        self, stream: str, snapshot: Callable[[], Any], checkpoints: str
+    ) -> Journal:
+        """Return a function appending changes to stream.
+
+        Args:
+            stream: Stream the changes are written to
+            snapshot: Returns the full current state, written when compacting
+            checkpoints: Stream of the checkpoints the changes are consistent at
+        """
+        self._journals[stream] = (checkpoints, snapshot, 0)
+        return lambda kind, data: self.append(stream, kind, data)
+
+    def checkpoint(self, stream: str, kind: str, data: Any = None) -> int:
+        """Record that the state journaled against stream is consistent.
+
+        Streams owned by this checkpoint stream that have grown too large are
+        compacted first, so their snapshots are kept when the changes after
+        the checkpoint are dropped on restore. Other streams are left alone,
+        as they may hold changes their own owner has not checkpointed yet.
+        """
+        with self._db_lock:
+            db = self._connect()
+            for name, (owner, snapshot, written) in list(self._journals.items()):
+                if owner != stream or written < self.compact_every:
+                    continue
+                seq = self._insert(db, name, "snapshot", snapshot())
+                db.execute(
+                    "DELETE FROM events WHERE session = ? AND stream = ? AND seq < ?",
+                    (self.session_id, name, seq),
+                )
+                self._journals[name] = (owner, snapshot, 0)
+                metrics.increment("session.compactions")
+            seq = self._insert(db, stream, kind, data)
+            db.commit()
+        return seq
+
+    def restore(self, component: Any, stream: str, checkpoints: str) -> None:
+        """Rebuild a component from its stream and journal its further changes.
+
+        Args:
+            component: Object with `restore(events)`, `snapshot()` and
+                `bind_journal(journal)` methods
+            stream: Stream holding the component's changes
+            checkpoints: Stream of the owner's checkpoints; changes made after
+                the last one are dropped
+        """
+        last = self.last_event(checkpoints)
+        dropped = self.truncate(stream, last[0] if last else 0)
+        if dropped:
+            logger.info(f"Dropped {dropped} unfinished changes from {stream}")
+        events = self.events(stream)
+        if events:
+            component.restore([(kind, data) for _, kind, data in events])
+        else:
+            # Start the stream from the current state, which may predate the session
+            self.append(stream, "snapshot", component.snapshot())
+        component.bind_journal(self.journal(stream, component.snapshot, checkpoints))
+
+    def delete(self) -> None:
+        """Remove every row of this session"""
+        with self._db_lock:
+            db = self._connect()
+            db.execute("DELETE FROM events WHERE session = ?", (self.session_id,))
+            db.commit()
+        self._journals.clear()
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def open_session(session_id: Optional[str] = None) -> Optional[SessionStore]:
+    """Open the session a run is journaled to.
+
+    Returns None when no session id is given and sessions are not enabled
+    in the config; otherwise a new id is generated if none is given.
+    """
+    if session_id is None:
+        if not config.session_config.enabled:
+            return None
+        session_id = datetime.now().strftime("%Y%m%d%H%M%S")
+    logger.info(
+        f"Journaling to session {session_id}, resume with --session {session_id}"
+    )
+    return SessionStore.from_settings(session_id)
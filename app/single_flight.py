@@ -0,0 +1,63 @@
+"""Coalescing of identical concurrent calls into a single one."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from app.metrics import metrics
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time.
+
+    Callers that arrive while a call for the same key is in flight await
+    its result (or exception) instead of starting their own. The call runs
+    as a task of its own, so one caller being cancelled does not fail the
+    others; it is only cancelled when every caller has gone away.
+    """
+
+    def __init__(self, name: str = "llm"):
+        self.name = name
+        self._flights: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(
+        self, key: str, func: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Return (result, shared), shared being True if another caller made the call"""
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.coalesced += 1
+            metrics.increment(f"{self.name}.coalesced_requests")
+        else:
+            self.calls += 1
+            flight = _Flight(asyncio.ensure_future(func()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), shared
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
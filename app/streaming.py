@@ -0,0 +1,114 @@
+"""Sinks that receive streamed LLM output."""
+import asyncio
+import sys
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Awaitable, Callable, Optional, TextIO, Union
+
+
+class StreamSink(ABC):
+    """Destination for tokens streamed by the LLM.
+
+    `write` is awaited for every chunk, so a slow consumer applies
+    backpressure to the stream. `end` marks the end of one response.
+    """
+
+    @abstractmethod
+    async def write(self, text: str) -> None:
+        """Receive one chunk of streamed text"""
+
+    async def end(self) -> None:
+        """Called once the current response has been fully streamed"""
+
+
+class NullSink(StreamSink):
+    """Discards streamed output."""
+
+    async def write(self, text: str) -> None:
+        return None
+
+
+class StdoutSink(StreamSink):
+    """Writes streamed output to a terminal, batching small chunks.
+
+    Output is flushed on newlines, once `flush_size` characters are buffered,
+    or after `flush_interval` seconds, instead of one syscall per token.
+    """
+
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        flush_size: int = 256,
+        flush_interval: float = 0.05,
+    ):
+        self.stream = stream
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._buffer: list[str] = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    async def write(self, text: str) -> None:
+        if not text:
+            return
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if (
+            "\n" in text
+            or self._buffered >= self.flush_size
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self._flush()
+
+    async def end(self) -> None:
+        self._buffer.append("\n")  # Newline after streaming
+        self._flush()
+
+    def _flush(self) -> None:
+        stream = self.stream or sys.stdout
+        stream.write("".join(self._buffer))
+        stream.flush()
+        self._buffer.clear()
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+
+class QueueSink(StreamSink):
+    """Forwards streamed output to an asyncio.Queue for another coroutine.
+
+    A bounded queue makes the LLM stream wait for the consumer. Iterating the
+    sink yields chunks until the end of the current response.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # Whether the current response has ended and its reader stopped
+        self.ended = False
+
+    async def write(self, text: str) -> None:
+        if text:
+            self.ended = False
+            await self.queue.put(text)
+
+    async def end(self) -> None:
+        self.ended = True
+        await self.queue.put(None)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            chunk = await self.queue.get()
+            if chunk is None:
+                return
+            yield chunk
+
+
+class CallbackSink(StreamSink):
+    """Calls a sync or async function for every chunk."""
+
+    def __init__(self, callback: Callable[[str], Union[None, Awaitable[None]]]):
+        self.callback = callback
+
+    async def write(self, text: str) -> None:
+        result = self.callback(text)
+        if result is not None:
+            await result
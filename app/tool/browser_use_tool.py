@@ -460,6 +460,7 @@ Page content:
                             messages,
                             tools=[extraction_function],
                             tool_choice="required",
+                            purpose="extract",
                         )
 
                         # Extract content from function call response
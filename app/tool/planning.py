@@ -1,5 +1,7 @@
 # tool/planning.py
-from typing import Dict, List, Literal, Optional
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+from pydantic import PrivateAttr
 
 from app.exceptions import ToolError
 from app.tool.base import BaseTool, ToolResult
@@ -67,7 +69,10 @@ class PlanningTool(BaseTool):
     }
 
     plans: dict = {}  # Dictionary to store plans by plan_id
-    _current_plan_id: Optional[str] = None  # Track the current active plan
+    # Track the current active plan
+    _current_plan_id: Optional[str] = PrivateAttr(default=None)
+    # Called with (kind, data) for every change once a session journal is bound
+    _journal: Optional[Callable[[str, Any], None]] = PrivateAttr(default=None)
 
     async def execute(
         self,
@@ -152,6 +157,8 @@ class PlanningTool(BaseTool):
 
         self.plans[plan_id] = plan
         self._current_plan_id = plan_id  # Set as active plan
+        self._record("plan", plan)
+        self._record("active", plan_id)
 
         return ToolResult(
             output=f"Plan created successfully with ID: {plan_id}\n\n{self._format_plan(plan)}"
@@ -202,6 +209,7 @@ class PlanningTool(BaseTool):
             plan["step_statuses"] = new_statuses
             plan["step_notes"] = new_notes
 
+        self._record("plan", plan)
         return ToolResult(
             output=f"Plan updated successfully: {plan_id}\n\n{self._format_plan(plan)}"
         )
@@ -250,6 +258,7 @@ class PlanningTool(BaseTool):
             raise ToolError(f"No plan found with ID: {plan_id}")
 
         self._current_plan_id = plan_id
+        self._record("active", plan_id)
         return ToolResult(
             output=f"Plan '{plan_id}' is now the active plan.\n\n{self._format_plan(self.plans[plan_id])}"
         )
@@ -299,6 +308,7 @@ class PlanningTool(BaseTool):
         if step_notes:
             plan["step_notes"][step_index] = step_notes
 
+        self._record("plan", plan)
         return ToolResult(
             output=f"Step {step_index} updated in plan '{plan_id}'.\n\n{self._format_plan(plan)}"
         )
@@ -312,6 +322,7 @@ class PlanningTool(BaseTool):
             raise ToolError(f"No plan found with ID: {plan_id}")
 
         del self.plans[plan_id]
+        self._record("delete", plan_id)
 
         # If the deleted plan was the active plan, clear the active plan
         if self._current_plan_id == plan_id:
@@ -319,6 +330,38 @@ class PlanningTool(BaseTool):
 
         return ToolResult(output=f"Plan '{plan_id}' has been deleted.")
 
+    @property
+    def current_plan_id(self) -> Optional[str]:
+        """ID of the active plan, if any"""
+        return self._current_plan_id
+
+    def _record(self, kind: str, data: Any) -> None:
+        if self._journal is not None:
+            self._journal(kind, data)
+
+    def bind_journal(self, journal: Callable[[str, Any], None]) -> None:
+        """Report every plan change to journal, as used by app.session.SessionStore"""
+        self._journal = journal
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the plans and the active plan in a form restore() accepts"""
+        return {"plans": self.plans, "active": self._current_plan_id}
+
+    def restore(self, events: List[Tuple[str, Any]]) -> None:
+        """Rebuild the plans by replaying journaled changes, oldest first"""
+        for kind, data in events:
+            if kind == "snapshot":
+                self.plans = data["plans"]
+                self._current_plan_id = data["active"]
+            elif kind == "plan":
+                self.plans[data["plan_id"]] = data
+            elif kind == "active":
+                self._current_plan_id = data
+            elif kind == "delete":
+                self.plans.pop(data, None)
+                if self._current_plan_id == data:
+                    self._current_plan_id = None
+
     def _format_plan(self, plan: Dict) -> str:
         """Format a plan for display."""
         output = f"Plan: {plan['title']} (ID: {plan['plan_id']})\n"
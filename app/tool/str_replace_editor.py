@@ -2,7 +2,19 @@
 
 from collections import defaultdict
 from pathlib import Path
-from typing import Any, DefaultDict, List, Literal, Optional, get_args
+from typing import (
+    Any,
+    Callable,
+    DefaultDict,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    get_args,
+)
+
+from pydantic import PrivateAttr
 
 from app.config import config
 from app.exceptions import ToolError
@@ -98,9 +110,13 @@ class StrReplaceEditor(BaseTool):
         },
         "required": ["command", "path"],
     }
-    _file_history: DefaultDict[PathLike, List[str]] = defaultdict(list)
+    _file_history: DefaultDict[PathLike, List[str]] = PrivateAttr(
+        default_factory=lambda: defaultdict(list)
+    )
     _local_operator: LocalFileOperator = LocalFileOperator()
     _sandbox_operator: SandboxFileOperator = SandboxFileOperator()
+    # Called with (kind, data) for every history change once a journal is bound
+    _journal: Optional[Callable[[str, Any], None]] = PrivateAttr(default=None)
 
     # def _get_operator(self, use_sandbox: bool) -> FileOperator:
     def _get_operator(self) -> FileOperator:
@@ -137,7 +153,7 @@ class StrReplaceEditor(BaseTool):
             if file_text is None:
                 raise ToolError("Parameter `file_text` is required for command: create")
             await operator.write_file(path, file_text)
-            self._file_history[path].append(file_text)
+            self._push_history(path, file_text)
             result = ToolResult(output=f"File created successfully at: {path}")
         elif command == "str_replace":
             if old_str is None:
@@ -320,7 +336,7 @@ class StrReplaceEditor(BaseTool):
         await operator.write_file(path, new_file_content)
 
         # Save the original content to history
-        self._file_history[path].append(file_content)
+        self._push_history(path, file_content)
 
         # Create a snippet of the edited section
         replacement_line = file_content.split(old_str)[0].count("\n")
@@ -378,7 +394,7 @@ class StrReplaceEditor(BaseTool):
         snippet = "\n".join(snippet_lines)
 
         await operator.write_file(path, new_file_text)
-        self._file_history[path].append(file_text)
+        self._push_history(path, file_text)
 
         # Prepare success message
         success_msg = f"The file {path} has been edited. "
@@ -400,11 +416,37 @@ class StrReplaceEditor(BaseTool):
 
         old_text = self._file_history[path].pop()
         await operator.write_file(path, old_text)
+        if self._journal is not None:
+            self._journal("pop", str(path))
 
         return CLIResult(
             output=f"Last edit to {path} undone successfully. {self._make_output(old_text, str(path))}"
         )
 
+    def _push_history(self, path: PathLike, file_text: str) -> None:
+        """Keep the previous version of a file for undo_edit"""
+        self._file_history[path].append(file_text)
+        if self._journal is not None:
+            self._journal("push", [str(path), file_text])
+
+    def bind_journal(self, journal: Callable[[str, Any], None]) -> None:
+        """Report every edit history change to journal, see app.session"""
+        self._journal = journal
+
+    def snapshot(self) -> Dict[str, List[str]]:
+        """Return the edit history in a form restore() accepts"""
+        return {str(path): texts for path, texts in self._file_history.items() if texts}
+
+    def restore(self, events: List[Tuple[str, Any]]) -> None:
+        """Rebuild the edit history by replaying journaled changes, oldest first"""
+        for kind, data in events:
+            if kind == "snapshot":
+                self._file_history = defaultdict(list, data)
+            elif kind == "push":
+                self._file_history[data[0]].append(data[1])
+            elif kind == "pop" and self._file_history[data]:
+                self._file_history[data].pop()
+
     def _make_output(
         self,
         file_content: str,
@@ -1,10 +1,23 @@
 """Collection classes for managing multiple tools."""
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.exceptions import ToolError
 from app.tool.base import BaseTool, ToolFailure, ToolResult
 
 
+class ToolParams(list):
+    """Serialized tool schemas for one version of a ToolCollection.
+
+    The same list is handed out until the collection changes, so it must not
+    be mutated. `token_costs` caches the schema token count per model.
+    """
+
+    def __init__(self, params: List[Dict[str, Any]], version: int):
+        super().__init__(params)
+        self.version = version
+        self.token_costs: Dict[str, int] = {}
+
+
 class ToolCollection:
     """A collection of defined tools."""
 
@@ -12,14 +25,30 @@ class ToolCollection:
         arbitrary_types_allowed = True
 
     def __init__(self, *tools: BaseTool):
+        self.version = 0
+        self._params: Optional[ToolParams] = None
         self.tools = tools
         self.tool_map = {tool.name: tool for tool in tools}
 
+    @property
+    def tools(self) -> Tuple[BaseTool, ...]:
+        return self._tools
+
+    @tools.setter
+    def tools(self, tools: Tuple[BaseTool, ...]) -> None:
+        # Every change to the tool set invalidates the cached params
+        self._tools = tools
+        self.version += 1
+
     def __iter__(self):
         return iter(self.tools)
 
-    def to_params(self) -> List[Dict[str, Any]]:
-        return [tool.to_param() for tool in self.tools]
+    def to_params(self) -> ToolParams:
+        if self._params is None or self._params.version != self.version:
+            self._params = ToolParams(
+                [tool.to_param() for tool in self.tools], self.version
+            )
+        return self._params
 
     async def execute(
         self, *, name: str, tool_input: Dict[str, Any] = None
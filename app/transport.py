@@ -0,0 +1,439 @@
+"""Record, replay and mock transports for LLM API clients."""
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from pydantic import BaseModel
+
+from app.bedrock import OpenAIResponse
+from app.cache import ResponseCache
+from app.config import PROJECT_ROOT, TransportSettings, config
+from app.logger import logger
+
+
+DEFAULT_CASSETTE_PATH = PROJECT_ROOT / ".cache" / "llm_cassette.jsonl"
+TRANSPORT_MODES = ("live", "record", "replay", "mock")
+
+# Request fields that select the response; timeouts and stream options do not
+_KEY_FIELDS = (
+    "model",
+    "messages",
+    "tools",
+    "tool_choice",
+    "temperature",
+    "max_tokens",
+    "max_completion_tokens",
+)
+
+
+def to_jsonable(value: Any) -> Any:
+    """Convert a response object (OpenAI or Bedrock) into plain JSON data"""
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if hasattr(value, "__dict__"):
+        return {key: to_jsonable(item) for key, item in vars(value).items()}
+    return value
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    return ResponseCache.make_key(
+        **{field: params.get(field) for field in _KEY_FIELDS if field in params}
+    )
+
+
+def completion_to_chunks(data: Dict[str, Any], piece_size: int = 16) -> List[dict]:
+    """Split a chat completion into the chunks a stream would have delivered"""
+    base = {
+        "id": data.get("id") or "chatcmpl-replay",
+        "created": data.get("created") or int(time.time()),
+        "model": data.get("model") or "replay",
+        "object": "chat.completion.chunk",
+    }
+    choice = data["choices"][0]
+    message = choice.get("message") or {}
+
+    def chunk(delta: dict, finish_reason: Optional[str] = None) -> dict:
+        return {
+            **base,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+
+    chunks = [chunk({"role": "assistant", "content": ""})]
+    content = message.get("content") or ""
+    for start in range(0, len(content), piece_size):
+        chunks.append(chunk({"content": content[start : start + piece_size]}))
+    for index, call in enumerate(message.get("tool_calls") or []):
+        chunks.append(
+            chunk(
+                {
+                    "tool_calls": [
+                        {
+                            "index": index,
+                            "id": call.get("id"),
+                            "type": "function",
+                            "function": call.get("function"),
+                        }
+                    ]
+                }
+            )
+        )
+    chunks.append(chunk({}, choice.get("finish_reason") or "stop"))
+    if data.get("usage"):
+        chunks.append({**base, "choices": [], "usage": data["usage"]})
+    return chunks
+
+
+def chunks_to_completion(chunks: List[dict]) -> dict:
+    """Reassemble recorded stream chunks into a chat completion"""
+    content, calls, usage, finish_reason = [], {}, None, "stop"
+    for chunk in chunks:
+        usage = chunk.get("usage") or usage
+        for choice in chunk.get("choices") or []:
+            finish_reason = choice.get("finish_reason") or finish_reason
+            delta = choice.get("delta") or {}
+            content.append(delta.get("content") or "")
+            for call in delta.get("tool_calls") or []:
+                entry = calls.setdefault(
+                    call["index"],
+                    {
+                        "id": None,
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""},
+                    },
+                )
+                entry["id"] = call.get("id") or entry["id"]
+                function = call.get("function") or {}
+                entry["function"]["name"] += function.get("name") or ""
+                entry["function"]["arguments"] += function.get("arguments") or ""
+    first = chunks[0] if chunks else {}
+    return {
+        "id": first.get("id") or "chatcmpl-replay",
+        "created": first.get("created") or int(time.time()),
+        "model": first.get("model") or "replay",
+        "object": "chat.completion",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": finish_reason,
+                "message": {
+                    "role": "assistant",
+                    "content": "".join(content) or None,
+                    "tool_calls": [calls[index] for index in sorted(calls)] or None,
+                },
+            }
+        ],
+        "usage": usage,
+    }
+
+
+class Cassette:
+    """Recorded request/response exchanges stored as JSON lines.
+
+    Replay looks a request up by its key first; requests that changed since
+    recording (timestamps in prompts, for example) get the next unused
+    exchange in recorded order instead. A cassette opened for recording
+    replaces the file with the first exchange recorded, so stale exchanges
+    of an earlier recording are never replayed.
+    """
+
+    def __init__(self, path: Path, record: bool = False):
+        self.path = Path(path)
+        self.entries: List[dict] = []
+        self._used: set = set()
+        self._position = 0
+        self._lock = threading.Lock()
+        self._truncate = record
+        if self.path.exists() and not record:
+            with self.path.open(encoding="utf-8") as f:
+                self.entries = [json.loads(line) for line in f if line.strip()]
+
+    def append(self, entry: dict) -> None:
+        with self._lock:
+            self.entries.append(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("w" if self._truncate else "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._truncate = False
+
+    def next_for(self, key: str) -> dict:
+        with self._lock:
+            for index, entry in enumerate(self.entries):
+                if index not in self._used and entry["key"] == key:
+                    return self._take(index)
+            while self._position < len(self.entries):
+                if self._position not in self._used:
+                    logger.warning(
+                        "No recorded exchange matches the request, replaying in order"
+                    )
+                    return self._take(self._position)
+                self._position += 1
+        raise LookupError(f"Cassette {self.path} has no exchange left to replay")
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._used.clear()
+            self._position = 0
+
+    def _take(self, index: int) -> dict:
+        self._used.add(index)
+        return self.entries[index]
+
+
+class MockScript:
+    """Scripted responses served in order.
+
+    The script is a JSON list of responses such as
+    `{"content": "...", "tool_calls": [{"name": "terminate", "arguments": {...}}]}`.
+    An entry with a `match` string is only used for requests whose last
+    message contains it. The last response is repeated once the script is
+    exhausted.
+    """
+
+    def __init__(self, responses: List[dict]):
+        if not responses:
+            raise ValueError("Mock script needs at least one response")
+        self.responses = responses
+        self._used: set = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> "MockScript":
+        with Path(path).open(encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def next_for(self, params: Dict[str, Any]) -> dict:
+        messages = params.get("messages") or []
+        last = ""
+        if messages:
+            last = json.dumps(messages[-1].get("content"), ensure_ascii=False)
+        with self._lock:
+            for index, response in enumerate(self.responses):
+                if index in self._used:
+                    continue
+                if response.get("match") is None or response["match"] in last:
+                    if index < len(self.responses) - 1:
+                        self._used.add(index)
+                    return self._completion(response, index, params)
+        logger.warning("Mock script exhausted, repeating its last response")
+        return self._completion(self.responses[-1], len(self.responses) - 1, params)
+
+    def rewind(self) -> None:
+        with self._lock:
+            self._used.clear()
+
+    @staticmethod
+    def _completion(response: dict, index: int, params: Dict[str, Any]) -> dict:
+        tool_calls = [
+            {
+                "id": call.get("id") or f"call_mock_{index}_{position}",
+                "type": "function",
+                "function": {
+                    "name": call["name"],
+                    "arguments": call["arguments"]
+                    if isinstance(call.get("arguments"), str)
+                    else json.dumps(call.get("arguments") or {}),
+                },
+            }
+            for position, call in enumerate(response.get("tool_calls") or [])
+        ]
+        return {
+            "id": f"chatcmpl-mock-{index}",
+            "created": int(time.time()),
+            "model": params.get("model") or "mock",
+            "object": "chat.completion",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "tool_calls" if tool_calls else "stop",
+                    "message": {
+                        "role": "assistant",
+                        "content": response.get("content"),
+                        "tool_calls": tool_calls or None,
+                    },
+                }
+            ],
+            "usage": response.get(
+                "usage", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            ),
+        }
+
+
+class _Completions:
+    def __init__(self, transport: "TransportClient"):
+        self.transport = transport
+
+    async def create(self, **params: Any) -> Any:
+        return await self.transport.create(**params)
+
+
+class _Chat:
+    def __init__(self, transport: "TransportClient"):
+        self.completions = _Completions(transport)
+
+
+class TransportClient:
+    """Wraps an API client to record its traffic, or replaces it offline.
+
+    It exposes the `chat.completions.create` interface shared by the OpenAI
+    and Bedrock clients. Streamed requests get an async iterator of chunks;
+    Bedrock-style streams (which pass a `sink`) get text written to the sink
+    and the whole response returned.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        inner: Optional[Any] = None,
+        bedrock: bool = False,
+        cassette: Optional[Cassette] = None,
+        script: Optional[MockScript] = None,
+        latency: float = 0.0,
+        chunk_latency: float = 0.0,
+    ):
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"Unknown transport mode: {mode}")
+        self.mode = mode
+        self.inner = inner
+        self.bedrock = bedrock
+        self.cassette = cassette
+        self.script = script
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.chat = _Chat(self)
+
+    async def create(self, **params: Any) -> Any:
+        if self.mode == "record":
+            return await self._record(params)
+
+        if self.mode == "replay":
+            entry = self.cassette.next_for(request_key(params))
+            data = entry.get("response") or chunks_to_completion(entry["chunks"])
+            chunks = entry.get("chunks")
+        else:
+            data = self.script.next_for(params)
+            chunks = None
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not params.get("stream"):
+            return self._response(data)
+
+        sink = params.get("sink")
+        if sink is not None:
+            await self._write_to_sink(data, sink)
+            return self._response(data)
+        return self._replay_chunks(chunks or completion_to_chunks(data))
+
+    def _response(self, data: dict) -> Any:
+        # Bedrock responses use their own stop reasons, which ChatCompletion rejects
+        if self.bedrock:
+            return OpenAIResponse(data)
+        return ChatCompletion.model_validate(data)
+
+    async def _record(self, params: Dict[str, Any]) -> Any:
+        key = request_key(params)
+        response = await self.inner.chat.completions.create(**params)
+        if params.get("stream") and params.get("sink") is None:
+            return self._record_stream(key, params, response)
+        self.cassette.append(
+            {
+                "key": key,
+                "model": params.get("model"),
+                "response": to_jsonable(response),
+            }
+        )
+        return response
+
+    async def _record_stream(
+        self, key: str, params: Dict[str, Any], response: Any
+    ) -> AsyncIterator[Any]:
+        chunks = []
+        async for chunk in response:
+            chunks.append(to_jsonable(chunk))
+            yield chunk
+        self.cassette.append(
+            {"key": key, "model": params.get("model"), "chunks": chunks}
+        )
+
+    async def _replay_chunks(
+        self, chunks: List[dict]
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        for chunk in chunks:
+            if self.chunk_latency:
+                await asyncio.sleep(self.chunk_latency)
+            yield ChatCompletionChunk.model_validate(chunk)
+
+    async def _write_to_sink(self, data: dict, sink: Any) -> None:
+        for chunk in completion_to_chunks(data):
+            for choice in chunk["choices"]:
+                text = choice["delta"].get("content")
+                if text:
+                    if self.chunk_latency:
+                        await asyncio.sleep(self.chunk_latency)
+                    await sink.write(text)
+        await sink.end()
+
+
+_cassettes: Dict[Path, Cassette] = {}
+_scripts: Dict[Path, MockScript] = {}
+
+
+def rewind() -> None:
+    """Start every cassette and mock script over from its first response"""
+    for source in [*_cassettes.values(), *_scripts.values()]:
+        source.rewind()
+
+
+def _resolve(path: Optional[str], default: Optional[Path] = None) -> Optional[Path]:
+    if not path:
+        return default
+    path = Path(path)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+def wrap_client(
+    create: Callable[[], Any],
+    bedrock: bool = False,
+    settings: Optional[TransportSettings] = None,
+) -> Any:
+    """Build an API client through the configured transport.
+
+    `create` builds the real client; it is not called in replay and mock
+    mode, so those work without credentials or network access.
+    """
+    settings = settings or config.transport_config
+    if settings.mode == "live":
+        return create()
+
+    cassette = script = None
+    if settings.mode in ("record", "replay"):
+        path = _resolve(settings.cassette, DEFAULT_CASSETTE_PATH)
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path, record=settings.mode == "record")
+        cassette = _cassettes[path]
+    if settings.mode == "mock":
+        path = _resolve(settings.script)
+        if path is None:
+            raise ValueError("Transport mode 'mock' requires a script file")
+        if path not in _scripts:
+            _scripts[path] = MockScript.load(path)
+        script = _scripts[path]
+
+    logger.info(f"LLM transport in {settings.mode} mode")
+    return TransportClient(
+        settings.mode,
+        inner=create() if settings.mode == "record" else None,
+        bedrock=bedrock,
+        cassette=cassette,
+        script=script,
+        latency=settings.latency,
+        chunk_latency=settings.chunk_latency,
+    )
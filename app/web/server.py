@@ -1,22 +1,27 @@
-import os
+import asyncio
+import importlib
 import json
-import time
+import os
+import platform
 import sys
-import importlib
+import time
+import warnings
 from datetime import datetime
 from typing import Dict, List, Optional
 
-from fastapi import FastAPI, Request, Form, HTTPException, BackgroundTasks
+import psutil
+import uvicorn
+from fastapi import BackgroundTasks, FastAPI, Form, HTTPException, Request
 from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-import uvicorn
 from pydantic import BaseModel
-import warnings
-import platform
-import psutil
 
 from app.config import Config, LLMSettings
+from app.schema import Message
+from app.streaming import QueueSink
+
+
 # More robust imports with fallbacks
 try:
     from app.agent import get_all_agents
@@ -25,10 +30,8 @@ except ImportError:
     def get_all_agents():
         """Fallback function if import fails"""
         print("Warning: Using fallback get_all_agents function")
-        return {
-            "BaseAgent": "BaseAgent",
-            "MCPAgent": "MCPAgent"
-        }
+        return {"BaseAgent": "BaseAgent", "MCPAgent": "MCPAgent"}
+
 
 try:
     from app.tool import get_all_tools
@@ -37,14 +40,14 @@ except ImportError:
     def get_all_tools():
         """Fallback function if import fails"""
         print("Warning: Using fallback get_all_tools function")
-        return {
-            "BaseTool": "BaseTool",
-            "BrowserUseTool": "BrowserUseTool"
-        }
+        return {"BaseTool": "BaseTool", "BrowserUseTool": "BrowserUseTool"}
+
 
 try:
-    from app.llm import MULTIMODAL_MODELS
+    from app.encoders import preload
+    from app.llm import LLM, MULTIMODAL_MODELS
 except ImportError:
+    LLM = None
     MULTIMODAL_MODELS = ["gpt-4", "gpt-4o"]
 
 try:
@@ -67,10 +70,7 @@ usage_stats = {
     "total_requests": 0,
     "requests_by_model": {},
     "requests_by_day": {},
-    "token_usage": {
-        "total": 0,
-        "by_model": {}
-    }
+    "token_usage": {"total": 0, "by_model": {}},
 }
 
 # Get config
@@ -83,46 +83,100 @@ except Exception as e:
 # Agent instance (lazy loaded)
 agent_instance = None
 
+
+@app.on_event("startup")
+async def preload_tokenizers():
+    """Start loading the tokenizers of the configured models in the background"""
+    if LLM is not None and config:
+        preload()
+
+
 # Pydantic models for request/response
 class PromptRequest(BaseModel):
     prompt: str
     model: Optional[str] = None
     stream: Optional[bool] = False
 
+
 class LogEntry(BaseModel):
     timestamp: str
     level: str
     message: str
 
+
 @app.get("/", response_class=HTMLResponse)
 async def dashboard(request: Request):
     """Render the main dashboard page"""
-    return templates.TemplateResponse(
-        "dashboard.html",
-        {"request": request}
-    )
+    return templates.TemplateResponse("dashboard.html", {"request": request})
+
 
 @app.get("/api/stats")
 async def get_stats():
     """Get usage statistics"""
     return JSONResponse(content=usage_stats)
 
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Get LLM latency metrics, connection pool, cache and coalescing statistics"""
+    try:
+        from app.cache import get_response_cache
+        from app.http_pool import pool_stats
+        from app.metrics import metrics
+        from app.router import LLMRouter
+
+        cache = get_response_cache()
+        return JSONResponse(
+            content={
+                **metrics.snapshot(),
+                "http_pools": pool_stats(),
+                "response_cache": cache.stats() if cache else None,
+                "routers": {
+                    name: instance.stats()
+                    for name, instance in LLM._instances.items()
+                    if isinstance(instance, LLMRouter)
+                },
+                "single_flight": {
+                    name: instance.single_flight.stats()
+                    for name, instance in LLM._instances.items()
+                    if getattr(instance, "single_flight", None) is not None
+                },
+                "completion_budgets": {
+                    name: instance.completion_budget.stats()
+                    for name, instance in LLM._instances.items()
+                    if getattr(instance, "completion_budget", None) is not None
+                },
+            }
+        )
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
 @app.get("/api/config")
 async def get_config():
     """Get current configuration"""
     if not config:
-        return JSONResponse(content={"error": "Configuration not available"}, status_code=500)
+        return JSONResponse(
+            content={"error": "Configuration not available"}, status_code=500
+        )
 
     try:
-        llm_config = {name: model_config.model_dump() for name, model_config in config.llm.items()}
-        return JSONResponse(content={
-            "llm": llm_config,
-            "sandbox": config.sandbox.model_dump() if config.sandbox else None,
-            "browser_config": config.browser_config.model_dump() if config.browser_config else None,
-        })
+        llm_config = {
+            name: model_config.model_dump() for name, model_config in config.llm.items()
+        }
+        return JSONResponse(
+            content={
+                "llm": llm_config,
+                "sandbox": config.sandbox.model_dump() if config.sandbox else None,
+                "browser_config": config.browser_config.model_dump()
+                if config.browser_config
+                else None,
+            }
+        )
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+
 @app.post("/api/config/llm/{profile}")
 async def update_llm_config(
     profile: str,
@@ -132,7 +186,7 @@ async def update_llm_config(
     max_tokens: int = Form(4096),
     temperature: float = Form(0.0),
     api_type: str = Form(...),
-    api_version: str = Form(...)
+    api_version: str = Form(...),
 ):
     """Update LLM configuration for a specific profile"""
     # Create or update the LLM profile
@@ -144,15 +198,18 @@ async def update_llm_config(
             max_tokens=max_tokens,
             temperature=temperature,
             api_type=api_type,
-            api_version=api_version
+            api_version=api_version,
         )
 
         # In a real implementation, we would update the config file here
         # This is a simplified version that just returns success
-        return JSONResponse(content={"status": "success", "message": f"Updated {profile} settings"})
+        return JSONResponse(
+            content={"status": "success", "message": f"Updated {profile} settings"}
+        )
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+
 @app.get("/api/agents")
 async def get_agents():
     """Get list of available agents"""
@@ -162,6 +219,7 @@ async def get_agents():
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+
 @app.get("/api/tools")
 async def get_tools():
     """Get list of available tools"""
@@ -171,6 +229,7 @@ async def get_tools():
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+
 @app.post("/api/prompt")
 async def process_prompt(prompt_request: PromptRequest):
     """Process a prompt and return the response"""
@@ -183,19 +242,34 @@ async def process_prompt(prompt_request: PromptRequest):
                 agent_instance = MCPAgent()
             except Exception as e:
                 error_message = str(e)
-                if "API key" in error_message.lower() or "authentication" in error_message.lower():
+                if (
+                    "API key" in error_message.lower()
+                    or "authentication" in error_message.lower()
+                ):
                     return JSONResponse(
                         status_code=401,
-                        content={"error": "API key issue", "message": f"Missing or invalid API key. Please check your config.toml file.", "details": str(e)}
+                        content={
+                            "error": "API key issue",
+                            "message": f"Missing or invalid API key. Please check your config.toml file.",
+                            "details": str(e),
+                        },
                     )
                 elif "model" in error_message.lower():
                     return JSONResponse(
                         status_code=400,
-                        content={"error": "Model configuration issue", "message": "The specified model is invalid or unavailable.", "details": str(e)}
+                        content={
+                            "error": "Model configuration issue",
+                            "message": "The specified model is invalid or unavailable.",
+                            "details": str(e),
+                        },
                     )
                 return JSONResponse(
                     status_code=500,
-                    content={"error": "Agent initialization failed", "message": f"Failed to initialize agent. Check your configuration.", "details": str(e)}
+                    content={
+                        "error": "Agent initialization failed",
+                        "message": f"Failed to initialize agent. Check your configuration.",
+                        "details": str(e),
+                    },
                 )
 
         # Get today's date for stats
@@ -204,7 +278,7 @@ async def process_prompt(prompt_request: PromptRequest):
         # Update usage statistics
         usage_stats["total_requests"] += 1
 
-        model = prompt_request.model or getattr(agent_instance.llm, 'model', 'unknown')
+        model = prompt_request.model or getattr(agent_instance.llm, "model", "unknown")
 
         if model not in usage_stats["requests_by_model"]:
             usage_stats["requests_by_model"][model] = 0
@@ -219,35 +293,67 @@ async def process_prompt(prompt_request: PromptRequest):
             response = await agent_instance.run(prompt_request.prompt)
         except Exception as e:
             error_message = str(e)
-            if "quota" in error_message.lower() or "rate limit" in error_message.lower() or "exceeded" in error_message.lower():
+            if (
+                "quota" in error_message.lower()
+                or "rate limit" in error_message.lower()
+                or "exceeded" in error_message.lower()
+            ):
                 return JSONResponse(
                     status_code=429,
-                    content={"error": "Rate limit exceeded", "message": "API rate limit or quota exceeded. Please try again later.", "details": error_message}
+                    content={
+                        "error": "Rate limit exceeded",
+                        "message": "API rate limit or quota exceeded. Please try again later.",
+                        "details": error_message,
+                    },
                 )
             elif "key" in error_message.lower() or "auth" in error_message.lower():
                 return JSONResponse(
                     status_code=401,
-                    content={"error": "Authentication error", "message": "Invalid or expired API key. Please check your API key.", "details": error_message}
+                    content={
+                        "error": "Authentication error",
+                        "message": "Invalid or expired API key. Please check your API key.",
+                        "details": error_message,
+                    },
                 )
-            elif "model" in error_message.lower() and "not found" in error_message.lower():
+            elif (
+                "model" in error_message.lower()
+                and "not found" in error_message.lower()
+            ):
                 return JSONResponse(
                     status_code=404,
-                    content={"error": "Model not found", "message": "The specified model does not exist or is not available.", "details": error_message}
+                    content={
+                        "error": "Model not found",
+                        "message": "The specified model does not exist or is not available.",
+                        "details": error_message,
+                    },
                 )
-            elif "timeout" in error_message.lower() or "timed out" in error_message.lower():
+            elif (
+                "timeout" in error_message.lower()
+                or "timed out" in error_message.lower()
+            ):
                 return JSONResponse(
                     status_code=504,
-                    content={"error": "Request timeout", "message": "Request to LLM provider timed out. Please try again.", "details": error_message}
+                    content={
+                        "error": "Request timeout",
+                        "message": "Request to LLM provider timed out. Please try again.",
+                        "details": error_message,
+                    },
                 )
             return JSONResponse(
                 status_code=500,
-                content={"error": "Prompt processing error", "message": f"Error processing prompt: {error_message}", "details": error_message}
+                content={
+                    "error": "Prompt processing error",
+                    "message": f"Error processing prompt: {error_message}",
+                    "details": error_message,
+                },
             )
 
         # Estimate token usage (in a real implementation, you'd get this from the API response)
         estimated_prompt_tokens = len(prompt_request.prompt.split()) * 1.3
         estimated_response_tokens = len(response.split()) * 1.3
-        estimated_total_tokens = int(estimated_prompt_tokens + estimated_response_tokens)
+        estimated_total_tokens = int(
+            estimated_prompt_tokens + estimated_response_tokens
+        )
 
         # Update token usage stats
         usage_stats["token_usage"]["total"] += estimated_total_tokens
@@ -255,19 +361,57 @@ async def process_prompt(prompt_request: PromptRequest):
             usage_stats["token_usage"]["by_model"][model] = 0
         usage_stats["token_usage"]["by_model"][model] += estimated_total_tokens
 
-        return JSONResponse(content={
-            "response": response,
-            "usage": {
-                "prompt_tokens": int(estimated_prompt_tokens),
-                "completion_tokens": int(estimated_response_tokens),
-                "total_tokens": estimated_total_tokens
+        return JSONResponse(
+            content={
+                "response": response,
+                "usage": {
+                    "prompt_tokens": int(estimated_prompt_tokens),
+                    "completion_tokens": int(estimated_response_tokens),
+                    "total_tokens": estimated_total_tokens,
+                },
             }
-        })
+        )
     except Exception as e:
         return JSONResponse(
-            status_code=500,
-            content={"error": f"Unexpected error: {str(e)}"}
+            status_code=500, content={"error": f"Unexpected error: {str(e)}"}
+        )
+
+
+@app.post("/api/prompt/stream")
+async def stream_prompt(prompt_request: PromptRequest):
+    """Stream a plain LLM completion for a prompt as it is generated"""
+    if LLM is None:
+        return JSONResponse(
+            status_code=503,
+            content={"error": "LLM client unavailable, check the installed packages"},
         )
+    llm = LLM()
+    sink = QueueSink()
+
+    async def generate():
+        try:
+            await llm.ask(
+                [Message.user_message(prompt_request.prompt)], stream=True, sink=sink
+            )
+        except Exception as e:
+            # Once the sink has ended the response is closed and nobody reads
+            # the queue any more
+            if not sink.ended:
+                await sink.write(f"\n[error] {e}")
+                await sink.end()
+
+    task = asyncio.create_task(generate())
+
+    async def body():
+        try:
+            async for chunk in sink:
+                yield chunk
+        finally:
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(body(), media_type="text/plain")
+
 
 @app.get("/api/models")
 async def get_models():
@@ -281,6 +425,7 @@ async def get_models():
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+
 @app.post("/api/logs")
 async def add_log(log: LogEntry):
     """Add a log entry (for frontend to report errors)"""
@@ -288,6 +433,7 @@ async def add_log(log: LogEntry):
     print(f"[{log.timestamp}] {log.level}: {log.message}")
     return JSONResponse(content={"status": "success"})
 
+
 @app.get("/api/system")
 async def get_system_metrics():
     """Get system metrics for the dashboard"""
@@ -302,7 +448,7 @@ async def get_system_metrics():
         memory_percent = memory.percent
 
         # Get disk stats
-        disk = psutil.disk_usage('/')
+        disk = psutil.disk_usage("/")
         disk_used = disk.used
         disk_total = disk.total
         disk_percent = disk.percent
@@ -335,14 +481,15 @@ async def get_system_metrics():
             "platform_version": platform.version(),
             "python_version": platform.python_version(),
             "hostname": platform.node(),
-            "uptime": int(datetime.now().timestamp() - psutil.boot_time())
+            "uptime": int(datetime.now().timestamp() - psutil.boot_time()),
         }
     except Exception as e:
         return JSONResponse(
             status_code=500,
-            content={"error": "Failed to retrieve system metrics", "message": str(e)}
+            content={"error": "Failed to retrieve system metrics", "message": str(e)},
         )
 
+
 # Print diagnostic info on startup
 print(f"Python version: {sys.version}")
 print(f"Module search paths: {sys.path}")
@@ -0,0 +1,102 @@
+"""
+End-to-end agent overhead without a live model.
+
+Runs an agent against the mock or replay transport, so every second
+measured is spent in the agent, its tools and the LLM wrapper rather than
+waiting on the provider. In mock mode the model "views" the workspace for
+a number of steps and then terminates; in replay mode a cassette recorded
+with `[transport] mode = "record"` is served back with optional synthetic
+latency, which profiles Manus, PlanningFlow or MCPAgent runs as recorded.
+
+Usage:
+    python -m benchmarks.agent_overhead [--steps 10] [--runs 3]
+    python -m benchmarks.agent_overhead --agent flow --cassette run.jsonl --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.config import TransportSettings, config
+from app.transport import rewind
+
+
+def write_script(steps: int, directory: Path) -> Path:
+    view = {
+        "content": "Looking at the workspace.",
+        "tool_calls": [
+            {
+                "name": "str_replace_editor",
+                "arguments": {"command": "view", "path": str(config.workspace_root)},
+            }
+        ],
+    }
+    finish = {"tool_calls": [{"name": "terminate", "arguments": {"status": "success"}}]}
+    path = directory / "script.json"
+    path.write_text(json.dumps([view] * (steps - 1) + [finish]))
+    return path
+
+
+async def run_once(agent_type: str, prompt: str) -> float:
+    from app.agent.manus import Manus
+
+    start = time.perf_counter()
+    if agent_type == "manus":
+        await Manus().run(prompt)
+    elif agent_type == "flow":
+        from app.flow.base import FlowType
+        from app.flow.flow_factory import FlowFactory
+
+        flow = FlowFactory.create_flow(FlowType.PLANNING, {"manus": Manus()})
+        await flow.execute(prompt)
+    else:
+        from app.agent.mcp import MCPAgent
+
+        agent = MCPAgent()
+        await agent.initialize()
+        try:
+            await agent.run(prompt)
+        finally:
+            await agent.cleanup()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--agent", choices=("manus", "flow", "mcp"), default="manus")
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--cassette", help="Replay this cassette instead of mocking")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--prompt", default="Look around the workspace.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.cassette:
+            settings = TransportSettings(
+                mode="replay", cassette=args.cassette, latency=args.latency
+            )
+        else:
+            settings = TransportSettings(
+                mode="mock",
+                script=str(write_script(args.steps, Path(directory))),
+                latency=args.latency,
+            )
+        # Must be set before the first LLM client is created
+        config._config.transport_config = settings
+
+        timings = []
+        for _ in range(args.runs):
+            rewind()
+            timings.append(asyncio.run(run_once(args.agent, args.prompt)))
+
+    mode = "replay" if args.cassette else f"mock, {args.steps} steps"
+    print(f"{args.agent} ({mode}, {args.latency:.2f}s synthetic latency)")
+    print(f"median {statistics.median(timings):.3f}s, min {min(timings):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Event loop responsiveness under concurrent Bedrock requests.
+
+Runs concurrent converse and converse_stream calls against a stub
+bedrock-runtime client whose calls block like boto3 does, while a
+heartbeat coroutine measures how late the event loop wakes it up. The
+inline variant calls the stub directly from the coroutine, as the Bedrock
+backend used to; the threaded variant goes through ChatCompletions.
+
+Usage:
+    python -m benchmarks.bedrock_concurrency [--requests 8] [--latency 0.5]
+"""
+import argparse
+import asyncio
+import time
+
+from app.bedrock import ChatCompletions
+from app.streaming import NullSink
+
+
+class StubRuntime:
+    """Blocking stand-in for the boto3 bedrock-runtime client"""
+
+    def __init__(self, latency: float, events: int):
+        self.latency = latency
+        self.events = events
+
+    def converse(self, **request):
+        time.sleep(self.latency)
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": "ok"}]}},
+            "stopReason": "end_turn",
+            "usage": {"inputTokens": 10, "outputTokens": 1, "totalTokens": 11},
+        }
+
+    def converse_stream(self, **request):
+        time.sleep(self.latency / 2)
+
+        def events():
+            yield {"messageStart": {"role": "assistant"}}
+            for _ in range(self.events):
+                time.sleep(self.latency / 2 / self.events)
+                yield {"contentBlockDelta": {"delta": {"text": "ok "}}}
+            yield {"contentBlockStop": {"contentBlockIndex": 0}}
+
+        return {"stream": events()}
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the worst delay between expected and actual wake-ups"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def inline_request(stub: StubRuntime, stream: bool) -> None:
+    # What the backend used to do: blocking calls inside a coroutine
+    if stream:
+        for _ in stub.converse_stream()["stream"]:
+            pass
+    else:
+        stub.converse()
+
+
+async def threaded_request(completions: ChatCompletions, stream: bool) -> None:
+    await completions.create(
+        model="stub",
+        messages=[{"role": "user", "content": "hi"}],
+        max_tokens=16,
+        temperature=0,
+        stream=stream,
+        sink=NullSink(),
+    )
+
+
+async def run(requests: int, stub: StubRuntime, threaded: bool) -> tuple:
+    completions = ChatCompletions(stub)
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(stop))
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            threaded_request(completions, index % 2 == 0)
+            if threaded
+            else inline_request(stub, index % 2 == 0)
+            for index in range(requests)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await monitor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--events", type=int, default=20)
+    args = parser.parse_args()
+
+    stub = StubRuntime(args.latency, args.events)
+    print(f"{'variant':<10} {'wall s':>8} {'max loop lag ms':>16}")
+    for name, threaded in (("inline", False), ("threaded", True)):
+        elapsed, lag = asyncio.run(run(args.requests, stub, threaded))
+        print(f"{name:<10} {elapsed:>8.2f} {lag * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Cost of formatting a conversation history for every request.
+
+Builds a history of user, assistant and tool messages where every few
+steps carry a screenshot, then times `LLM.format_messages` over the whole
+history repeatedly, as the agent loop does once per step. The first pass
+builds each message's API format; later passes reuse the cached dicts
+instead of rebuilding them and re-embedding the images as data URLs.
+
+Usage:
+    python -m benchmarks.format_messages [--messages 100] [--image-kb 512]
+"""
+import argparse
+import base64
+import os
+import time
+
+from app.llm import LLM
+from app.schema import Message
+
+
+def build_history(count: int, image_kb: int) -> list:
+    image = base64.b64encode(os.urandom(image_kb * 1024 * 3 // 4)).decode()
+    history = [Message.system_message("You are an agent.")]
+    for index in range(count - 1):
+        if index % 3 == 0:
+            history.append(Message.user_message(f"Step {index}"))
+        elif index % 3 == 1:
+            history.append(Message.assistant_message(f"Thinking about step {index}"))
+        else:
+            history.append(
+                Message.tool_message(
+                    f"Observed output of step {index}",
+                    name="browser_use",
+                    tool_call_id=f"call_{index}",
+                    base64_image=image if index % 9 == 2 else None,
+                )
+            )
+    return history
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--image-kb", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    history = build_history(args.messages, args.image_kb)
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        LLM.format_messages(history, supports_images=True)
+        timings.append(time.perf_counter() - start)
+
+    print(f"first pass   {timings[0] * 1000:8.3f} ms")
+    later = timings[1:] or timings
+    print(f"cached pass  {sum(later) / len(later) * 1000:8.3f} ms (mean)")
+
+
+if __name__ == "__main__":
+    main()
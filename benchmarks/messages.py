@@ -0,0 +1,154 @@
+"""
+Cost of creating and serializing the message types of the agent loop.
+
+Builds a history of user messages, assistant tool calls and tool results
+and measures construction, `to_dict` and the memory held per history,
+both for the slotted `Message`/`ToolCall` classes and for pydantic models
+equivalent to the ones they replaced. Memory is measured with tracemalloc
+and excludes the strings shared by both histories.
+
+Usage:
+    python -m benchmarks.messages [--messages 10000] [--repeat 5]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, List, Optional
+
+from pydantic import BaseModel
+
+from app.schema import Function, Message, ToolCall
+
+
+class PydanticFunction(BaseModel):
+    name: str
+    arguments: str
+
+
+class PydanticToolCall(BaseModel):
+    id: str
+    type: str = "function"
+    function: PydanticFunction
+
+
+class PydanticMessage(BaseModel):
+    role: str
+    content: Optional[str] = None
+    tool_calls: Optional[List[PydanticToolCall]] = None
+    name: Optional[str] = None
+    tool_call_id: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        message = {"role": self.role}
+        if self.content is not None:
+            message["content"] = self.content
+        if self.tool_calls is not None:
+            message["tool_calls"] = [call.model_dump() for call in self.tool_calls]
+        if self.name is not None:
+            message["name"] = self.name
+        if self.tool_call_id is not None:
+            message["tool_call_id"] = self.tool_call_id
+        return message
+
+
+def build_slotted(texts: List[str], calls: List[ToolCall]) -> list:
+    history = []
+    for index, text in enumerate(texts):
+        if index % 3 == 0:
+            history.append(Message.user_message(text))
+        elif index % 3 == 1:
+            history.append(Message.from_tool_calls(calls[index], content=text))
+        else:
+            history.append(
+                Message.tool_message(
+                    text, name="browser_use", tool_call_id=calls[index - 1][0].id
+                )
+            )
+    return history
+
+
+def build_pydantic(texts: List[str], calls: List[ToolCall]) -> list:
+    history = []
+    for index, text in enumerate(texts):
+        if index % 3 == 0:
+            history.append(PydanticMessage(role="user", content=text))
+        elif index % 3 == 1:
+            # What Message.from_tool_calls used to do: dump and re-validate
+            formatted = [
+                {"id": call.id, "function": call.function.to_dict(), "type": "function"}
+                for call in calls[index]
+            ]
+            history.append(
+                PydanticMessage(role="assistant", content=text, tool_calls=formatted)
+            )
+        else:
+            history.append(
+                PydanticMessage(
+                    role="tool",
+                    content=text,
+                    name="browser_use",
+                    tool_call_id=calls[index - 1][0].id,
+                )
+            )
+    return history
+
+
+def best_of(repeat: int, action: Callable[[], object]) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        action()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def footprint(build: Callable[[], list]) -> int:
+    tracemalloc.start()
+    history = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del history
+    return size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = [f"Observed output of step {index}" for index in range(args.messages)]
+    calls = [
+        [
+            ToolCall(
+                id=f"call_{index}",
+                function=Function(
+                    name="browser_use",
+                    arguments=f'{{"action": "scroll_down", "step": {index}}}',
+                ),
+            )
+        ]
+        for index in range(args.messages)
+    ]
+
+    variants = {
+        "slotted": lambda: build_slotted(texts, calls),
+        "pydantic": lambda: build_pydantic(texts, calls),
+    }
+    print(f"{args.messages} messages, best of {args.repeat}")
+    print(f"{'':>9} {'build ms':>10} {'to_dict ms':>11} {'memory KiB':>11}")
+    for name, build in variants.items():
+        history = build()
+        build_time = best_of(args.repeat, build)
+        dict_time = best_of(
+            args.repeat, lambda: [message.to_dict() for message in history]
+        )
+        memory = footprint(build)
+        print(
+            f"{name:>9} {build_time * 1000:>10.1f} {dict_time * 1000:>11.1f} "
+            f"{memory / 1024:>11.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cold start time of the entry point scripts.
+
+Each script is imported in a fresh interpreter, then the agent it runs is
+constructed, and both phases are timed. Tokenizers load on a background
+thread, so construction no longer waits for the BPE files; the first
+token count does, which is timed separately.
+
+Usage:
+    python -m benchmarks.startup [--runs 3] [--scripts main run_flow]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Entry script -> code that builds what the script runs
+SCRIPTS = {
+    "main": "from app.agent.manus import Manus; agent = Manus()",
+    "run_flow": "from app.agent.manus import Manus; agent = Manus()",
+    "run_mcp": "from app.agent.mcp import MCPAgent; agent = MCPAgent()",
+    "run_web": "from app.web.server import app as agent",
+}
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import {script}
+imported = time.perf_counter()
+{construct}
+constructed = time.perf_counter()
+from app.llm import LLM
+LLM().count_tokens("warm up")
+counted = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "construct": constructed - imported,
+    "first_count": counted - constructed,
+}}))
+"""
+
+
+def measure(script: str) -> dict:
+    code = PROBE.format(script=script, construct=SCRIPTS[script])
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{script} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--scripts", nargs="+", default=list(SCRIPTS), choices=SCRIPTS)
+    args = parser.parse_args()
+
+    print(
+        f"{'script':<10} {'import ms':>10} {'construct ms':>13} {'first count ms':>15}"
+    )
+    for script in args.scripts:
+        try:
+            runs = [measure(script) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{script:<10} error: {e}")
+            continue
+        median = {
+            phase: statistics.median(run[phase] for run in runs) * 1000
+            for phase in runs[0]
+        }
+        print(
+            f"{script:<10} {median['import']:>10.1f} {median['construct']:>13.1f} "
+            f"{median['first_count']:>15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Per-step token counting cost as the conversation history grows.
+
+Simulates an agent loop that appends an assistant tool call and a tool
+observation every step, then counts the whole formatted history the way
+`LLM.ask_tool` does. With the per-message cache only the new messages are
+tokenized, so the per-step cost stays flat; without it the cost grows
+linearly with the history.
+
+Usage:
+    python -m benchmarks.token_counting [--steps 30] [--observation-chars 4000]
+"""
+import argparse
+import time
+
+import tiktoken
+
+from app.llm import TokenCounter
+from app.schema import Function, Memory, Message, ToolCall
+
+
+def build_step(step: int, observation_chars: int) -> list:
+    call = ToolCall(
+        id=f"call_{step}",
+        function=Function(
+            name="browser_use",
+            arguments=f'{{"action": "go_to_url", "url": "https://example.com/{step}"}}',
+        ),
+    )
+    observation = (f"step {step} observed output " * observation_chars)[
+        :observation_chars
+    ]
+    return [
+        Message.user_message(f"Decide the next action for step {step}"),
+        Message.from_tool_calls(tool_calls=[call], content=f"Calling step {step}"),
+        Message.tool_message(observation, name="browser_use", tool_call_id=call.id),
+    ]
+
+
+def run(counter: TokenCounter, steps: int, observation_chars: int) -> list:
+    history = [Message.system_message("You are an agent.").to_dict()]
+    timings = []
+    for step in range(steps):
+        history.extend(msg.to_dict() for msg in build_step(step, observation_chars))
+        start = time.perf_counter()
+        counter.count_message_tokens(history)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_memory(counter: TokenCounter, steps: int, observation_chars: int) -> list:
+    memory = Memory(max_messages=10_000)
+    memory.bind_token_counter(lambda msg: counter.count_message(msg.to_dict()))
+    timings = []
+    for step in range(steps):
+        start = time.perf_counter()
+        for message in build_step(step, observation_chars):
+            memory.add_message(message)
+        _ = memory.token_count
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--observation-chars", type=int, default=4000)
+    args = parser.parse_args()
+
+    encoding = tiktoken.get_encoding("cl100k_base")
+    uncached = run(
+        TokenCounter(encoding, cache_size=0), args.steps, args.observation_chars
+    )
+    cached = run(TokenCounter(encoding), args.steps, args.observation_chars)
+    running = run_memory(TokenCounter(encoding), args.steps, args.observation_chars)
+
+    print(f"{'step':>4} {'uncached ms':>12} {'cached ms':>10} {'memory ms':>10}")
+    for step, (u, c, m) in enumerate(zip(uncached, cached, running), start=1):
+        print(f"{step:>4} {u * 1000:>12.3f} {c * 1000:>10.3f} {m * 1000:>10.3f}")
+    print(
+        f"total {sum(uncached) * 1000:>11.1f} {sum(cached) * 1000:>10.1f} "
+        f"{sum(running) * 1000:>10.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,35 @@
+import argparse
 import asyncio
 
 from app.agent.manus import Manus
+from app.encoders import preload
 from app.logger import logger
+from app.session import open_session
 
 
-async def main():
-    agent = Manus()
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run the Manus agent")
+    parser.add_argument(
+        "--session",
+        help="Journal the run under this id, resuming it if it was interrupted",
+    )
+    return parser.parse_args()
+
+
+async def main(session_id=None):
+    # Tokenizers load in the background while the prompt is typed
+    preload()
+    agent = Manus(session=open_session(session_id))
     try:
-        prompt = input("Enter your prompt: ")
-        if not prompt.strip():
-            logger.warning("Empty prompt provided.")
-            return
+        if agent.restore_session():
+            # The prompt of the interrupted run is already in memory
+            prompt = None
+        else:
+            prompt = input("Enter your prompt: ")
+            if not prompt.strip():
+                logger.warning("Empty prompt provided.")
+                return
 
         logger.warning("Processing your request...")
         await agent.run(prompt)
@@ -20,4 +39,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(parse_args().session))
@@ -1,28 +1,49 @@
+import argparse
 import asyncio
 import time
 
 from app.agent.manus import Manus
+from app.encoders import preload
 from app.flow.base import FlowType
 from app.flow.flow_factory import FlowFactory
 from app.logger import logger
+from app.session import open_session
 
 
-async def run_flow():
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Run the planning flow")
+    parser.add_argument(
+        "--session",
+        help="Journal the flow under this id, resuming it if it was interrupted",
+    )
+    return parser.parse_args()
+
+
+async def run_flow(session_id=None):
+    # Tokenizers load in the background while the prompt is typed
+    preload()
     agents = {
         "manus": Manus(),
     }
 
     try:
-        prompt = input("Enter your prompt: ")
-
-        if prompt.strip().isspace() or not prompt:
-            logger.warning("Empty prompt provided.")
-            return
-
         flow = FlowFactory.create_flow(
             flow_type=FlowType.PLANNING,
             agents=agents,
+            session=open_session(session_id),
         )
+
+        if flow.restore_session():
+            # The interrupted flow continues with its plan
+            prompt = ""
+        else:
+            prompt = input("Enter your prompt: ")
+
+            if prompt.strip().isspace() or not prompt:
+                logger.warning("Empty prompt provided.")
+                return
+
         logger.warning("Processing your request...")
 
         try:
@@ -47,4 +68,4 @@ async def run_flow():
 
 
 if __name__ == "__main__":
-    asyncio.run(run_flow())
+    asyncio.run(run_flow(parse_args().session))
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from app.llm import LLM
+
+
+def make_llm() -> LLM:
+    """Build an LLM without a client or tokenizer, enough for batching"""
+    llm = object.__new__(LLM)
+    llm.total_input_tokens = 0
+    llm.total_completion_tokens = 0
+    return llm
+
+
+@pytest.mark.asyncio
+async def test_batch_preserves_order_caps_concurrency_and_returns_errors():
+    """Tests ordering, the in-flight cap and per-item failures."""
+    llm = make_llm()
+    in_flight = 0
+    peak = 0
+
+    async def call(index: int):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        # Later items finish first
+        await asyncio.sleep(0.001 * (10 - index))
+        in_flight -= 1
+        if index == 3:
+            raise ValueError("bad prompt")
+        llm.total_input_tokens += 10
+        return index
+
+    calls = [lambda index=index: call(index) for index in range(10)]
+    results = await llm._run_batch("test_batch", calls, max_concurrency=3)
+
+    assert results[:3] == [0, 1, 2]
+    assert isinstance(results[3], ValueError)
+    assert results[4:] == list(range(4, 10))
+    assert peak == 3
+    assert llm.total_input_tokens == 90
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_invalid_concurrency():
+    with pytest.raises(ValueError):
+        await make_llm()._run_batch("test_batch", [], max_concurrency=0)
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from app.bedrock import ChatCompletions, iterate_in_thread
+from app.streaming import CallbackSink
+
+
+class BlockingRuntime:
+    """Stub bedrock-runtime client whose calls block like boto3"""
+
+    def __init__(self):
+        self.requests = []
+
+    def converse_stream(self, **request):
+        self.requests.append(request)
+        time.sleep(0.05)
+
+        def events():
+            yield {"messageStart": {"role": "assistant"}}
+            for text in ("Hello", " world"):
+                time.sleep(0.05)
+                yield {"contentBlockDelta": {"delta": {"text": text}}}
+            yield {"contentBlockStop": {"contentBlockIndex": 0}}
+
+        return {"stream": events()}
+
+
+@pytest.mark.asyncio
+async def test_stream_runs_off_the_event_loop():
+    """Tests that a Bedrock stream does not block other coroutines."""
+    runtime = BlockingRuntime()
+    chunks = []
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    response = await ChatCompletions(runtime).create(
+        model="model",
+        messages=[{"role": "user", "content": "hi"}],
+        max_tokens=10,
+        temperature=0,
+        stream=True,
+        sink=CallbackSink(chunks.append),
+    )
+    task.cancel()
+
+    assert response.choices[0].message.content == "Hello world"
+    assert chunks == ["Hello", " world"]
+    assert ticks >= 5
+    # No toolConfig is sent without tools
+    assert "toolConfig" not in runtime.requests[0]
+
+
+@pytest.mark.asyncio
+async def test_iterate_in_thread_propagates_errors():
+    def failing():
+        yield 1
+        raise RuntimeError("stream broke")
+
+    items = []
+    with pytest.raises(RuntimeError, match="stream broke"):
+        async for item in iterate_in_thread(failing()):
+            items.append(item)
+    assert items == [1]
@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import pytest
+
+import app.blobs
+from app.blobs import BlobStore
+from app.llm import LLM
+from app.schema import OMITTED_OLDER_IMAGE_TEXT, Memory, Message, materialize_images
+from app.session import SessionStore
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch) -> BlobStore:
+    store = BlobStore(path=tmp_path / "blobs")
+    monkeypatch.setattr(app.blobs, "_blob_store", store)
+    return store
+
+
+def test_identical_blobs_are_stored_once(store: BlobStore):
+    """Tests that storing the same content returns the same reference."""
+    ref = store.put("aW1n")
+    assert store.put("aW1n") == ref
+    assert store.put("b3RoZXI=") != ref
+    assert len(store._memory) == 2
+
+
+def test_evicted_blobs_spill_to_disk(tmp_path: Path):
+    """Tests that blobs over the memory cap are read back from disk."""
+    store = BlobStore(path=tmp_path / "blobs", max_memory_bytes=10)
+    first = store.put("a" * 8)
+    second = store.put("b" * 8)
+
+    assert list(store._memory) == [second]
+    assert store.get(first) == "a" * 8
+    assert list(store._memory) == [first]
+
+    memory_only = BlobStore(path=None, max_memory_bytes=10)
+    ref = memory_only.put("a" * 8)
+    memory_only.put("b" * 8)
+    assert memory_only.get(ref) is None
+
+
+def test_disk_tier_is_capped(tmp_path: Path):
+    """Tests that the oldest spilled blobs are deleted once the disk is full."""
+    path = tmp_path / "blobs"
+    store = BlobStore(path=path, max_memory_bytes=10, max_disk_bytes=20)
+    refs = [store.put(letter * 8) for letter in "abcd"]
+
+    assert store._spilling == {}
+    assert sorted(file.name for file in path.glob("*/*")) == sorted(refs[1:3])
+    assert store.get(refs[0]) is None
+
+    # A new store accounts for the files left by an earlier one
+    reopened = BlobStore(path=path, max_memory_bytes=10, max_disk_bytes=20)
+    reopened.put("e" * 8)
+    reopened.put("f" * 8)
+    assert not store._file(refs[1]).exists()
+    assert store._file(refs[2]).exists()
+
+
+def test_messages_hold_only_a_reference(store: BlobStore):
+    """Tests that a message's image lives in the store, not in the message."""
+    message = Message.user_message("shot", base64_image="aW1n")
+    copy = Message.user_message("again", base64_image="aW1n")
+
+    assert message.image_ref == copy.image_ref == store.put("aW1n")
+    assert message.to_dict() == {
+        "role": "user",
+        "content": "shot",
+        "image_ref": message.image_ref,
+    }
+    assert message.base64_image == "aW1n"
+    assert Message(**message.to_dict()).image_ref == message.image_ref
+
+
+def test_only_the_newest_images_are_materialized(store: BlobStore):
+    """Tests that older images are replaced by a note when formatting."""
+    messages = [
+        Message.user_message(f"shot {i}", base64_image=f"aW1n{i}AAA") for i in range(4)
+    ]
+    formatted = LLM.format_messages(messages, supports_images=True, max_images=2)
+
+    assert [message["content"][1]["type"] for message in formatted] == [
+        "text",
+        "text",
+        "image_url",
+        "image_url",
+    ]
+    assert formatted[0]["content"][1]["text"] == OMITTED_OLDER_IMAGE_TEXT
+    assert formatted[3]["content"][1]["image_url"]["url"].endswith("aW1n3AAA")
+    # The cached wire format of the messages is left untouched
+    assert messages[0].to_wire(True)["content"][1]["type"] == "image_ref"
+
+    everything = materialize_images([m.to_wire(True) for m in messages], None)
+    assert all(m["content"][1]["type"] == "image_url" for m in everything)
+
+
+def test_journaled_images_are_written_to_disk(store: BlobStore):
+    """Tests that a resumed session can load images of journaled messages."""
+    session = SessionStore("blobs", path=None)
+    memory = Memory()
+    session.restore(memory, "agent.memory", "agent.run")
+    memory.add_message(Message.user_message("shot", base64_image="aW1n"))
+    session.checkpoint("agent.run", "step")
+    store.clear()
+
+    restored = Memory()
+    session.restore(restored, "agent.memory", "agent.run")
+    assert restored.messages[0].base64_image == "aW1n"
@@ -0,0 +1,101 @@
+import pytest
+from openai.types.chat.chat_completion import ChatCompletion
+
+from app.budget import CompletionBudget
+from app.llm import LLM
+
+
+def completion(content: str, completion_tokens: int, finish_reason: str):
+    return ChatCompletion.model_validate(
+        {
+            "id": "c",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": finish_reason,
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+            "usage": {
+                "prompt_tokens": 100,
+                "completion_tokens": completion_tokens,
+                "total_tokens": 100 + completion_tokens,
+            },
+        }
+    )
+
+
+class TruncatingCompletions:
+    """Returns a completion of `needed` tokens, truncated if max_tokens is lower"""
+
+    def __init__(self, needed: int):
+        self.needed = needed
+        self.limits = []
+
+    async def create(self, **params):
+        limit = params["max_tokens"]
+        self.limits.append(limit)
+        if limit < self.needed:
+            return completion("partial", limit, "length")
+        return completion("complete", self.needed, "stop")
+
+
+def make_llm(needed: int) -> LLM:
+    """Build an LLM with a fake client and no tokenizer"""
+    llm = object.__new__(LLM)
+    llm.model = "gpt-4o"
+    llm.max_tokens = 4096
+    llm.completion_budget = CompletionBudget(llm.max_tokens)
+    llm.single_flight = None
+    llm.rate_limiter = None
+    llm.total_input_tokens = llm.total_completion_tokens = 0
+    llm.total_cached_tokens = 0
+    llm.client = type("Client", (), {})()
+    llm.client.chat = type("Chat", (), {})()
+    llm.client.chat.completions = TruncatingCompletions(needed)
+    return llm
+
+
+def test_limit_follows_observed_completions_per_purpose():
+    """Tests the percentile limit, its floor and cap, and unknown purposes."""
+    budget = CompletionBudget(4096, min_samples=5)
+    for tokens in (100, 120, 90, 110):
+        budget.observe("think", tokens)
+    assert budget.limit("think") == 4096
+
+    budget.observe("think", 400)
+    assert budget.limit("think") == 600
+    assert budget.limit("summarize") == budget.limit(None) == 4096
+
+    for _ in range(5):
+        budget.observe("tiny", 10)
+        budget.observe("huge", 4000)
+    assert budget.limit("tiny") == 256
+    assert budget.limit("huge") == 4096
+    assert budget.grow(3000) == 4096
+
+
+@pytest.mark.asyncio
+async def test_truncated_completion_is_retried_with_a_larger_limit():
+    """Tests that a completion cut short by the adapted limit is requested again."""
+    llm = make_llm(needed=200)
+    params = {"model": "gpt-4o", "messages": [], "max_tokens": 4096}
+    for _ in range(5):
+        await llm._complete_within_budget("ask", params, 100, "think")
+    assert llm.completion_budget.limit("think") == 300
+
+    llm.client.chat.completions.needed = 500
+    response, _ = await llm._complete_within_budget("ask", params, 100, "think")
+
+    assert response.choices[0].message.content == "complete"
+    assert llm.client.chat.completions.limits[-2:] == [300, 600]
+    # The truncated attempt is counted here, the final one by the caller
+    assert llm.total_completion_tokens == 300
+    assert llm.completion_budget._samples["think"][-1] == 500
+
+    # Without a purpose the profile's max_tokens is sent unchanged
+    await llm._complete_within_budget("ask", params, 100, None)
+    assert llm.client.chat.completions.limits[-1] == 4096
@@ -0,0 +1,76 @@
+from typing import List
+
+import pytest
+
+from app.context import ContextCompactor
+from app.schema import Function, Message, Role, ToolCall
+
+
+class FakeLLM:
+    """Counts one token per character and returns canned summaries"""
+
+    def __init__(self):
+        self.summaries = 0
+
+    def count_message(self, message: Message) -> int:
+        return len(message.content or "") + (1000 if message.base64_image else 0)
+
+    async def ask(self, messages, **kwargs) -> str:
+        self.summaries += 1
+        return f"summary {self.summaries}"
+
+
+def step(index: int, observation: str, image: str = None) -> List[Message]:
+    call = ToolCall(id=f"call_{index}", function=Function(name="tool", arguments="{}"))
+    return [
+        Message.from_tool_calls(tool_calls=[call], content=f"step {index}"),
+        Message.tool_message(
+            observation, name="tool", tool_call_id=call.id, base64_image=image
+        ),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cheap_stages_run_before_summarizing():
+    """Tests that stale screenshots go first, then long old observations."""
+    llm = FakeLLM()
+    compactor = ContextCompactor(keep_recent=2, elide_chars=10)
+    messages = step(0, "x" * 100, image="old") + step(1, "y" * 100, image="new")
+
+    stripped = await compactor.compact(messages, budget=1300, llm=llm)
+    assert [message.base64_image for message in stripped] == [None, None, None, "new"]
+    assert messages[1].base64_image == "old"  # memory is untouched
+
+    elided = await compactor.compact(messages, budget=1150, llm=llm)
+    assert elided[1].content.startswith("x" * 10)
+    assert "90 characters elided" in elided[1].content
+    assert elided[3].content == "y" * 100
+    assert llm.summaries == 0
+
+
+@pytest.mark.asyncio
+async def test_summary_is_incremental_and_keeps_tool_pairs():
+    """Tests that folded history is summarized once and extended later."""
+    llm = FakeLLM()
+    compactor = ContextCompactor(keep_recent=2, elide_chars=1000)
+    messages = []
+    for index in range(4):
+        messages += step(index, "z" * 50)
+
+    compacted = await compactor.compact(messages, budget=200, llm=llm)
+    assert llm.summaries == 1
+    assert compacted[0].content.endswith("summary 1")
+    # The kept part starts with an assistant message, never an orphaned tool result
+    assert compacted[1].role == Role.ASSISTANT
+
+    # The cached summary is reused while the rest still fits
+    assert await compactor.compact(messages, budget=200, llm=llm) == compacted
+    assert llm.summaries == 1
+
+    messages += step(4, "z" * 50) + step(5, "z" * 50)
+    extended = await compactor.compact(messages, budget=200, llm=llm)
+    assert llm.summaries == 2
+    assert extended[0].content.endswith("summary 2")
+    tool_ids = {m.tool_call_id for m in extended if m.role == Role.TOOL}
+    call_ids = {c.id for m in extended if m.tool_calls for c in m.tool_calls}
+    assert tool_ids <= call_ids
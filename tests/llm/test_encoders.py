@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from app import encoders
+
+
+class FakeEncoding:
+    def encode(self, text: str, **kwargs):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    encoders._encodings.clear()
+    yield
+    encoders._encodings.clear()
+
+
+def test_encodings_load_once_in_background(monkeypatch):
+    """Tests that profiles share one encoding loaded off the calling thread."""
+    release = threading.Event()
+    loads = []
+
+    def get_encoding(name):
+        loads.append((name, threading.current_thread().name))
+        release.wait(5)
+        return FakeEncoding()
+
+    monkeypatch.setattr(encoders.tiktoken, "get_encoding", get_encoding)
+
+    first = encoders.get_encoding_for_model("gpt-4o")
+    second = encoders.get_encoding_for_model("gpt-4o-mini")
+    assert first is second
+    assert not first.loaded
+
+    release.set()
+    assert first.encode("hello tokenizer world") == ["hello", "tokenizer", "world"]
+    assert len(loads) == 1
+    assert loads[0][0] == "o200k_base"
+    assert loads[0][1].startswith("tokenizer")
+
+
+def test_unknown_model_uses_default_and_failed_load_is_retried(monkeypatch):
+    """Tests the cl100k_base fallback and retrying after a failed load."""
+    attempts = []
+
+    def get_encoding(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise ConnectionError("offline")
+        return FakeEncoding()
+
+    monkeypatch.setattr(encoders.tiktoken, "get_encoding", get_encoding)
+
+    failed = encoders.get_encoding_for_model("some-local-model")
+    with pytest.raises(ConnectionError):
+        failed.encode("text")
+
+    retried = encoders.get_encoding_for_model("some-local-model")
+    assert retried is not failed
+    assert retried.encode("two words") == ["two", "words"]
+    assert attempts == ["cl100k_base", "cl100k_base"]
+
+
+def test_preload_defaults_to_configured_models(monkeypatch):
+    """Tests that entry points can start loading every profile's encoding."""
+    monkeypatch.setattr(encoders.tiktoken, "get_encoding", lambda name: FakeEncoding())
+    encoders.preload()
+    assert set(encoders._encodings) == {
+        encoders.encoding_name_for_model(settings.model)
+        for settings in encoders.config.llm.values()
+    }
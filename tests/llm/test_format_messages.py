@@ -0,0 +1,34 @@
+from app.llm import LLM
+from app.schema import Message
+
+
+def test_dict_messages_are_not_mutated():
+    """Tests that formatting an image message leaves the caller's dict intact."""
+    message = {"role": "user", "content": "look", "base64_image": "aW1n"}
+    formatted = LLM.format_messages([message], supports_images=True)[0]
+
+    assert message == {"role": "user", "content": "look", "base64_image": "aW1n"}
+    assert formatted["content"] == [
+        {"type": "text", "text": "look"},
+        {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,aW1n"}},
+    ]
+    assert "base64_image" not in LLM.format_messages([message])[0]
+
+
+def test_message_wire_format_is_cached_until_changed():
+    """Tests that Message objects reuse their formatted dict."""
+    message = Message.user_message("look", base64_image="aW1n")
+    first = message.to_wire(supports_images=True)
+    assert message.to_wire(supports_images=True) is first
+    # The cached format only references the image; requests load it
+    assert first["content"][1] == {"type": "image_ref", "image_ref": message.image_ref}
+    assert LLM.format_messages([message], supports_images=True)[0]["content"][1] == {
+        "type": "image_url",
+        "image_url": {"url": "data:image/jpeg;base64,aW1n"},
+    }
+    assert "base64_image" not in LLM.format_messages([message])[0]
+
+    message.content = "look again"
+    updated = message.to_wire(supports_images=True)
+    assert updated is not first
+    assert updated["content"][0] == {"type": "text", "text": "look again"}
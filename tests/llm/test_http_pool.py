@@ -0,0 +1,33 @@
+import pytest
+
+from app.config import HTTPSettings
+from app.http_pool import _clients, close_http_clients, get_http_client, pool_stats
+
+
+@pytest.fixture(autouse=True)
+def reset_pools():
+    yield
+    _clients.clear()
+
+
+@pytest.mark.asyncio
+async def test_profiles_with_same_endpoint_share_a_client():
+    settings = HTTPSettings(max_connections=7)
+    first = get_http_client("https://api.example.com/v1", settings)
+    second = get_http_client("https://API.example.com/v2/", settings)
+    other = get_http_client("https://other.example.com/v1", settings)
+
+    assert first is second
+    assert first is not other
+    assert set(pool_stats()) == {"https://api.example.com", "https://other.example.com"}
+    assert pool_stats()["https://api.example.com"]["max_connections"] == 7
+
+
+@pytest.mark.asyncio
+async def test_closed_client_is_replaced():
+    client = get_http_client("https://api.example.com/v1")
+    await close_http_clients()
+
+    assert not _clients
+    assert client.is_closed
+    assert get_http_client("https://api.example.com/v1") is not client
@@ -0,0 +1,118 @@
+import base64
+import io
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw
+
+from app import image as image_module
+from app.config import ImageSettings, config
+from app.image import (
+    OMITTED_IMAGE_TEXT,
+    base64_image_size,
+    dedupe_images,
+    fit_to_tile_grid,
+    image_fingerprint,
+    image_size,
+    prepare_image,
+)
+from app.llm import LLM, TokenCounter
+from app.schema import Message
+
+
+def encode(size, fmt: str = "PNG", text: str = "hello", **kwargs) -> str:
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(0, size[1], 40):
+        draw.rectangle((20, y, size[0] // 2, y + 20), fill="navy")
+    draw.text((size[0] // 3, 10), text, fill="black")
+    output = io.BytesIO()
+    image.save(output, format=fmt, **kwargs)
+    return base64.b64encode(output.getvalue()).decode()
+
+
+def test_reads_dimensions_from_headers():
+    """Tests header parsing for every supported format."""
+    for fmt in ("PNG", "JPEG", "GIF", "WEBP"):
+        data = base64.b64decode(encode((1234, 567), fmt))
+        assert image_size(data) == (1234, 567), fmt
+    assert image_size(b"not an image") is None
+
+
+def test_prepare_downscales_to_tile_grid_and_recompresses(monkeypatch):
+    """Tests that large screenshots shrink to what the model keeps, as JPEG."""
+    monkeypatch.setattr(config._config, "image_config", ImageSettings(enabled=True))
+    original = encode((1280, 2400), "JPEG", quality=100)
+    prepared = prepare_image(original)
+
+    assert base64_image_size(prepared) == fit_to_tile_grid(1280, 2400) == (768, 1440)
+    assert base64.b64decode(prepared)[:2] == b"\xff\xd8"
+    assert len(prepared) < len(original) / 2
+    # Preparing again is a no-op
+    assert prepare_image(prepared) == prepared
+    assert Message.user_message("shot", base64_image=original).base64_image == prepared
+
+
+def test_image_tokens_are_counted_from_the_image():
+    """Tests exact token counts and the MIME type of embedded images."""
+    png = encode((512, 512))
+    counter = TokenCounter(tokenizer=None)
+    message = Message.user_message("x", base64_image=png)
+    block = LLM.format_messages([message], supports_images=True)[0]["content"][1]
+
+    assert block["image_url"]["url"].startswith("data:image/png;base64,")
+    # One 512px tile plus the base cost, instead of the flat 1024 estimate
+    assert counter.count_image(block) == 170 + 85
+
+
+def screenshots(*images: str) -> list:
+    return LLM.format_messages(
+        [Message.user_message("Screenshot:", base64_image=image) for image in images],
+        supports_images=True,
+    )
+
+
+def test_dedupe_omits_repeated_screenshots_only():
+    """Tests that an image equal to the previous one is replaced by a note."""
+    first = encode((800, 600), quality=95, fmt="JPEG")
+    same = encode((800, 600), quality=60, fmt="JPEG")
+    other = encode((800, 600), fmt="JPEG", text="changed" * 20)
+    messages = screenshots(first, same, other)
+    tolerant = ImageSettings(dedupe=True, dedupe_tolerance=8)
+
+    deduped = dedupe_images(messages, tolerant)
+    assert deduped[1]["content"][1] == {"type": "text", "text": OMITTED_IMAGE_TEXT}
+    assert deduped[2]["content"][1]["type"] == "image_url"
+    # Without a tolerance only exact copies are omitted
+    deduped = dedupe_images(screenshots(first, first, same), ImageSettings(dedupe=True))
+    assert deduped[1]["content"][1]["text"] == OMITTED_IMAGE_TEXT
+    assert deduped[2]["content"][1]["type"] == "image_url"
+    # Deduplication is off unless enabled
+    assert dedupe_images(messages, ImageSettings()) is messages
+
+
+def test_dedupe_keeps_screenshots_with_small_changes():
+    """Tests that a screenshot differing only by a line of text is still sent."""
+    before = encode((1280, 800), text="Search")
+    after = encode((1280, 800), text="Search: running shoes")
+    deduped = dedupe_images(screenshots(before, after), ImageSettings(dedupe=True))
+    assert deduped[1]["content"][1]["type"] == "image_url"
+    # A tolerance hides the change, so it is only used when configured
+    tolerant = ImageSettings(dedupe=True, dedupe_tolerance=8)
+    deduped = dedupe_images(screenshots(before, after), tolerant)
+    assert deduped[1]["content"][1]["text"] == OMITTED_IMAGE_TEXT
+
+
+def test_fingerprint_cache_does_not_hold_images(monkeypatch):
+    """Tests that fingerprints are cached by digest, with a bounded size."""
+    monkeypatch.setattr(image_module, "_fingerprints", OrderedDict())
+    monkeypatch.setattr(image_module, "FINGERPRINT_CACHE_SIZE", 2)
+    shots = [encode((200, 100), text=f"page {i}") for i in range(3)]
+
+    first = image_fingerprint(shots[0])
+    assert image_fingerprint(shots[0]) is first
+    for shot in shots[1:]:
+        image_fingerprint(shot)
+
+    keys = list(image_module._fingerprints)
+    assert len(keys) == 2
+    assert all(isinstance(key, bytes) and len(key) == 16 for key in keys)
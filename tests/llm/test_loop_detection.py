@@ -0,0 +1,92 @@
+from collections import deque
+
+from app.loop_detection import LoopDetector, tool_call_signature
+from app.schema import Function, Message, ToolCall
+
+
+REPLY = (
+    "The page did not load the results I expected. I will go back to the search "
+    "page, enter the product name again and open the first result to find the "
+    "pricing table."
+)
+REWORDED = (
+    "The page did not load the results I expected. I'll go back to the search "
+    "page, type the product name again and open the first result to find the "
+    "pricing table."
+)
+UNRELATED = (
+    "The pricing table shows three plans. The basic plan costs ten dollars per "
+    "month and the pro plan costs twenty. I will now write these numbers to the "
+    "report file."
+)
+
+
+def call(arguments: str, name: str = "browser_use", content: str = "") -> Message:
+    tool_call = ToolCall(id="call", function=Function(name=name, arguments=arguments))
+    return Message.from_tool_calls([tool_call], content=content)
+
+
+def result(content: str = "ok") -> Message:
+    return Message.tool_message(content, name="browser_use", tool_call_id="call")
+
+
+def test_tool_calls_match_on_parsed_arguments():
+    """Tests that argument order and whitespace do not hide a repeated call."""
+    assert tool_call_signature(call('{"a": 1, "b": [1, 2]}')) == tool_call_signature(
+        call('{"b":[1,2],"a":1}')
+    )
+    assert tool_call_signature(call('{"a": 1}')) != tool_call_signature(
+        call('{"a": 2}')
+    )
+
+    detector = LoopDetector()
+    assert detector.observe(call('{"a": 1, "b": 2}', content="First try")) == 0
+    assert detector.observe(call('{"b": 2, "a": 1}', content="Once more")) == 1
+    assert detector.observe(call('{"a": 1}', name="other")) == 0
+
+
+def test_near_duplicate_content_is_matched():
+    """Tests that a reworded reply counts as a repeat and an unrelated one not."""
+    detector = LoopDetector(max_distance=8)
+    assert detector.observe(Message.assistant_message(REPLY)) == 0
+    assert detector.observe(Message.assistant_message(REWORDED)) == 1
+    assert detector.observe(Message.assistant_message(UNRELATED)) == 0
+    assert detector.observe(Message.assistant_message(REPLY.upper())) == 2
+    # Tool results and user messages are not steps of the agent
+    assert detector.observe(result(REPLY)) == 0
+    assert detector.observe(Message.user_message(REPLY)) == 0
+
+
+def test_update_reads_only_new_messages():
+    """Tests that updates index each message once and rebuild after a clear."""
+    detector = LoopDetector()
+    history = [Message.user_message("task"), call('{"action": "go_back"}')]
+    assert detector.update(history) == 0
+    history.append(result())
+    assert detector.update(history) == 0
+    history += [call('{"action": "go_back"}', content="Retrying"), result()]
+    assert detector.update(history) == 1
+    # Nothing new since the last update
+    assert detector.update(history) == 0
+    history += [call('{"action": "go_back"}'), result()]
+    assert detector.update(history) == 2
+
+    # A replaced history no longer contains the marker and is indexed anew
+    assert detector.update([call('{"action": "go_back"}')]) == 0
+
+
+def test_messages_evicted_from_history_are_forgotten():
+    """Tests that the index only covers the messages still in the window."""
+    detector = LoopDetector()
+    history = deque(maxlen=4)
+    history += [Message.user_message("task"), call('{"action": "go_back"}'), result()]
+    assert detector.update(history) == 0
+    history += [call('{"action": "go_back"}'), result()]
+    assert detector.update(history) == 1
+    # The first call has dropped out of the window, only the second one repeats
+    history += [call('{"action": "go_back"}'), result()]
+    assert detector.update(history) == 1
+    history += [call('{"action": "scroll"}'), result()]
+    history += [call('{"action": "go_back"}')]
+    assert detector.update(history) == 0
+    assert not detector._fingerprints and len(detector._buckets) == 2
@@ -0,0 +1,58 @@
+from app.prompt_cache import PrefixTracker
+from app.schema import Message
+
+
+class FakeCounter:
+    def count_message(self, message: dict) -> int:
+        return len(message.get("content") or "")
+
+
+class FakeLLM:
+    """Just enough of LLM for prefix tracking, one token per character"""
+
+    model = "test"
+
+    def __init__(self):
+        self.token_counter = FakeCounter()
+        self.total_input_tokens = 0
+        self.total_cached_tokens = 0
+
+
+def test_stable_prefix_and_cache_hit_rate():
+    """Tests that only the changed tail is reported as unstable."""
+    llm = FakeLLM()
+    tracker = PrefixTracker()
+    tools = [{"type": "function"}]
+    system = [Message.system_message("system")]
+    history = [Message.user_message("task"), Message.assistant_message("step one")]
+
+    first = {
+        "system_msgs": system,
+        "tools": tools,
+        "messages": history + [Message.user_message("next 1")],
+    }
+    assert tracker.observe(first, llm) == 0
+    llm.total_input_tokens += 10 + 6 + 4 + 8 + 6
+    tracker.report(llm)
+    assert tracker.stable_tokens == 0
+
+    history.append(Message.assistant_message("step two"))
+    second = {
+        "system_msgs": [Message.system_message("system")],
+        "tools": tools,
+        "messages": history + [Message.user_message("next 2")],
+    }
+    # The system prompt and the first two history messages are unchanged
+    assert tracker.observe(second, llm) == 3
+    llm.total_input_tokens += 10 + 6 + 4 + 8 + 8 + 6
+    llm.total_cached_tokens += 21
+    assert tracker.report(llm) == 0.5
+    # Tools and unchanged messages; only "step two" and "next 2" are counted
+    assert tracker.stable_tokens == 10 + 6 + 4 + 8
+    assert tracker.total_tokens == 42
+
+    changed_tools = dict(second, tools=[{"type": "function", "name": "new"}])
+    assert tracker.observe(changed_tools, llm) == 0
+    llm.total_input_tokens += 50
+    tracker.report(llm)
+    assert tracker.stable_tokens == 0
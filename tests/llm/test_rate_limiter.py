@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import rate_limiter
+from app.config import LLMSettings
+from app.llm import LLM
+from app.rate_limiter import RateLimiter, TokenBucket, retry_after_seconds
+
+
+def test_token_bucket_wait_time():
+    """Tests refill arithmetic of the token bucket."""
+    bucket = TokenBucket(rate_per_minute=60)
+    assert bucket.time_until(60) == 0
+    bucket.consume(60)
+    assert bucket.time_until(1) == pytest.approx(1, abs=0.05)
+    # Oversized requests only wait for a full bucket
+    assert bucket.time_until(1000) == pytest.approx(60, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    """Tests that no more than max_concurrency requests run at once."""
+    limiter = RateLimiter(max_concurrency=2)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter.acquire():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(request() for _ in range(6)))
+    assert peak == 2
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_requests_per_minute_spreads_requests():
+    """Tests that requests beyond the burst are queued, not rejected."""
+    limiter = RateLimiter(requests_per_minute=1200)  # 20 per second
+    limiter.requests.level = 1
+
+    start = time.monotonic()
+    for _ in range(3):
+        async with limiter.acquire():
+            pass
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_penalize_blocks_waiters():
+    """Tests that a Retry-After pause delays the next request."""
+    limiter = RateLimiter(max_concurrency=1)
+    limiter.penalize(0.05)
+    start = time.monotonic()
+    async with limiter.acquire():
+        pass
+    assert time.monotonic() - start >= 0.04
+
+
+def test_retry_after_parsing():
+    """Tests Retry-After and retry-after-ms header parsing."""
+
+    class Error(Exception):
+        def __init__(self, headers):
+            self.response = httpx.Response(429, headers=headers)
+
+    assert retry_after_seconds(Error({"retry-after": "3"})) == 3
+    assert retry_after_seconds(Error({"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(Error({})) is None
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_names_without_a_profile_share_the_default_limiter(monkeypatch):
+    """Tests that agent names falling back to the default profile share a limiter."""
+    monkeypatch.setattr(LLM, "_instances", {})
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    settings = LLMSettings(
+        model="gpt-4o",
+        base_url="https://api.example.com/v1",
+        api_key="key",
+        api_type="openai",
+        api_version="",
+        max_concurrency=1,
+    )
+    profiles = {"default": settings}
+    manus = LLM("manus", profiles)
+    browser = LLM("browser", profiles)
+    assert manus is not browser
+    assert manus.rate_limiter is not None
+    assert manus.rate_limiter is browser.rate_limiter
@@ -0,0 +1,59 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from app.cache import ResponseCache
+
+
+@pytest.fixture
+def cache_path(tmp_path: Path) -> Path:
+    return tmp_path / "responses.db"
+
+
+def test_key_is_order_insensitive():
+    """Tests that equivalent requests normalize to the same key."""
+    first = ResponseCache.make_key(
+        model="m", messages=[{"role": "user", "content": "hi"}]
+    )
+    second = ResponseCache.make_key(
+        messages=[{"content": "hi", "role": "user"}], model="m"
+    )
+    assert first == second
+    assert first != ResponseCache.make_key(model="m", messages=[])
+
+
+@pytest.mark.asyncio
+async def test_memory_and_disk_tiers(cache_path: Path):
+    """Tests hits from memory and from disk after a restart."""
+    cache = ResponseCache(path=cache_path)
+    assert await cache.get("k") is None
+    await cache.set("k", {"content": "cached"})
+    assert await cache.get("k") == {"content": "cached"}
+
+    restarted = ResponseCache(path=cache_path)
+    assert await restarted.get("k") == {"content": "cached"}
+    assert restarted.stats()["disk_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_entries_expire(cache_path: Path):
+    """Tests that entries past their TTL are treated as misses."""
+    cache = ResponseCache(path=cache_path, ttl=0.01)
+    await cache.set("k", "value")
+    time.sleep(0.02)
+    assert await cache.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_size_caps(cache_path: Path):
+    """Tests LRU eviction in both tiers."""
+    cache = ResponseCache(path=cache_path, max_memory_entries=2, max_disk_bytes=40)
+    for i in range(4):
+        await cache.set(f"k{i}", "x" * 15)
+
+    assert len(cache._memory) == 2
+    restarted = ResponseCache(path=cache_path)
+    assert await restarted.get("k0") is None
+    assert await restarted.get("k3") == "x" * 15
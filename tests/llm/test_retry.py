@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import APIConnectionError, AuthenticationError, InternalServerError
+
+from app.exceptions import DeadlineExceeded, EmptyResponseError, TokenLimitExceeded
+from app.retry import RetryPolicy, cap_timeout, deadline, is_retryable, time_remaining
+
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+
+
+def status_error(cls, status: int, headers: dict = None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return cls("error", response=response, body=None)
+
+
+class Flaky:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_classifies_transient_and_fatal_errors():
+    """Tests that only transient failures are considered retryable."""
+    assert is_retryable(APIConnectionError(request=REQUEST))
+    assert is_retryable(status_error(InternalServerError, 503))
+    assert is_retryable(EmptyResponseError("empty"))
+    assert not is_retryable(status_error(AuthenticationError, 401))
+    assert not is_retryable(TokenLimitExceeded("too long"))
+    assert not is_retryable(ValueError("bad tool_choice"))
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors_only():
+    """Tests that transient errors are retried and fatal ones raised at once."""
+    policy = RetryPolicy(max_attempts=3, base_delay=0.001)
+
+    flaky = Flaky(status_error(InternalServerError, 500), EmptyResponseError("empty"))
+    assert await policy.call(flaky) == "ok"
+    assert flaky.calls == 3
+
+    fatal = Flaky(status_error(AuthenticationError, 401))
+    with pytest.raises(AuthenticationError):
+        await policy.call(fatal)
+    assert fatal.calls == 1
+
+    exhausted = Flaky(*[APIConnectionError(request=REQUEST)] * 5)
+    with pytest.raises(APIConnectionError):
+        await policy.call(exhausted)
+    assert exhausted.calls == 3
+
+
+def test_backoff_is_jittered_and_honours_retry_after():
+    """Tests full jitter bounds and the provider's Retry-After delay."""
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    delays = [policy.backoff(4) for _ in range(50)]
+    assert all(0 <= delay <= 8.0 for delay in delays)
+    assert len(set(delays)) > 1
+    assert policy.backoff(10) <= 10.0
+
+    error = status_error(InternalServerError, 503, {"retry-after": "3"})
+    assert policy.backoff(1, error) == 3.0
+
+
+@pytest.mark.asyncio
+async def test_deadline_caps_waits_and_attempts():
+    """Tests that nested deadlines only shorten and stop retries and slow calls."""
+    with deadline(5):
+        with deadline(60):
+            assert time_remaining() <= 5
+        assert cap_timeout(300) <= 5
+    assert time_remaining() is None
+
+    policy = RetryPolicy(max_attempts=6)
+    policy.backoff = lambda attempt, error=None: 10.0
+    flaky = Flaky(APIConnectionError(request=REQUEST))
+    with deadline(0.5):
+        # A backoff that would pass the deadline is not waited out
+        with pytest.raises(DeadlineExceeded):
+            await policy.call(flaky)
+    assert flaky.calls == 1
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with deadline(0.05):
+        with pytest.raises(DeadlineExceeded):
+            await policy.call(slow)
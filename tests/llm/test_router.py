@@ -0,0 +1,105 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import BadRequestError
+
+from app.config import LLMSettings, RouterSettings
+from app.router import EndpointStats, LLMRouter, RoutedEndpoint
+
+
+class FakeCompletions:
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+
+    async def create(self, **params):
+        self.calls.append(params)
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return params["model"]
+
+
+def make_router(delays: dict, **router_config) -> LLMRouter:
+    """Build a router over fake endpoints without loading a tokenizer"""
+    router = object.__new__(LLMRouter)
+    router.router_config = RouterSettings(enabled=True, **router_config)
+    router.endpoints = []
+    for name, delay in delays.items():
+        settings = LLMSettings(
+            model=f"model-{name}",
+            base_url=f"https://{name}.example.com/v1",
+            api_key="key",
+            api_type="openai",
+            api_version="",
+        )
+        endpoint = RoutedEndpoint(name, settings)
+        endpoint.client.chat.completions = FakeCompletions(delay)
+        router.endpoints.append(endpoint)
+    return router
+
+
+def test_endpoint_stats_track_latency_and_errors():
+    """Tests rolling percentiles and error rate."""
+    stats = EndpointStats(window=4)
+    for latency in (0.1, 0.2, 0.3, 0.4, 0.5):
+        stats.record_success(latency)
+    stats.record_error()
+
+    assert list(stats.latencies) == [0.2, 0.3, 0.4, 0.5]
+    assert stats.percentile(50) == 0.4
+    assert stats.error_rate == 0.25
+    assert stats.consecutive_errors == 1
+
+
+@pytest.mark.asyncio
+async def test_routes_to_fastest_endpoint_and_fails_over():
+    """Tests that requests go to the lowest latency endpoint and skip failures."""
+    router = make_router({"slow": 0.03, "fast": 0.0}, min_samples=2)
+    for _ in range(4):
+        await router.dispatch({"model": "ignored", "messages": []})
+    assert await router.dispatch({"model": "ignored", "messages": []}) == "model-fast"
+
+    fast = router.endpoints[1]
+    fast.client.chat.completions.error = ConnectionError("down")
+    assert await router.dispatch({"model": "ignored", "messages": []}) == "model-slow"
+    assert fast.stats.consecutive_errors == 1
+
+
+@pytest.mark.asyncio
+async def test_bad_requests_are_not_failed_over():
+    """Tests that request errors skip failover and leave endpoint health alone."""
+    router = make_router({"first": 0.0, "second": 0.0})
+    first, second = router.endpoints
+    request = httpx.Request("POST", "https://first.example.com/v1/chat/completions")
+    first.client.chat.completions.error = BadRequestError(
+        "context length exceeded",
+        response=httpx.Response(400, request=request),
+        body=None,
+    )
+
+    with pytest.raises(BadRequestError):
+        await router.dispatch({"model": "ignored", "messages": []})
+    assert second.client.chat.completions.calls == []
+    assert first.stats.consecutive_errors == 0
+    assert list(first.stats.outcomes) == []
+
+
+@pytest.mark.asyncio
+async def test_hedges_slow_requests_to_backup():
+    """Tests that a request slower than the primary's p95 is hedged."""
+    router = make_router({"primary": 0.0, "backup": 0.0}, hedge=True, min_samples=2)
+    # Unmeasured endpoints are tried first, so both get enough samples
+    for _ in range(4):
+        await router.dispatch({"model": "ignored", "messages": []})
+    assert all(len(endpoint.stats.latencies) == 2 for endpoint in router.endpoints)
+
+    primary, backup = router.ranked_endpoints()
+    primary.client.chat.completions.delay = 0.5
+    backup.client.chat.completions.delay = 0.0
+
+    result = await router.dispatch({"model": "ignored", "messages": []})
+    assert result == backup.model
+    assert len(primary.stats.latencies) == 2  # the cancelled request is not recorded
@@ -0,0 +1,167 @@
+from pathlib import Path
+
+import pytest
+
+from app.schema import Memory, Message
+from app.session import SessionStore
+from app.tool.file_operators import LocalFileOperator
+from app.tool.planning import PlanningTool
+from app.tool.str_replace_editor import StrReplaceEditor
+
+
+@pytest.fixture
+def store() -> SessionStore:
+    return SessionStore("test", path=None)
+
+
+def test_memory_is_rebuilt_from_its_journal(tmp_path: Path):
+    """Tests that a reopened store replays the messages of a memory."""
+    path = tmp_path / "sessions.db"
+    store = SessionStore("run", path=path)
+    memory = Memory()
+    store.restore(memory, "agent.memory", "agent.run")
+    memory.add_message(Message.user_message("hello"))
+    memory.add_messages([Message.assistant_message("hi"), Message.user_message("bye")])
+    store.checkpoint("agent.run", "step")
+    store.close()
+
+    restored = Memory()
+    SessionStore("run", path=path).restore(restored, "agent.memory", "agent.run")
+    assert restored.to_dict_list() == memory.to_dict_list()
+
+
+def test_changes_after_the_last_checkpoint_are_dropped(store: SessionStore):
+    """Tests that a step interrupted before its checkpoint is rolled back."""
+    memory = Memory()
+    store.restore(memory, "agent.memory", "agent.run")
+    memory.add_message(Message.user_message("request"))
+    store.checkpoint("agent.run", "start")
+    memory.add_message(Message.assistant_message("unfinished step"))
+
+    restored = Memory()
+    store.restore(restored, "agent.memory", "agent.run")
+    assert [msg.content for msg in restored.messages] == ["request"]
+
+    # The restored memory keeps journaling
+    restored.clear()
+    store.checkpoint("agent.run", "step")
+    assert store.last_event("agent.memory")[1] == "clear"
+
+
+def test_checkpoint_compacts_only_its_own_streams(store: SessionStore):
+    """Tests that compaction replaces a stream's rows with one snapshot."""
+    store.compact_every = 3
+    memory, plans = Memory(), PlanningTool()
+    store.restore(memory, "agent.memory", "agent.run")
+    store.restore(plans, "flow.plan", "flow.run")
+    for i in range(5):
+        memory.add_message(Message.user_message(f"message {i}"))
+    plans._create_plan("p", "Plan", ["a", "b"])
+    plans._mark_step("p", 0, "completed", None)
+    plans._mark_step("p", 1, "in_progress", None)
+
+    store.checkpoint("agent.run", "step")
+
+    memory_events = store.events("agent.memory")
+    assert [kind for _, kind, _ in memory_events] == ["snapshot"]
+    assert len(memory_events[0][2]) == 5
+    # Plan changes belong to the flow and have not been checkpointed yet
+    assert len(store.events("flow.plan")) == 5
+
+    restored = PlanningTool()
+    store.restore(restored, "flow.plan", "flow.run")
+    assert restored.plans == {}
+
+
+def test_planning_tool_restores_plans_and_active_plan(store: SessionStore):
+    """Tests that plan mutations survive a restore."""
+    tool = PlanningTool()
+    store.restore(tool, "flow.plan", "flow.run")
+    tool._create_plan("first", "First", ["a"])
+    tool._create_plan("second", "Second", ["b", "c"])
+    tool._update_plan("second", None, ["b", "d"])
+    tool._mark_step("second", 0, "completed", "done")
+    tool._delete_plan("first")
+    store.checkpoint("flow.run", "step")
+
+    restored = PlanningTool()
+    store.restore(restored, "flow.plan", "flow.run")
+    assert restored.plans == tool.plans
+    assert restored.current_plan_id == "second"
+
+
+@pytest.mark.asyncio
+async def test_file_history_is_restored(store: SessionStore, tmp_path: Path):
+    """Tests that undo history survives a restore."""
+    editor = StrReplaceEditor()
+    operator = LocalFileOperator()
+    store.restore(editor, "agent.tool.str_replace_editor", "agent.run")
+    path = str(tmp_path / "a.py")
+    await operator.write_file(path, "x = 1\n")
+    await editor.str_replace(path, "x = 1", "x = 2", operator)
+    await editor.str_replace(path, "x = 2", "x = 3", operator)
+    await editor.undo_edit(path, operator)
+    store.checkpoint("agent.run", "step")
+
+    restored = StrReplaceEditor()
+    store.restore(restored, "agent.tool.str_replace_editor", "agent.run")
+    assert restored.snapshot() == {path: ["x = 1\n"]}
+
+
+@pytest.mark.asyncio
+async def test_tools_of_different_sessions_do_not_share_state(tmp_path: Path):
+    """Tests that binding and restoring one tool leaves other instances alone."""
+    first, second = SessionStore("first", path=None), SessionStore("second", path=None)
+    first_editor, second_editor = StrReplaceEditor(), StrReplaceEditor()
+    first_plans, second_plans = PlanningTool(), PlanningTool()
+    first.restore(first_editor, "agent.tool.str_replace_editor", "agent.run")
+    second.restore(second_editor, "agent.tool.str_replace_editor", "agent.run")
+    first.restore(first_plans, "flow.plan", "flow.run")
+    second.restore(second_plans, "flow.plan", "flow.run")
+
+    operator = LocalFileOperator()
+    path = str(tmp_path / "a.py")
+    await operator.write_file(path, "x = 1\n")
+    await first_editor.str_replace(path, "x = 1", "x = 2", operator)
+    first_plans._create_plan("p", "Plan", ["a"])
+
+    assert first_editor.snapshot() == {path: ["x = 1\n"]}
+    assert second_editor.snapshot() == {}
+    assert second_plans.plans == {} and second_plans.current_plan_id is None
+    assert first.last_event("agent.tool.str_replace_editor")[1] == "push"
+    assert first.last_event("flow.plan")[1] == "active"
+    # The second session only holds the snapshots written when binding
+    assert [kind for _, kind, _ in second.events("agent.tool.str_replace_editor")] == [
+        "snapshot"
+    ]
+    assert [kind for _, kind, _ in second.events("flow.plan")] == ["snapshot"]
+
+
+def test_sessions_are_isolated(tmp_path: Path):
+    """Tests that two session ids in one file do not see each other's rows."""
+    path = tmp_path / "sessions.db"
+    first = SessionStore("first", path=path)
+    first.append("agent.memory", "add", [{"role": "user", "content": "x"}])
+    second = SessionStore("second", path=path)
+
+    assert second.events("agent.memory") == []
+    first.delete()
+    assert first.events("agent.memory") == []
+
+
+def test_replacing_memory_is_journaled_as_one_snapshot(store: SessionStore):
+    """Tests that a bulk rewrite of the history writes a single event."""
+    memory = Memory()
+    store.restore(memory, "agent.memory", "agent.run")
+    memory.add_message(Message.user_message("old"))
+    memory.replace([Message.user_message("new"), Message.assistant_message("reply")])
+
+    kind, data = store.last_event("agent.memory")[1:]
+    assert kind == "snapshot"
+    assert [message["content"] for message in data] == ["new", "reply"]
+    assert len(store.events("agent.memory")) == 3
+
+    store.checkpoint("agent.run", "step")
+    restored = Memory()
+    store.restore(restored, "agent.memory", "agent.run")
+    assert restored.to_dict_list() == memory.to_dict_list()
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.llm import LLM
+from app.single_flight import SingleFlight
+
+
+class SlowCompletions:
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, **params):
+        self.calls.append(params)
+        await asyncio.sleep(0.02)
+        return f"response {len(self.calls)}"
+
+
+def make_llm() -> LLM:
+    """Build an LLM with a fake client and no tokenizer"""
+    llm = object.__new__(LLM)
+    llm.single_flight = SingleFlight()
+    llm.rate_limiter = None
+    llm.client = type("Client", (), {})()
+    llm.client.chat = type("Chat", (), {})()
+    llm.client.chat.completions = SlowCompletions()
+    return llm
+
+
+@pytest.mark.asyncio
+async def test_identical_deterministic_requests_share_one_call():
+    """Tests that only temperature 0 requests with equal params are coalesced."""
+    llm = make_llm()
+    params = {"model": "gpt-4o", "messages": [{"role": "user", "content": "plan"}]}
+
+    results = await asyncio.gather(
+        *[
+            llm._create_completion("ask", {**params, "temperature": 0}, 10)
+            for _ in range(3)
+        ],
+        llm._create_completion(
+            "ask", {**params, "temperature": 0, "max_tokens": 5}, 10
+        ),
+        llm._create_completion("ask", {**params, "temperature": 0.7}, 10),
+    )
+
+    assert len(llm.client.chat.completions.calls) == 3
+    assert [shared for _, shared in results[:3]] == [False, True, True]
+    assert len({response for response, _ in results[:3]}) == 1
+    assert llm.single_flight.stats() == {"in_flight": 0, "calls": 2, "coalesced": 2}
+
+    # Finished calls are not reused
+    await llm._create_completion("ask", {**params, "temperature": 0}, 10)
+    assert len(llm.client.chat.completions.calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_and_cancelled_caller_does_not_cancel_others():
+    """Tests shared failures and that the call survives while a caller waits."""
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    results = await asyncio.gather(
+        flights.do("key", fail), flights.do("key", fail), return_exceptions=True
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.create_task(flights.do("other", slow))
+    second = asyncio.create_task(flights.do("other", slow))
+    await asyncio.sleep(0.005)
+    first.cancel()
+    assert await second == ("done", True)
+    with pytest.raises(asyncio.CancelledError):
+        await first
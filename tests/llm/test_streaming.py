@@ -0,0 +1,119 @@
+import asyncio
+import io
+
+import pytest
+from openai.types.chat import ChatCompletionChunk
+
+from app.exceptions import EmptyResponseError, StreamInterrupted
+from app.llm import LLM
+from app.retry import is_retryable
+from app.streaming import CallbackSink, QueueSink, StdoutSink
+
+
+@pytest.mark.asyncio
+async def test_stdout_sink_batches_writes():
+    """Tests that small chunks are buffered until a newline or the end."""
+    out = io.StringIO()
+    sink = StdoutSink(stream=out, flush_size=100, flush_interval=60)
+    await sink.write("Hel")
+    await sink.write("lo")
+    assert out.getvalue() == ""
+
+    await sink.write(" world\n")
+    assert out.getvalue() == "Hello world\n"
+    await sink.write("bye")
+    await sink.end()
+    assert out.getvalue() == "Hello world\nbye\n"
+
+
+@pytest.mark.asyncio
+async def test_queue_sink_applies_backpressure():
+    """Tests that a full queue blocks the producer until it is consumed."""
+    sink = QueueSink(maxsize=1)
+    await sink.write("a")
+    producer = asyncio.create_task(sink.write("b"))
+    await asyncio.sleep(0)
+    assert not producer.done()
+
+    async def consume():
+        return [chunk async for chunk in sink]
+
+    consumer = asyncio.create_task(consume())
+    await producer
+    await sink.end()
+    assert await consumer == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_callback_sink_accepts_sync_and_async():
+    """Tests both plain and coroutine callbacks."""
+    received = []
+
+    async def collect(text):
+        received.append(text)
+
+    await CallbackSink(received.append).write("x")
+    await CallbackSink(collect).write("y")
+    assert received == ["x", "y"]
+
+
+class BrokenStream:
+    """Completions whose stream yields the given chunks, then drops"""
+
+    def __init__(self, texts, error: bool = True):
+        self.texts = texts
+        self.error = error
+
+    async def create(self, **params):
+        async def stream():
+            for text in self.texts:
+                yield ChatCompletionChunk.model_validate(
+                    {
+                        "id": "chunk",
+                        "created": 0,
+                        "model": "test",
+                        "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "delta": {"content": text}}],
+                    }
+                )
+            if self.error:
+                raise ConnectionError("connection reset")
+
+        return stream()
+
+
+def make_llm(texts, error: bool = True) -> LLM:
+    llm = object.__new__(LLM)
+    llm.api_type = "openai"
+    llm.stream_usage = False
+    llm.client = type("Client", (), {})()
+    llm.client.chat = type("Chat", (), {})()
+    llm.client.chat.completions = BrokenStream(texts, error)
+    return llm
+
+
+@pytest.mark.asyncio
+async def test_stream_failing_after_output_is_not_retryable():
+    """Tests that a retry cannot write the same text into a sink twice."""
+    received = []
+    with pytest.raises(ConnectionError) as before_output:
+        await make_llm([])._stream_text({}, CallbackSink(received.append))
+    assert is_retryable(before_output.value)
+
+    with pytest.raises(StreamInterrupted) as after_output:
+        await make_llm(["Hel", "lo"])._stream_text({}, CallbackSink(received.append))
+    assert not is_retryable(after_output.value)
+    assert received == ["Hel", "lo"]
+
+
+@pytest.mark.asyncio
+async def test_empty_stream_is_retried_only_before_the_sink_ends():
+    """Tests that a blank response retries only if nothing reached the sink."""
+    sink = QueueSink()
+    with pytest.raises(EmptyResponseError) as nothing:
+        await make_llm([], error=False)._stream_text({}, sink)
+    assert is_retryable(nothing.value) and not sink.ended
+
+    with pytest.raises(StreamInterrupted) as blank:
+        await make_llm([" ", "\n"], error=False)._stream_text({}, sink)
+    assert not is_retryable(blank.value)
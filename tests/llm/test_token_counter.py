@@ -0,0 +1,157 @@
+from collections import deque
+from typing import List
+
+import pytest
+
+from app.llm import TokenCounter
+from app.schema import Function, Memory, Message, Role, ToolCall
+
+
+class CountingTokenizer:
+    """Whitespace tokenizer that records how many strings were encoded."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text: str) -> List[str]:
+        self.calls += 1
+        return text.split()
+
+
+@pytest.fixture
+def tokenizer() -> CountingTokenizer:
+    return CountingTokenizer()
+
+
+def test_cached_count_matches_uncached(tokenizer: CountingTokenizer):
+    """Tests that memoized counts equal a fresh count of the same history."""
+    messages = [
+        {"role": "system", "content": "You are helpful"},
+        {"role": "user", "content": "Hello there"},
+        {
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [
+                {"id": "c1", "function": {"name": "bash", "arguments": '{"a": 1}'}}
+            ],
+        },
+        {"role": "tool", "content": "done", "name": "bash", "tool_call_id": "c1"},
+    ]
+    cached = TokenCounter(tokenizer)
+    uncached = TokenCounter(CountingTokenizer(), cache_size=0)
+
+    assert cached.count_message_tokens(messages) == uncached.count_message_tokens(
+        messages
+    )
+    assert cached.count_message_tokens(messages) == uncached.count_message_tokens(
+        messages
+    )
+    assert cached.cache_hits == len(messages)
+
+
+def test_only_new_messages_are_encoded(tokenizer: CountingTokenizer):
+    """Tests that growing the history only encodes the appended message."""
+    counter = TokenCounter(tokenizer)
+    history = [{"role": "user", "content": f"message {i}"} for i in range(10)]
+    counter.count_message_tokens(history)
+    calls = tokenizer.calls
+
+    history.append({"role": "assistant", "content": "a new reply"})
+    counter.count_message_tokens(history)
+
+    # role and content of the new message only
+    assert tokenizer.calls - calls == 2
+
+
+def test_cache_is_bounded(tokenizer: CountingTokenizer):
+    """Tests LRU eviction once the cache is full."""
+    counter = TokenCounter(tokenizer, cache_size=3)
+    for i in range(5):
+        counter.count_message({"role": "user", "content": f"message {i}"})
+
+    assert len(counter._message_cache) == 3
+    counter.count_message({"role": "user", "content": "message 0"})
+    assert counter.cache_misses == 6
+
+
+def test_memory_running_total(tokenizer: CountingTokenizer):
+    """Tests the running token total across appends, eviction and replacement."""
+    counter = TokenCounter(tokenizer)
+    count = lambda msg: counter.count_message(msg.to_dict())
+    memory = Memory(max_messages=3)
+    memory.bind_token_counter(count)
+
+    for i in range(5):
+        memory.add_message(Message.user_message(f"message number {i}"))
+    expected = sum(count(msg) for msg in memory.messages)
+    assert memory.token_count == expected
+
+    memory.messages = list(memory.messages)[1:]
+    assert memory.token_count == sum(count(msg) for msg in memory.messages)
+
+    memory.clear()
+    assert memory.token_count == 0
+
+
+def test_stored_messages_are_read_only(tokenizer: CountingTokenizer):
+    """Tests that the running total cannot go stale through a changed message."""
+    counter = TokenCounter(tokenizer)
+    memory = Memory()
+    memory.bind_token_counter(lambda msg: counter.count_message(msg.to_dict()))
+    message = Message.user_message("short")
+    message.content = "short but edited before it is stored"
+    memory.add_message(message)
+    total = memory.token_count
+
+    with pytest.raises(AttributeError):
+        message.content = "a much longer message than the one that was counted"
+    assert memory.token_count == total
+    # A changed copy is a new message, counted when it is added
+    memory.add_message(message.replace(content="a changed copy"))
+    assert memory.token_count > total
+
+
+def tool_step(index: int) -> List[Message]:
+    call = ToolCall(id=f"call_{index}", function=Function(name="tool", arguments="{}"))
+    return [
+        Message.from_tool_calls(tool_calls=[call], content=f"step {index}"),
+        Message.tool_message(f"result {index}", name="tool", tool_call_id=call.id),
+    ]
+
+
+def test_memory_evicts_tool_calls_with_their_results():
+    """Tests that eviction never leaves a tool result without its call."""
+    memory = Memory(max_messages=4)
+    memory.add_message(Message.user_message("task"))
+    for index in range(3):
+        memory.add_messages(tool_step(index))
+        assert memory.messages[0].role != Role.TOOL
+
+    assert isinstance(memory.messages, deque)
+    assert [msg.content for msg in memory.messages] == [
+        "step 1",
+        "result 1",
+        "step 2",
+        "result 2",
+    ]
+    assert memory.get_recent_messages(1)[0].content == "result 2"
+
+    memory.messages = [Message.user_message("replaced")]
+    assert isinstance(memory.messages, deque)
+
+
+def test_memory_token_budget(tokenizer: CountingTokenizer):
+    """Tests eviction by token budget using the cached counts."""
+    counter = TokenCounter(tokenizer)
+    memory = Memory(max_tokens=40)
+    memory.bind_token_counter(lambda msg: counter.count_message(msg.to_dict()))
+
+    for index in range(10):
+        memory.add_messages(tool_step(index))
+        assert memory.token_count <= 40
+        assert memory.messages[0].role == Role.ASSISTANT
+    assert memory.messages[-1].content == "result 9"
+
+    # The newest group is kept even if it alone exceeds the budget
+    memory.add_message(Message.user_message("word " * 100))
+    assert len(memory.messages) == 1
@@ -0,0 +1,124 @@
+import asyncio
+from typing import List, Optional
+
+import pytest
+from openai.types.chat import ChatCompletionChunk
+
+from app.agent.toolcall import ToolCallAgent
+from app.llm import LLM, ToolCallAssembler
+from app.schema import Function, ToolCall
+
+
+def chunk(
+    content: Optional[str] = None,
+    tool_calls: Optional[List[dict]] = None,
+    finish_reason: Optional[str] = None,
+) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "chunk",
+            "created": 0,
+            "model": "test",
+            "object": "chat.completion.chunk",
+            "choices": [
+                {
+                    "index": 0,
+                    "delta": {"content": content, "tool_calls": tool_calls},
+                    "finish_reason": finish_reason,
+                }
+            ],
+        }
+    )
+
+
+def call_delta(index: int, arguments: str, id: str = None, name: str = None) -> dict:
+    function = {"arguments": arguments}
+    if name:
+        function["name"] = name
+    return {"index": index, "id": id, "type": "function", "function": function}
+
+
+def test_tool_call_released_when_arguments_complete():
+    """Tests that a tool call is emitted as soon as its JSON parses."""
+    assembler = ToolCallAssembler()
+    assert assembler.feed(chunk(content="Let me look")) == []
+    assert (
+        assembler.feed(chunk(tool_calls=[call_delta(0, '{"url": ', "c0", "go")])) == []
+    )
+
+    ready = assembler.feed(chunk(tool_calls=[call_delta(0, '"a"}')]))
+    assert [call.id for call in ready] == ["c0"]
+    assert ready[0].function.arguments == '{"url": "a"}'
+
+    assert assembler.feed(chunk(tool_calls=[call_delta(1, "{", "c1", "click")])) == []
+    assert assembler.feed(chunk(finish_reason="tool_calls")) == []
+    # Unparsable arguments are still released at the end of the stream
+    assert [call.id for call in assembler.finish()] == ["c1"]
+
+    message = assembler.message()
+    assert message.content == "Let me look"
+    assert [call.function.name for call in message.tool_calls] == ["go", "click"]
+    assert assembler.finish_reason == "tool_calls"
+
+
+def test_next_index_does_not_release_unparsed_call():
+    """Tests that a new tool call does not hand out an unfinished earlier one."""
+    assembler = ToolCallAssembler()
+    assembler.feed(chunk(tool_calls=[call_delta(0, '{"a": [1', "c0", "first")]))
+    ready = assembler.feed(chunk(tool_calls=[call_delta(1, "{}", "c1", "second")]))
+    assert [call.id for call in ready] == ["c1"]
+
+    # Malformed arguments are only handed out once the stream has ended
+    assert [call.id for call in assembler.finish()] == ["c0"]
+
+
+def test_usage_chunk_is_recorded():
+    """Tests that the include_usage chunk, which has no choices, is captured."""
+    assembler = ToolCallAssembler()
+    assembler.feed(chunk(content="done", finish_reason="stop"))
+    usage_chunk = ChatCompletionChunk.model_validate(
+        {
+            "id": "chunk",
+            "created": 0,
+            "model": "test",
+            "object": "chat.completion.chunk",
+            "choices": [],
+            "usage": {
+                "prompt_tokens": 120,
+                "completion_tokens": 4,
+                "total_tokens": 124,
+                "prompt_tokens_details": {"cached_tokens": 96},
+            },
+        }
+    )
+    assert assembler.feed(usage_chunk) == []
+    assert assembler.usage.prompt_tokens == 120
+    assert assembler.usage.prompt_tokens_details.cached_tokens == 96
+    assert assembler.content == "done"
+
+
+@pytest.mark.asyncio
+async def test_streamed_calls_are_cancelled_when_the_step_fails(monkeypatch):
+    """Tests that tool calls started mid-stream do not outlive a failed step."""
+    monkeypatch.setattr(LLM, "count_message", lambda self, message: 1)
+    agent = ToolCallAgent(stream_tool_calls=True)
+    started = []
+
+    async def slow_tool(self, command: ToolCall) -> str:
+        await asyncio.sleep(10)
+        return "done"
+
+    async def think(self) -> bool:
+        self._start_tool_call(
+            ToolCall(id="c0", function=Function(name="go", arguments="{}"))
+        )
+        started.extend(self._early_tool_tasks.values())
+        raise RuntimeError("stream broke")
+
+    monkeypatch.setattr(ToolCallAgent, "execute_tool", slow_tool)
+    monkeypatch.setattr(ToolCallAgent, "think", think)
+    with pytest.raises(RuntimeError):
+        await agent.step()
+
+    assert started[0].cancelled()
+    assert agent._early_tool_tasks == {}
@@ -0,0 +1,144 @@
+import json
+
+import pytest
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from app.config import TransportSettings
+from app.transport import (
+    Cassette,
+    MockScript,
+    TransportClient,
+    request_key,
+    wrap_client,
+)
+
+
+def completion(content: str) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "chatcmpl-1",
+            "created": 1,
+            "model": "gpt-4o",
+            "object": "chat.completion",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }
+            ],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+        }
+    )
+
+
+class FakeClient:
+    def __init__(self, prefix: str = "answer to"):
+        self.prefix = prefix
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **params):
+        self.calls += 1
+        return completion(f"{self.prefix} {params['messages'][-1]['content']}")
+
+
+def request(content: str, **params) -> dict:
+    return {
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": content}],
+        "temperature": 0,
+        **params,
+    }
+
+
+def test_request_key_ignores_transport_options():
+    """Tests that timeouts and stream options do not change the cassette key."""
+    assert request_key(request("hi")) == request_key(
+        request("hi", timeout=30, stream_options={"include_usage": True})
+    )
+    assert request_key(request("hi")) != request_key(request("bye"))
+
+
+@pytest.mark.asyncio
+async def test_record_then_replay_without_client(tmp_path):
+    """Tests that recorded exchanges replay by key and as synthesized streams."""
+    path = tmp_path / "cassette.jsonl"
+    inner = FakeClient()
+    recorder = TransportClient(
+        "record", inner=inner, cassette=Cassette(path, record=True)
+    )
+    await recorder.chat.completions.create(**request("one"))
+    await recorder.chat.completions.create(**request("two"))
+    assert inner.calls == 2
+    assert len(path.read_text().splitlines()) == 2
+
+    player = TransportClient("replay", cassette=Cassette(path))
+    response = await player.chat.completions.create(**request("two"))
+    assert response.choices[0].message.content == "answer to two"
+
+    stream = await player.chat.completions.create(**request("one", stream=True))
+    chunks = [chunk async for chunk in stream]
+    assert all(isinstance(chunk, ChatCompletionChunk) for chunk in chunks)
+    text = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+    assert text == "answer to one"
+    assert chunks[-1].usage.prompt_tokens == 10
+
+    with pytest.raises(LookupError):
+        await player.chat.completions.create(**request("three"))
+
+
+@pytest.mark.asyncio
+async def test_recording_again_replaces_the_cassette(tmp_path):
+    """Tests that replay serves the newest recording of a request."""
+    path = tmp_path / "cassette.jsonl"
+    for answer in ("old", "new"):
+        inner = FakeClient(prefix=f"{answer} answer to")
+        recorder = TransportClient(
+            "record", inner=inner, cassette=Cassette(path, record=True)
+        )
+        await recorder.chat.completions.create(**request("one"))
+
+    assert len(path.read_text().splitlines()) == 1
+    player = TransportClient("replay", cassette=Cassette(path))
+    response = await player.chat.completions.create(**request("one"))
+    assert response.choices[0].message.content == "new answer to one"
+
+
+@pytest.mark.asyncio
+async def test_mock_script_serves_tool_calls_in_order():
+    """Tests scripted responses, match filters and repetition of the last entry."""
+    script = MockScript(
+        [
+            {"match": "plan", "content": "planned"},
+            {"tool_calls": [{"name": "terminate", "arguments": {"status": "success"}}]},
+        ]
+    )
+    client = TransportClient("mock", script=script)
+
+    first = await client.chat.completions.create(**request("run it"))
+    call = first.choices[0].message.tool_calls[0]
+    assert call.function.name == "terminate"
+    assert json.loads(call.function.arguments) == {"status": "success"}
+    assert first.choices[0].finish_reason == "tool_calls"
+
+    second = await client.chat.completions.create(**request("make a plan"))
+    assert second.choices[0].message.content == "planned"
+
+    third = await client.chat.completions.create(**request("again"))
+    assert third.choices[0].message.tool_calls[0].function.name == "terminate"
+
+
+def test_wrap_client_skips_real_client_offline(tmp_path):
+    """Tests that live mode builds the client and mock mode never does."""
+    script = tmp_path / "script.json"
+    script.write_text(json.dumps([{"content": "ok"}]))
+
+    def create():
+        raise AssertionError("real client must not be created")
+
+    settings = TransportSettings(mode="mock", script=str(script))
+    client = wrap_client(create, settings=settings)
+    assert isinstance(client, TransportClient)
+    assert wrap_client(lambda: "live", settings=TransportSettings()) == "live"
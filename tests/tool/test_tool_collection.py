@@ -0,0 +1,24 @@
+from app.tool import Terminate, ToolCollection
+from app.tool.planning import PlanningTool
+
+
+def test_params_are_cached_until_tools_change():
+    """Tests that to_params is rebuilt only when the tool set changes."""
+    tools = ToolCollection(Terminate())
+    params = tools.to_params()
+    params.token_costs["model"] = 42
+
+    assert tools.to_params() is params
+    assert [param["function"]["name"] for param in params] == ["terminate"]
+
+    version = tools.version
+    tools.add_tool(PlanningTool())
+    assert tools.version == version + 1
+
+    refreshed = tools.to_params()
+    assert refreshed is not params
+    assert refreshed.token_costs == {}
+    assert [param["function"]["name"] for param in refreshed] == [
+        "terminate",
+        "planning",
+    ]